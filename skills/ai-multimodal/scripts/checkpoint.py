@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Append-only JSONL checkpoints for resumable batch runs.
+
+Each finished item is appended as one JSON line, keyed by the input file's
+content hash plus the prompt, model and any other settings that change the
+result. A rerun with --resume skips items that already succeeded with the same
+key, and the final output is assembled from the checkpoint, so a run that dies
+part way loses at most the requests that were in flight. A run without
+--resume refuses to overwrite a checkpoint that already has results.
+
+Used by gemini_batch_process.py and document_converter.py.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def item_key(file_path: Optional[str], *settings: Any) -> str:
+    """SHA-256 over the file's content and the settings that affect its result."""
+    digest = hashlib.sha256()
+    if file_path:
+        try:
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+        except OSError:
+            # Unreadable input: key by path so its error result is still recorded
+            digest.update(f"missing:{file_path}".encode())
+    for setting in settings:
+        digest.update(b'\0')
+        digest.update(json.dumps(setting, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def checkpoint_path_for(output_file: str) -> Path:
+    """Default checkpoint next to the output, e.g. results.md -> results.checkpoint.jsonl."""
+    return Path(output_file).with_suffix('.checkpoint.jsonl')
+
+
+class Checkpoint:
+    """JSONL log of finished items; safe to append from several threads."""
+
+    def __init__(self, path, resume: bool = False):
+        self.path = Path(path)
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        if not resume and self.path.exists() and self.path.stat().st_size:
+            raise FileExistsError(
+                f"Checkpoint {self.path} has results from an earlier run; "
+                f"use --resume to continue it, or delete it to start over")
+        if resume and self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Line cut short when the previous run died
+                    self.records[entry['key']] = entry['result']
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+
+    def completed(self, key: str) -> bool:
+        """True if the item already succeeded (failed items are retried)."""
+        record = self.records.get(key)
+        return bool(record) and record.get('status') == 'success'
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.records.get(key)
+
+    def record(self, key: str, result: Dict[str, Any]) -> None:
+        """Append a result and flush it to disk before returning."""
+        line = json.dumps({'key': key, 'result': result}, default=str)
+        with self._lock:
+            self.records[key] = result
+            self._file.write(line + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -14,6 +14,7 @@ Features:
 - Extracts text from images and scanned documents
 - Batch conversion support
 - Saves to docs/assets/document-extraction.md by default
+- Checkpoints each converted file (--resume continues an interrupted batch)
 """
 
 import argparse
@@ -23,6 +24,8 @@ import time
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 
+from checkpoint import Checkpoint, checkpoint_path_for, item_key
+
 try:
     from google import genai
     from google.genai import types
@@ -37,6 +40,19 @@ except ImportError:
     load_dotenv = None
 
 
+DEFAULT_PROMPT = """Convert this document to clean, well-formatted Markdown.
+
+Requirements:
+- Preserve all content, structure, and formatting
+- Convert tables to markdown table format
+- Maintain heading hierarchy (# ## ### etc)
+- Preserve lists, code blocks, and quotes
+- Extract text from images if present
+- Keep formatting consistent and readable
+
+Output only the markdown content without any preamble or explanation."""
+
+
 def find_api_key() -> Optional[str]:
     """Find Gemini API key using correct priority order.
 
@@ -171,21 +187,7 @@ def convert_to_markdown(
             file_size = file_path_obj.stat().st_size
             use_file_api = file_size > 20 * 1024 * 1024  # >20MB
 
-            # Default prompt for markdown conversion
-            if custom_prompt:
-                prompt = custom_prompt
-            else:
-                prompt = """Convert this document to clean, well-formatted Markdown.
-
-Requirements:
-- Preserve all content, structure, and formatting
-- Convert tables to markdown table format
-- Maintain heading hierarchy (# ## ### etc)
-- Preserve lists, code blocks, and quotes
-- Extract text from images if present
-- Keep formatting consistent and readable
-
-Output only the markdown content without any preamble or explanation."""
+            prompt = custom_prompt or DEFAULT_PROMPT
 
             # Upload or inline the file
             if use_file_api:
@@ -236,9 +238,18 @@ def batch_convert(
     auto_name: bool = False,
     model: str = 'gemini-2.5-flash',
     custom_prompt: Optional[str] = None,
-    verbose: bool = False
+    verbose: bool = False,
+    resume: bool = False,
+    checkpoint_file: Optional[str] = None
 ) -> List[Dict[str, Any]]:
-    """Batch convert multiple files to markdown."""
+    """Batch convert multiple files to markdown.
+
+    Each result is appended to a JSONL checkpoint (default: next to the
+    output) as it finishes. With resume, files already converted with the
+    same content, prompt and model are skipped, and the combined markdown is
+    written from the checkpoint. Once every file has converted, the
+    checkpoint is deleted so it is not left beside the output.
+    """
 
     api_key = find_api_key()
     if not api_key:
@@ -248,7 +259,6 @@ def batch_convert(
         sys.exit(1)
 
     client = genai.Client(api_key=api_key)
-    results = []
 
     # Determine output path
     if not output_file:
@@ -266,24 +276,38 @@ def batch_convert(
     output_path = Path(output_file)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Process each file
-    for i, file_path in enumerate(files, 1):
-        if verbose:
-            print(f"\n[{i}/{len(files)}] Converting: {file_path}")
-
-        result = convert_to_markdown(
-            client=client,
-            file_path=file_path,
-            model=model,
-            custom_prompt=custom_prompt,
-            verbose=verbose
-        )
+    checkpoint_path = Path(checkpoint_file) if checkpoint_file else checkpoint_path_for(output_path)
+    prompt = custom_prompt or DEFAULT_PROMPT
+    keys = [item_key(file_path, prompt, model) for file_path in files]
+
+    with Checkpoint(checkpoint_path, resume) as checkpoint:
+        done = sum(1 for key in keys if checkpoint.completed(key))
+        if done:
+            print(f"Resuming: {done}/{len(files)} files already converted ({checkpoint_path})")
+
+        # Process each file
+        for i, (file_path, key) in enumerate(zip(files, keys), 1):
+            if checkpoint.completed(key):
+                continue
+
+            if verbose:
+                print(f"\n[{i}/{len(files)}] Converting: {file_path}")
+
+            result = convert_to_markdown(
+                client=client,
+                file_path=file_path,
+                model=model,
+                custom_prompt=custom_prompt,
+                verbose=verbose
+            )
+
+            checkpoint.record(key, result)
 
-        results.append(result)
+            if verbose:
+                status = result.get('status', 'unknown')
+                print(f"  Status: {status}")
 
-        if verbose:
-            status = result.get('status', 'unknown')
-            print(f"  Status: {status}")
+        results = [dict(checkpoint.get(key), file=file_path) for file_path, key in zip(files, keys)]
 
     # Save combined markdown
     with open(output_path, 'w', encoding='utf-8') as f:
@@ -304,6 +328,10 @@ def batch_convert(
 
             f.write("---\n\n")
 
+    # Everything is in the output now; keep the checkpoint only to retry failures
+    if all(r['status'] == 'success' for r in results):
+        checkpoint_path.unlink(missing_ok=True)
+
     if verbose or True:  # Always show output location
         print(f"\n{'='*50}")
         print(f"Converted: {len(results)} file(s)")
@@ -359,6 +387,10 @@ Default output: <project-root>/docs/assets/document-extraction.md
                        help='Gemini model to use (default: gemini-2.5-flash)')
     parser.add_argument('--prompt', '-p',
                        help='Custom prompt for conversion')
+    parser.add_argument('--checkpoint',
+                       help='JSONL checkpoint of converted files (default: <output>.checkpoint.jsonl)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Skip files already converted in the checkpoint')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='Verbose output')
 
@@ -381,14 +413,20 @@ Default output: <project-root>/docs/assets/document-extraction.md
         sys.exit(1)
 
     # Convert files
-    batch_convert(
-        files=files,
-        output_file=args.output,
-        auto_name=args.auto_name,
-        model=args.model,
-        custom_prompt=args.prompt,
-        verbose=args.verbose
-    )
+    try:
+        batch_convert(
+            files=files,
+            output_file=args.output,
+            auto_name=args.auto_name,
+            model=args.model,
+            custom_prompt=args.prompt,
+            verbose=args.verbose,
+            resume=args.resume,
+            checkpoint_file=args.checkpoint
+        )
+    except FileExistsError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
 
 if __name__ == '__main__':
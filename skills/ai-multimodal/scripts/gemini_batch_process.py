@@ -8,21 +8,38 @@ Supports all Gemini modalities:
 - Video: Summarization, Q&A, scene detection
 - Document: PDF extraction, structured output
 - Generation: Image creation from text prompts
+
+Files are processed concurrently (--concurrency). Requests are paced by
+token buckets for requests and tokens per minute (--rpm, --tpm), and only
+transient failures (429, 5xx, timeouts, connection errors) are retried,
+with jittered exponential backoff.
+
+Each result is appended to a JSONL checkpoint as soon as it finishes (see
+checkpoint.py); --resume skips files that already succeeded.
 """
 
 import argparse
 import json
 import os
+import random
+import re
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 import csv
 import shutil
 
+import probe_cache
+from checkpoint import Checkpoint, checkpoint_path_for, item_key
+
 try:
     from google import genai
     from google.genai import types
+    import httpx  # google-genai's HTTP transport
 except ImportError:
     print("Error: google-genai package not installed")
     print("Install with: pip install google-genai")
@@ -34,6 +51,152 @@ except ImportError:
     load_dotenv = None
 
 
+# HTTP status codes worth retrying
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Input token costs (Gemini docs), used to pre-charge the TPM bucket
+IMAGE_TOKENS = 258
+PDF_TOKENS_PER_PAGE = 258
+VIDEO_TOKENS_PER_SECOND = 263
+AUDIO_TOKENS_PER_SECOND = 32
+MEDIA_BYTES_PER_TOKEN = 500  # Fallback when the duration is unknown
+
+# Page objects, counted in chunks when pypdf cannot read a PDF
+PDF_PAGE_RE = re.compile(rb'/Type\s{0,16}/Page[^s]')
+PDF_SCAN_CHUNK = 1 << 20
+PDF_SCAN_OVERLAP = 32  # Longer than any PDF_PAGE_RE match
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """Take amount tokens, waiting until they are available. Returns seconds waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+    def adjust(self, amount: float):
+        """Charge (positive) or refund (negative) tokens after the fact."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits shared by all workers."""
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    def acquire(self, estimated_tokens: int):
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens:
+            self.tokens.acquire(estimated_tokens)
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Correct the TPM bucket once the real input token count is known."""
+        if self.tokens and isinstance(actual_tokens, int):
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limits, server errors and transient network failures."""
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS
+    return isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError))
+
+
+def backoff_delay(attempt: int, base: float = 2.0, cap: float = 60.0) -> float:
+    """Exponential backoff with jitter: a random delay in [d/2, d], d = base * 2**attempt."""
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def count_pdf_pages(path: Path) -> int:
+    """Count PDF pages without loading the whole file into memory."""
+    try:
+        from pypdf import PdfReader
+        return len(PdfReader(path).pages)
+    except Exception:
+        pass  # pypdf missing or the file is damaged: scan for page objects
+
+    pages = 0
+    carry = b''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(PDF_SCAN_CHUNK)
+            data = carry + chunk
+            if not chunk:
+                return pages + len(PDF_PAGE_RE.findall(data))
+            # Matches starting in the last bytes are counted with the next chunk
+            limit = max(0, len(data) - PDF_SCAN_OVERLAP)
+            pages += sum(1 for m in PDF_PAGE_RE.finditer(data) if m.start() < limit)
+            carry = data[limit:]
+
+
+def estimate_tokens(file_path: Optional[str], prompt: str) -> int:
+    """Rough input token count for a request, for rate limiting."""
+    tokens = len(prompt) // 4 + 1
+    if not file_path:
+        return tokens
+
+    path = Path(file_path)
+    size = path.stat().st_size
+    mime_type = get_mime_type(file_path)
+
+    if mime_type.startswith('image/'):
+        return tokens + IMAGE_TOKENS
+    if mime_type == 'application/pdf':
+        return tokens + max(1, count_pdf_pages(path)) * PDF_TOKENS_PER_PAGE
+    if mime_type.startswith(('video/', 'audio/')):
+        per_second = VIDEO_TOKENS_PER_SECOND if mime_type.startswith('video/') else AUDIO_TOKENS_PER_SECOND
+        try:
+            duration = float(probe_cache.probe(path)['format']['duration'])
+            return tokens + int(duration * per_second)
+        except Exception:
+            return tokens + size // MEDIA_BYTES_PER_TOKEN
+    return tokens + size // 4
+
+
+def format_duration(seconds: float) -> str:
+    """Format seconds as e.g. 1h02m03s, 4m05s or 7s."""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m{secs:02d}s"
+    if minutes:
+        return f"{minutes}m{secs:02d}s"
+    return f"{secs}s"
+
+
 def find_api_key() -> Optional[str]:
     """Find Gemini API key using correct priority order.
 
@@ -162,12 +325,18 @@ def process_file(
     format_output: str,
     aspect_ratio: Optional[str] = None,
     verbose: bool = False,
-    max_retries: int = 3
+    max_retries: int = 3,
+    limiter: Optional[RateLimiter] = None
 ) -> Dict[str, Any]:
-    """Process a single file with retry logic."""
+    """Process a single file, retrying transient errors with jittered backoff."""
+    estimated_tokens = None
 
     for attempt in range(max_retries):
         try:
+            # Only a TPM limit needs the (file-reading) token estimate
+            if estimated_tokens is None:
+                estimated_tokens = estimate_tokens(file_path, prompt) if limiter and limiter.tokens else 0
+
             # For generation tasks without input files
             if task == 'generate' and not file_path:
                 content = [prompt]
@@ -209,11 +378,16 @@ def process_file(
             config = types.GenerateContentConfig(**config_args) if config_args else None
 
             # Generate content
+            if limiter:
+                limiter.acquire(estimated_tokens)
             response = client.models.generate_content(
                 model=model,
                 contents=content,
                 config=config
             )
+            if limiter:
+                usage = getattr(response, 'usage_metadata', None)
+                limiter.settle(estimated_tokens, getattr(usage, 'prompt_token_count', None))
 
             # Extract response
             result = {
@@ -253,16 +427,16 @@ def process_file(
             return result
 
         except Exception as e:
-            if attempt == max_retries - 1:
+            if attempt == max_retries - 1 or not is_retryable(e):
                 return {
                     'file': str(file_path) if file_path else 'generated',
                     'status': 'error',
                     'error': str(e)
                 }
 
-            wait_time = 2 ** attempt
+            wait_time = backoff_delay(attempt)
             if verbose:
-                print(f"  Retry {attempt + 1} after {wait_time}s: {e}")
+                print(f"  Retry {attempt + 1} after {wait_time:.1f}s: {e}")
             time.sleep(wait_time)
 
 
@@ -275,9 +449,21 @@ def batch_process(
     aspect_ratio: Optional[str] = None,
     output_file: Optional[str] = None,
     verbose: bool = False,
-    dry_run: bool = False
+    dry_run: bool = False,
+    concurrency: int = 4,
+    rpm: Optional[float] = None,
+    tpm: Optional[float] = None,
+    max_retries: int = 3,
+    resume: bool = False,
+    checkpoint_file: Optional[str] = None
 ) -> List[Dict[str, Any]]:
-    """Batch process multiple files."""
+    """Batch process multiple files concurrently within the RPM/TPM limits.
+
+    Results are returned in input order. With an output file (or an explicit
+    checkpoint_file), every result is checkpointed as it finishes; with
+    resume, files that already succeeded with the same content, prompt,
+    model, task and format are skipped and their results are reused.
+    """
     api_key = find_api_key()
     if not api_key:
         print("Error: GEMINI_API_KEY not found")
@@ -291,9 +477,11 @@ def batch_process(
         print(f"Model: {model}")
         print(f"Task: {task}")
         print(f"Prompt: {prompt}")
+        print(f"Concurrency: {concurrency}")
         return []
 
     client = genai.Client(api_key=api_key)
+    limiter = RateLimiter(rpm, tpm) if rpm or tpm else None
     results = []
 
     # For generation tasks without input files, process once
@@ -309,7 +497,9 @@ def batch_process(
             task=task,
             format_output=format_output,
             aspect_ratio=aspect_ratio,
-            verbose=verbose
+            verbose=verbose,
+            max_retries=max_retries,
+            limiter=limiter
         )
 
         results.append(result)
@@ -319,34 +509,76 @@ def batch_process(
             print(f"  Status: {status}")
     else:
         # Process input files
-        for i, file_path in enumerate(files, 1):
-            if verbose:
-                print(f"\n[{i}/{len(files)}] Processing: {file_path}")
-
-            result = process_file(
-                client=client,
-                file_path=file_path,
-                prompt=prompt,
-                model=model,
-                task=task,
-                format_output=format_output,
-                aspect_ratio=aspect_ratio,
-                verbose=verbose
-            )
-
-            results.append(result)
-
-            if verbose:
-                status = result.get('status', 'unknown')
-                print(f"  Status: {status}")
+        if not checkpoint_file and output_file:
+            checkpoint_file = str(checkpoint_path_for(output_file))
+        with (Checkpoint(checkpoint_file, resume) if checkpoint_file else nullcontext()) as checkpoint:
+            results = [None] * len(files)
+            keys = [None] * len(files)
+            pending = list(range(len(files)))
+            if checkpoint:
+                keys = [item_key(f, prompt, model, task, format_output) for f in files]
+                pending = [i for i in pending if not checkpoint.completed(keys[i])]
+                if len(pending) < len(files):
+                    print(f"Resuming: {len(files) - len(pending)}/{len(files)} files already done "
+                          f"({checkpoint_file})")
+
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+                futures = {
+                    pool.submit(
+                        process_file,
+                        client=client,
+                        file_path=files[i],
+                        prompt=prompt,
+                        model=model,
+                        task=task,
+                        format_output=format_output,
+                        aspect_ratio=aspect_ratio,
+                        verbose=verbose,
+                        max_retries=max_retries,
+                        limiter=limiter
+                    ): i
+                    for i in pending
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    i = futures[future]
+                    try:
+                        results[i] = future.result()
+                    except Exception as e:
+                        # One broken file must not stop the batch
+                        results[i] = {'file': files[i], 'status': 'error', 'error': str(e)}
+                    if checkpoint:
+                        checkpoint.record(keys[i], results[i])
+                    print_progress(done, len(pending), started, files[i],
+                                   results[i].get('status', 'unknown'), verbose)
+
+            # Build the output from the checkpoint so resumed files are included
+            if checkpoint:
+                results = [dict(checkpoint.get(key), file=f) for key, f in zip(keys, files)]
 
     # Save results
     if output_file:
         save_results(results, output_file, format_output)
+        # Everything is in the output now; keep the checkpoint only to retry failures
+        if checkpoint_file and all(r.get('status') == 'success' for r in results):
+            Path(checkpoint_file).unlink(missing_ok=True)
 
     return results
 
 
+def print_progress(done: int, total: int, started: float, file_path: str,
+                   status: str, verbose: bool = False):
+    """Print throughput and ETA after each finished file."""
+    elapsed = time.monotonic() - started
+    rate = done / elapsed if elapsed > 0 else 0
+    eta = (total - done) / rate if rate else 0
+    line = f"[{done}/{total}] {rate:.2f} files/s, ETA {format_duration(eta)}"
+    if verbose:
+        print(f"{line} - {status}: {file_path}")
+    else:
+        print(line, end='\n' if done == total else '\r', flush=True)
+
+
 def save_results(results: List[Dict[str, Any]], output_file: str, format_output: str):
     """Save results to file."""
     output_path = Path(output_file)
@@ -427,6 +659,18 @@ Examples:
     parser.add_argument('--aspect-ratio', choices=['1:1', '16:9', '9:16', '4:3', '3:4'],
                        help='Aspect ratio for image generation')
     parser.add_argument('--output', help='Output file for results')
+    parser.add_argument('--concurrency', type=int, default=4,
+                       help='Files processed in parallel (default: 4)')
+    parser.add_argument('--rpm', type=float,
+                       help='Max requests per minute (default: unlimited)')
+    parser.add_argument('--tpm', type=float,
+                       help='Max input tokens per minute (default: unlimited)')
+    parser.add_argument('--max-retries', type=int, default=3,
+                       help='Attempts per file for rate-limit/server errors (default: 3)')
+    parser.add_argument('--checkpoint',
+                       help='JSONL checkpoint of finished files (default: <output>.checkpoint.jsonl)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Skip files already completed in the checkpoint')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='Verbose output')
     parser.add_argument('--dry-run', action='store_true',
@@ -435,6 +679,12 @@ Examples:
     args = parser.parse_args()
 
     # Validate arguments
+    if args.resume and not (args.output or args.checkpoint):
+        parser.error("--resume requires --output or --checkpoint")
+
+    if args.max_retries < 1:
+        parser.error("--max-retries must be at least 1")
+
     if args.task != 'generate' and not args.files:
         parser.error("--files required for non-generation tasks")
 
@@ -452,17 +702,27 @@ Examples:
 
     # Process files
     files = args.files or []
-    results = batch_process(
-        files=files,
-        prompt=args.prompt,
-        model=args.model,
-        task=args.task,
-        format_output=args.format_output,
-        aspect_ratio=args.aspect_ratio,
-        output_file=args.output,
-        verbose=args.verbose,
-        dry_run=args.dry_run
-    )
+    try:
+        results = batch_process(
+            files=files,
+            prompt=args.prompt,
+            model=args.model,
+            task=args.task,
+            format_output=args.format_output,
+            aspect_ratio=args.aspect_ratio,
+            output_file=args.output,
+            verbose=args.verbose,
+            dry_run=args.dry_run,
+            concurrency=args.concurrency,
+            rpm=args.rpm,
+            tpm=args.tpm,
+            max_retries=args.max_retries,
+            resume=args.resume,
+            checkpoint_file=args.checkpoint
+        )
+    except FileExistsError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
     # Print summary
     if not args.dry_run and results:
@@ -12,13 +12,17 @@ Features:
 """
 
 import argparse
+import csv
 import json
+import math
 import os
 import subprocess
 import sys
 from pathlib import Path
 from typing import Optional, Dict, Any, List
 
+import probe_cache
+
 try:
     from dotenv import load_dotenv
 except ImportError:
@@ -76,22 +80,12 @@ def check_ffmpeg() -> bool:
 
 
 def get_media_info(file_path: str) -> Dict[str, Any]:
-    """Get media file information using ffprobe."""
+    """Get media file information using ffprobe (cached, see probe_cache)."""
     if not check_ffmpeg():
         return {}
 
     try:
-        cmd = [
-            'ffprobe',
-            '-v', 'quiet',
-            '-print_format', 'json',
-            '-show_format',
-            '-show_streams',
-            file_path
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        data = json.loads(result.stdout)
+        data = probe_cache.probe(file_path)
 
         info = {
             'size': int(data['format'].get('size', 0)),
@@ -309,9 +303,19 @@ def split_video(
     input_path: str,
     output_dir: str,
     chunk_duration: int = 3600,
-    verbose: bool = False
+    verbose: bool = False,
+    overlap: int = 0
 ) -> List[str]:
-    """Split long video into chunks."""
+    """Split long video into keyframe-aligned chunks without re-encoding.
+
+    Without overlap, the segment muxer cuts the whole file in one demux pass,
+    at the first keyframe after each chunk_duration boundary. With overlap,
+    each chunk is cut with input seeking (-ss before -i jumps straight to the
+    keyframe at or before its start) and runs overlap seconds into the next;
+    the manifest records that keyframe, not the requested start.
+
+    Chunk start/end times are written to <output_dir>/<stem>_chunks.json.
+    """
     if not check_ffmpeg():
         print("Error: ffmpeg not installed")
         return []
@@ -321,25 +325,105 @@ def split_video(
         return []
 
     total_duration = info['duration']
-    num_chunks = int(total_duration / chunk_duration) + 1
-
-    if num_chunks == 1:
+    if total_duration <= chunk_duration:
         if verbose:
             print("Video is short enough, no splitting needed")
         return [input_path]
 
     Path(output_dir).mkdir(parents=True, exist_ok=True)
-    output_files = []
+
+    if overlap > 0:
+        chunks = _split_with_overlap(input_path, output_dir, total_duration,
+                                     chunk_duration, overlap, verbose)
+    else:
+        chunks = _split_single_pass(input_path, output_dir, chunk_duration, verbose)
+
+    if chunks:
+        manifest_path = Path(output_dir) / f"{Path(input_path).stem}_chunks.json"
+        with open(manifest_path, 'w') as f:
+            json.dump({
+                'source': str(input_path),
+                'chunk_duration': chunk_duration,
+                'overlap': overlap,
+                'chunks': chunks,
+            }, f, indent=2)
+        if verbose:
+            print(f"Chunk manifest: {manifest_path}")
+
+    return [chunk['file'] for chunk in chunks]
+
+
+def _split_single_pass(
+    input_path: str,
+    output_dir: str,
+    chunk_duration: int,
+    verbose: bool
+) -> List[Dict[str, Any]]:
+    """Cut all chunks with the segment muxer; returns [{file, start, end}]."""
+    stem = Path(input_path).stem
+    segment_list = Path(output_dir) / f"{stem}_segments.csv"
+    cmd = [
+        'ffmpeg', '-i', input_path, '-y',
+        '-c', 'copy',
+        '-f', 'segment',
+        '-segment_time', str(chunk_duration),
+        '-segment_start_number', '1',
+        '-reset_timestamps', '1',
+        '-segment_list', str(segment_list),
+        '-segment_list_type', 'csv',
+        str(Path(output_dir) / f"{stem}_chunk_%d.mp4")
+    ]
+
+    if verbose:
+        print("Splitting in a single pass...")
+
+    try:
+        subprocess.run(cmd, check=True, capture_output=not verbose)
+    except subprocess.CalledProcessError as e:
+        print(f"Error splitting video: {e}")
+        return []
+
+    # The list records where each chunk actually starts (on a keyframe)
+    chunks = []
+    with open(segment_list, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                continue
+            chunks.append({
+                'file': str(Path(output_dir) / Path(row[0]).name),
+                'start': float(row[1]),
+                'end': float(row[2]),
+            })
+    segment_list.unlink()
+    return chunks
+
+
+def _split_with_overlap(
+    input_path: str,
+    output_dir: str,
+    total_duration: float,
+    chunk_duration: int,
+    overlap: int,
+    verbose: bool
+) -> List[Dict[str, Any]]:
+    """Cut overlapping chunks with input seeking; returns [{file, start, end}].
+
+    Stream copy keeps everything from the keyframe before each requested
+    start, so the chunk really starts earlier. Its end is where -t stops, so
+    the actual start is read back as end minus the chunk's probed duration.
+    """
+    num_chunks = math.ceil(total_duration / chunk_duration)
+    chunks = []
 
     for i in range(num_chunks):
         start_time = i * chunk_duration
         output_file = Path(output_dir) / f"{Path(input_path).stem}_chunk_{i+1}.mp4"
 
         cmd = [
-            'ffmpeg', '-i', input_path, '-y',
-            '-ss', str(start_time),
-            '-t', str(chunk_duration),
+            'ffmpeg', '-ss', str(start_time), '-i', input_path, '-y',
+            '-t', str(chunk_duration + overlap),
             '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
             str(output_file)
         ]
 
@@ -348,11 +432,17 @@ def split_video(
 
         try:
             subprocess.run(cmd, check=True, capture_output=not verbose)
-            output_files.append(str(output_file))
+            end = float(min(start_time + chunk_duration + overlap, total_duration))
+            actual_duration = get_media_info(str(output_file)).get('duration')
+            chunks.append({
+                'file': str(output_file),
+                'start': max(0.0, round(end - actual_duration, 3)) if actual_duration else float(start_time),
+                'end': end,
+            })
         except subprocess.CalledProcessError as e:
             print(f"Error creating chunk {i+1}: {e}")
 
-    return output_files
+    return chunks
 
 
 def main():
@@ -393,10 +483,17 @@ Examples:
     parser.add_argument('--split', action='store_true', help='Split long video into chunks')
     parser.add_argument('--chunk-duration', type=int, default=3600,
                        help='Chunk duration in seconds (default: 3600 = 1 hour)')
+    parser.add_argument('--overlap', type=int, default=0,
+                       help='Seconds each chunk overlaps the next when splitting (default: 0)')
+    parser.add_argument('--probe-cache',
+                       help=f'JSON file caching ffprobe results across runs (default: ${probe_cache.CACHE_ENV})')
     parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output')
 
     args = parser.parse_args()
 
+    if args.probe_cache:
+        probe_cache.set_cache_file(Path(args.probe_cache))
+
     # Validate arguments
     if not args.input and not args.input_dir:
         parser.error("Either --input or --input-dir required")
@@ -410,7 +507,8 @@ Examples:
 
         if args.split:
             output_dir = args.output_dir or './chunks'
-            chunks = split_video(str(input_path), output_dir, args.chunk_duration, args.verbose)
+            chunks = split_video(str(input_path), output_dir, args.chunk_duration,
+                                 args.verbose, args.overlap)
             print(f"\nCreated {len(chunks)} chunks in {output_dir}")
             sys.exit(0)
 
@@ -0,0 +1,100 @@
+"""
+Tests for checkpoint.py
+"""
+
+import pytest
+import sys
+import json
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from checkpoint import Checkpoint, checkpoint_path_for, item_key
+
+
+class TestItemKey:
+    """Test checkpoint keys."""
+
+    def test_key_depends_on_content_not_path(self, tmp_path):
+        """Test identical content under another name has the same key."""
+        a = tmp_path / 'a.pdf'
+        b = tmp_path / 'b.pdf'
+        a.write_bytes(b'same')
+        b.write_bytes(b'same')
+
+        assert item_key(str(a), 'prompt', 'model') == item_key(str(b), 'prompt', 'model')
+
+    def test_key_changes_with_settings_and_content(self, tmp_path):
+        """Test content, prompt and model all change the key."""
+        doc = tmp_path / 'doc.pdf'
+        doc.write_bytes(b'v1')
+        key = item_key(str(doc), 'prompt', 'model')
+
+        assert item_key(str(doc), 'other prompt', 'model') != key
+        assert item_key(str(doc), 'prompt', 'other model') != key
+        doc.write_bytes(b'v2')
+        assert item_key(str(doc), 'prompt', 'model') != key
+
+    def test_missing_file_has_key(self, tmp_path):
+        """Test unreadable inputs still get a stable key."""
+        missing = str(tmp_path / 'missing.pdf')
+        assert item_key(missing, 'p', 'm') == item_key(missing, 'p', 'm')
+
+    def test_default_path(self):
+        """Test the checkpoint sits next to the output."""
+        assert checkpoint_path_for('out/results.md') == Path('out/results.checkpoint.jsonl')
+
+
+class TestCheckpoint:
+    """Test the JSONL checkpoint."""
+
+    def test_resume_reloads_results(self, tmp_path):
+        """Test recorded results survive a restart."""
+        path = tmp_path / 'run.checkpoint.jsonl'
+        with Checkpoint(path) as checkpoint:
+            checkpoint.record('k1', {'status': 'success', 'response': 'one'})
+            checkpoint.record('k2', {'status': 'error', 'error': 'boom'})
+
+        checkpoint = Checkpoint(path, resume=True)
+        assert checkpoint.completed('k1')
+        assert not checkpoint.completed('k2')  # Failures are retried
+        assert checkpoint.get('k2')['error'] == 'boom'
+
+        checkpoint.record('k2', {'status': 'success', 'response': 'two'})
+        checkpoint.close()
+        assert Checkpoint(path, resume=True).completed('k2')
+
+    def test_truncated_line_is_ignored(self, tmp_path):
+        """Test a partial last line from a crashed run is skipped."""
+        path = tmp_path / 'run.checkpoint.jsonl'
+        path.write_text(json.dumps({'key': 'k1', 'result': {'status': 'success'}}) + '\n{"key": "k2", "res')
+
+        checkpoint = Checkpoint(path, resume=True)
+        assert checkpoint.completed('k1')
+        assert checkpoint.get('k2') is None
+        checkpoint.close()
+
+    def test_without_resume_keeps_earlier_results(self, tmp_path):
+        """Test a new run refuses to overwrite results it was not told to resume."""
+        path = tmp_path / 'run.checkpoint.jsonl'
+        with Checkpoint(path) as checkpoint:
+            checkpoint.record('k1', {'status': 'success'})
+
+        with pytest.raises(FileExistsError, match='--resume'):
+            Checkpoint(path)
+        with Checkpoint(path, resume=True) as checkpoint:
+            assert checkpoint.completed('k1')
+
+    def test_without_resume_reuses_empty_checkpoint(self, tmp_path):
+        """Test an empty checkpoint from a run that recorded nothing is reused."""
+        path = tmp_path / 'run.checkpoint.jsonl'
+        path.write_text('')
+
+        with Checkpoint(path) as checkpoint:
+            checkpoint.record('k1', {'status': 'success'})
+        with Checkpoint(path, resume=True) as checkpoint:
+            assert checkpoint.completed('k1')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
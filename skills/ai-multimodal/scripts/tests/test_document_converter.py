@@ -295,5 +295,41 @@ class TestIntegration:
         assert deps['pillow'] is True
 
 
+
+class TestResumableConversion:
+    """Test checkpointed batch conversion."""
+
+    @patch('document_converter.find_api_key')
+    @patch('document_converter.genai.Client')
+    @patch('document_converter.convert_to_markdown')
+    def test_resume_skips_converted_files(self, mock_convert, mock_client_class, mock_find_key, tmp_path):
+        """Test a resumed run converts only the remaining files."""
+        mock_find_key.return_value = 'test_key'
+        files = []
+        for name in ('a.pdf', 'b.pdf'):
+            doc = tmp_path / name
+            doc.write_bytes(name.encode())
+            files.append(str(doc))
+        output = tmp_path / 'out.md'
+
+        mock_convert.side_effect = [
+            {'file': files[0], 'status': 'success', 'markdown': '# A'},
+            {'file': files[1], 'status': 'error', 'error': 'timeout', 'markdown': None},
+        ]
+        dc.batch_convert(files, output_file=str(output))
+        assert (tmp_path / 'out.checkpoint.jsonl').exists()  # Kept to retry the failure
+
+        mock_convert.reset_mock()
+        mock_convert.side_effect = [{'file': files[1], 'status': 'success', 'markdown': '# B'}]
+        results = dc.batch_convert(files, output_file=str(output), resume=True)
+
+        assert mock_convert.call_count == 1
+        assert mock_convert.call_args.kwargs['file_path'] == files[1]
+        assert [r['status'] for r in results] == ['success', 'success']
+        text = output.read_text()
+        assert '# A' in text and '# B' in text
+        assert not (tmp_path / 'out.checkpoint.jsonl').exists()  # Removed once complete
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v', '--cov=document_converter', '--cov-report=term-missing'])
@@ -4,7 +4,12 @@ Tests for gemini_batch_process.py
 
 import pytest
 import sys
+import json
+import httpx
+import threading
+import time
 from pathlib import Path
+from types import SimpleNamespace
 from unittest.mock import Mock, patch, MagicMock
 
 # Add parent directory to path
@@ -311,6 +316,292 @@ class TestBatchProcessing:
         assert results == []
 
 
+class StubAPIError(Exception):
+    """Error carrying an HTTP status code, like google.genai.errors.APIError."""
+
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class StubClient:
+    """Local stand-in for genai.Client that tracks concurrent calls."""
+
+    def __init__(self, errors=None, delay=0.0):
+        self.models = self
+        self.errors = list(errors or [])
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def generate_content(self, model, contents, config=None):
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            error = self.errors.pop(0) if self.errors else None
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            if error:
+                raise error
+            return SimpleNamespace(text=f"ok {len(contents)}",
+                                   usage_metadata=SimpleNamespace(prompt_token_count=300,
+                                                                  total_token_count=900))
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class TestRateLimiting:
+    """Test token buckets and retry policy."""
+
+    def test_token_bucket_waits_for_refill(self):
+        """Test a drained bucket waits for the refill rate."""
+        now = [0.0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        bucket = gbp.TokenBucket(60, capacity=2, clock=lambda: now[0], sleep=sleep)
+
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == pytest.approx(1.0)
+        assert now[0] == pytest.approx(1.0)
+
+    def test_token_bucket_adjust(self):
+        """Test usage corrections charge or refund the bucket."""
+        now = [0.0]
+        bucket = gbp.TokenBucket(600, clock=lambda: now[0], sleep=lambda s: None)
+
+        bucket.acquire(100)
+        bucket.adjust(200)
+        assert bucket.tokens == pytest.approx(300)
+        bucket.adjust(-1000)
+        assert bucket.tokens == pytest.approx(600)
+
+    def test_is_retryable(self):
+        """Test only transient errors are retried."""
+        assert gbp.is_retryable(StubAPIError(429))
+        assert gbp.is_retryable(StubAPIError(503))
+        assert gbp.is_retryable(ConnectionError())
+        assert gbp.is_retryable(httpx.ConnectError('connection refused'))
+        assert gbp.is_retryable(httpx.ReadTimeout('timed out'))
+        assert not gbp.is_retryable(StubAPIError(400))
+        assert not gbp.is_retryable(ValueError("bad input"))
+
+    def test_backoff_delay_has_jitter(self):
+        """Test delays grow exponentially within jitter bounds."""
+        delays = [gbp.backoff_delay(2) for _ in range(50)]
+
+        assert all(4.0 <= d <= 8.0 for d in delays)
+        assert len(set(delays)) > 1
+        assert gbp.backoff_delay(20) <= 60.0
+
+    def test_estimate_tokens_image(self, tmp_path):
+        """Test images cost a fixed number of tokens."""
+        image = tmp_path / 'a.png'
+        image.write_bytes(b'x' * 5000)
+
+        assert gbp.estimate_tokens(str(image), 'Describe') == len('Describe') // 4 + 1 + gbp.IMAGE_TOKENS
+
+    def test_estimate_tokens_pdf(self, tmp_path):
+        """Test PDFs cost a fixed number of tokens per page."""
+        from pypdf import PdfWriter
+        writer = PdfWriter()
+        for _ in range(3):
+            writer.add_blank_page(100, 100)
+        pdf = tmp_path / 'a.pdf'
+        with open(pdf, 'wb') as f:
+            writer.write(f)
+
+        assert gbp.count_pdf_pages(pdf) == 3
+        assert gbp.estimate_tokens(str(pdf), '') == 1 + 3 * gbp.PDF_TOKENS_PER_PAGE
+
+    @patch('gemini_batch_process.PDF_SCAN_CHUNK', 7)
+    @patch('pypdf.PdfReader', side_effect=ValueError('damaged'))
+    def test_count_pdf_pages_scans_in_chunks(self, mock_reader, tmp_path):
+        """Test the fallback scan counts page objects split across chunks exactly once."""
+        pdf = tmp_path / 'a.pdf'
+        pdf.write_bytes(b'%PDF-1.4 /Type /Pages ' + b'/Type /Page >> /Type  /Page/' * 5 + b'/Type /Page')
+
+        assert gbp.count_pdf_pages(pdf) == 10
+
+    def test_max_retries_must_be_positive(self, monkeypatch, capsys):
+        """Test --max-retries 0 is rejected instead of failing every file."""
+        monkeypatch.setattr(sys, 'argv', ['gemini_batch_process.py', '--files', 'a.png',
+                                          '--task', 'analyze', '--max-retries', '0'])
+
+        with pytest.raises(SystemExit) as exc:
+            gbp.main()
+
+        assert exc.value.code == 2
+        assert '--max-retries must be at least 1' in capsys.readouterr().err
+
+    @patch('gemini_batch_process.time.sleep')
+    def test_retries_rate_limit_then_succeeds(self, mock_sleep, tmp_path):
+        """Test a 429 is retried after a backoff."""
+        image = tmp_path / 'a.png'
+        image.write_bytes(b'data')
+        client = StubClient(errors=[StubAPIError(429)])
+
+        result = gbp.process_file(client, str(image), 'Describe', 'gemini-2.5-flash',
+                                  'analyze', 'text')
+
+        assert result['status'] == 'success'
+        assert client.calls == 2
+        mock_sleep.assert_called_once()
+
+    @patch('gemini_batch_process.time.sleep')
+    def test_retries_network_errors(self, mock_sleep, tmp_path):
+        """Test httpx transport errors raised by the client are retried."""
+        image = tmp_path / 'a.png'
+        image.write_bytes(b'data')
+        client = StubClient(errors=[httpx.ReadTimeout('timed out'), httpx.ConnectError('reset')])
+
+        result = gbp.process_file(client, str(image), 'Describe', 'gemini-2.5-flash',
+                                  'analyze', 'text')
+
+        assert result['status'] == 'success'
+        assert client.calls == 3
+
+    def test_tpm_is_settled_with_input_tokens(self, tmp_path):
+        """Test the TPM bucket is corrected with prompt tokens, not output tokens."""
+        image = tmp_path / 'a.png'
+        image.write_bytes(b'data')
+        limiter = gbp.RateLimiter(tpm=10000)
+
+        gbp.process_file(StubClient(), str(image), 'Describe', 'gemini-2.5-flash',
+                         'analyze', 'text', limiter=limiter)
+
+        assert limiter.tokens.tokens == pytest.approx(10000 - 300, abs=5)
+
+    @patch('gemini_batch_process.time.sleep')
+    def test_client_errors_are_not_retried(self, mock_sleep, tmp_path):
+        """Test a 400 fails immediately."""
+        image = tmp_path / 'a.png'
+        image.write_bytes(b'data')
+        client = StubClient(errors=[StubAPIError(400)])
+
+        result = gbp.process_file(client, str(image), 'Describe', 'gemini-2.5-flash',
+                                  'analyze', 'text')
+
+        assert result['status'] == 'error'
+        assert client.calls == 1
+        mock_sleep.assert_not_called()
+
+
+class TestConcurrentBatch:
+    """Test the concurrent scheduler with a stub client."""
+
+    @patch('gemini_batch_process.find_api_key')
+    @patch('gemini_batch_process.genai.Client')
+    def test_runs_concurrently_in_order(self, mock_client_class, mock_find_key, tmp_path, capsys):
+        """Test files run in parallel and results keep input order."""
+        mock_find_key.return_value = 'test_key'
+        client = StubClient(delay=0.05)
+        mock_client_class.return_value = client
+        files = []
+        for i in range(6):
+            image = tmp_path / f'{i}.png'
+            image.write_bytes(b'data')
+            files.append(str(image))
+
+        results = gbp.batch_process(
+            files=files,
+            prompt='Describe',
+            model='gemini-2.5-flash',
+            task='analyze',
+            format_output='text',
+            concurrency=3,
+            rpm=600,
+            tpm=1000000
+        )
+
+        assert [r['file'] for r in results] == files
+        assert all(r['status'] == 'success' for r in results)
+        assert 1 < client.peak <= 3
+        assert '[6/6]' in capsys.readouterr().out
+
+    @patch('gemini_batch_process.find_api_key')
+    @patch('gemini_batch_process.genai.Client')
+    def test_missing_file_does_not_abort_batch(self, mock_client_class, mock_find_key, tmp_path):
+        """Test an unreadable input is reported as an error and the rest still run."""
+        mock_find_key.return_value = 'test_key'
+        mock_client_class.return_value = StubClient()
+        image = tmp_path / 'a.png'
+        image.write_bytes(b'data')
+        missing = str(tmp_path / 'missing.png')
+
+        results = gbp.batch_process(
+            files=[missing, str(image)],
+            prompt='Describe',
+            model='gemini-2.5-flash',
+            task='analyze',
+            format_output='text',
+            tpm=100000
+        )
+
+        assert results[0]['status'] == 'error'
+        assert results[1]['status'] == 'success'
+
+    @patch('gemini_batch_process.find_api_key')
+    @patch('gemini_batch_process.genai.Client')
+    def test_resume_skips_completed_files(self, mock_client_class, mock_find_key, tmp_path):
+        """Test a resumed run only retries unfinished files and reports all of them."""
+        mock_find_key.return_value = 'test_key'
+        files = []
+        for i in range(3):
+            image = tmp_path / f'{i}.png'
+            image.write_bytes(f'data {i}'.encode())
+            files.append(str(image))
+        output = tmp_path / 'results.json'
+        args = dict(prompt='Describe', model='gemini-2.5-flash', task='analyze',
+                    format_output='json', output_file=str(output), concurrency=1)
+
+        # First run: the second file fails with a non-retryable error
+        first = StubClient(errors=[None, StubAPIError(400)])
+        mock_client_class.return_value = first
+        results = gbp.batch_process(files=files, **args)
+        assert [r['status'] for r in results] == ['success', 'error', 'success']
+        assert (tmp_path / 'results.checkpoint.jsonl').exists()
+
+        second = StubClient()
+        mock_client_class.return_value = second
+        results = gbp.batch_process(files=files, resume=True, **args)
+
+        assert second.calls == 1
+        assert [r['status'] for r in results] == ['success'] * 3
+        assert [r['file'] for r in json.loads(output.read_text())] == files
+        assert not (tmp_path / 'results.checkpoint.jsonl').exists()  # Removed once complete
+
+    @patch('gemini_batch_process.find_api_key')
+    @patch('gemini_batch_process.genai.Client')
+    def test_interrupted_run_closes_checkpoint(self, mock_client_class, mock_find_key, tmp_path):
+        """Test the checkpoint is closed and keeps finished files when the run dies."""
+        mock_find_key.return_value = 'test_key'
+        mock_client_class.return_value = StubClient()
+        image = tmp_path / 'a.png'
+        image.write_bytes(b'data')
+        checkpoint_file = tmp_path / 'run.checkpoint.jsonl'
+
+        with patch('gemini_batch_process.print_progress', side_effect=KeyboardInterrupt), \
+                patch.object(gbp.Checkpoint, 'close', autospec=True,
+                             side_effect=gbp.Checkpoint.close) as mock_close:
+            with pytest.raises(KeyboardInterrupt):
+                gbp.batch_process(files=[str(image)], prompt='Describe', model='gemini-2.5-flash',
+                                  task='analyze', format_output='text',
+                                  checkpoint_file=str(checkpoint_file))
+
+        assert mock_close.called
+        key = gbp.item_key(str(image), 'Describe', 'gemini-2.5-flash', 'analyze', 'text')
+        with gbp.Checkpoint(checkpoint_file, resume=True) as checkpoint:
+            assert checkpoint.completed(key)
+
+
 class TestResultsSaving:
     """Test results saving functionality."""
 
@@ -111,6 +111,23 @@ class TestMediaInfo:
         info = mo.get_media_info('test.mp4')
         assert info == {}
 
+    @patch('media_optimizer.check_ffmpeg')
+    @patch('subprocess.run')
+    def test_get_media_info_probes_once(self, mock_run, mock_check, tmp_path):
+        """Test unchanged files are probed only once."""
+        mock_check.return_value = True
+        mock_result = Mock()
+        mock_result.stdout = json.dumps({'format': {'duration': '60.0'}, 'streams': []})
+        mock_run.return_value = mock_result
+        media = tmp_path / 'clip.mp4'
+        media.write_bytes(b'data')
+
+        mo.probe_cache.clear()
+        assert mo.get_media_info(str(media))['duration'] == 60.0
+        assert mo.get_media_info(str(media))['duration'] == 60.0
+        assert mock_run.call_count == 1
+        mo.probe_cache.clear()
+
 
 class TestVideoOptimization:
     """Test video optimization functionality."""
@@ -327,22 +344,72 @@ class TestVideoSplitting:
     @patch('media_optimizer.check_ffmpeg')
     @patch('media_optimizer.get_media_info')
     @patch('subprocess.run')
-    @patch('pathlib.Path.mkdir')
-    def test_split_video_success(self, mock_mkdir, mock_run, mock_info, mock_check):
-        """Test successful video splitting."""
+    def test_split_video_success(self, mock_run, mock_info, mock_check, tmp_path):
+        """Test splitting in a single segment-muxer pass."""
         mock_check.return_value = True
         mock_info.return_value = {'duration': 7200.0}  # 2 hours
 
+        def fake_ffmpeg(cmd, **kwargs):
+            segment_list = Path(cmd[cmd.index('-segment_list') + 1])
+            segment_list.write_text(
+                'input_chunk_1.mp4,0.000000,3601.200000\n'
+                'input_chunk_2.mp4,3601.200000,7200.000000\n'
+            )
+
+        mock_run.side_effect = fake_ffmpeg
+
         result = mo.split_video(
             'input.mp4',
-            './chunks',
+            str(tmp_path),
             chunk_duration=3600,  # 1 hour chunks
             verbose=False
         )
 
-        # Duration 7200s / 3600s = 2, +1 for safety = 3 chunks
+        assert result == [str(tmp_path / 'input_chunk_1.mp4'), str(tmp_path / 'input_chunk_2.mp4')]
+        assert mock_run.call_count == 1
+        cmd = mock_run.call_args[0][0]
+        assert cmd[cmd.index('-f') + 1] == 'segment'
+        assert cmd[cmd.index('-c') + 1] == 'copy'
+
+        manifest = json.loads((tmp_path / 'input_chunks.json').read_text())
+        assert [c['start'] for c in manifest['chunks']] == [0.0, 3601.2]
+        assert not (tmp_path / 'input_segments.csv').exists()
+
+    @patch('media_optimizer.check_ffmpeg')
+    @patch('media_optimizer.get_media_info')
+    @patch('subprocess.run')
+    def test_split_video_with_overlap(self, mock_run, mock_info, mock_check, tmp_path):
+        """Test overlapping chunks use input seeking and record their keyframe starts."""
+        mock_check.return_value = True
+        # Chunks 2 and 3 start 2.5s and 1s before the requested time, on a keyframe
+        durations = {'input.mp4': 7500.0, 'input_chunk_1.mp4': 3630.0,
+                     'input_chunk_2.mp4': 3632.5, 'input_chunk_3.mp4': 301.0}
+        mock_info.side_effect = lambda path: {'duration': durations[Path(path).name]}
+
+        result = mo.split_video('input.mp4', str(tmp_path), chunk_duration=3600, overlap=30)
+
         assert len(result) == 3
-        assert mock_run.call_count == 3
+        cmds = [c[0][0] for c in mock_run.call_args_list]
+        assert all(cmd.index('-ss') < cmd.index('-i') for cmd in cmds)
+        assert cmds[1][cmds[1].index('-t') + 1] == '3630'
+
+        manifest = json.loads((tmp_path / 'input_chunks.json').read_text())
+        assert [(c['start'], c['end']) for c in manifest['chunks']] == [
+            (0.0, 3630.0), (3597.5, 7230.0), (7199.0, 7500.0)
+        ]
+
+    @patch('media_optimizer.check_ffmpeg')
+    @patch('media_optimizer.get_media_info')
+    @patch('subprocess.run')
+    def test_split_video_with_overlap_unprobed_chunk(self, mock_run, mock_info, mock_check, tmp_path):
+        """Test the requested start is kept when a chunk cannot be probed."""
+        mock_check.return_value = True
+        mock_info.side_effect = lambda path: {'duration': 7500.0} if path == 'input.mp4' else {}
+
+        mo.split_video('input.mp4', str(tmp_path), chunk_duration=3600, overlap=30)
+
+        manifest = json.loads((tmp_path / 'input_chunks.json').read_text())
+        assert [c['start'] for c in manifest['chunks']] == [0.0, 3600.0, 7200.0]
 
     @patch('media_optimizer.check_ffmpeg')
     @patch('media_optimizer.get_media_info')
@@ -8,13 +8,14 @@ Example usage:
 
 import argparse
 import shutil
-import subprocess
 import sys
 import tempfile
 import defusedxml.minidom
 import zipfile
 from pathlib import Path
 
+from soffice import get_service
+
 
 def main():
     parser = argparse.ArgumentParser(description="Pack a directory into an Office file")
@@ -88,7 +89,7 @@ def pack_document(input_dir, output_file, validate=False):
 
 
 def validate_document(doc_path):
-    """Validate document by converting to HTML with soffice."""
+    """Validate document by converting to HTML with the shared soffice service."""
     # Determine the correct filter based on file extension
     match doc_path.suffix.lower():
         case ".docx":
@@ -100,33 +101,17 @@ def validate_document(doc_path):
 
     with tempfile.TemporaryDirectory() as temp_dir:
         try:
-            result = subprocess.run(
-                [
-                    "soffice",
-                    "--headless",
-                    "--convert-to",
-                    filter_name,
-                    "--outdir",
-                    temp_dir,
-                    str(doc_path),
-                ],
-                capture_output=True,
-                timeout=10,
-                text=True,
-            )
-            if not (Path(temp_dir) / f"{doc_path.stem}.html").exists():
-                error_msg = result.stderr.strip() or "Document validation failed"
-                print(f"Validation error: {error_msg}", file=sys.stderr)
-                return False
+            get_service().convert(doc_path, filter_name, temp_dir, timeout=10)
             return True
         except FileNotFoundError:
             print("Warning: soffice not found. Skipping validation.", file=sys.stderr)
             return True
-        except subprocess.TimeoutExpired:
+        except TimeoutError:
             print("Validation error: Timeout during conversion", file=sys.stderr)
             return False
         except Exception as e:
-            print(f"Validation error: {e}", file=sys.stderr)
+            error_msg = str(e) or "Document validation failed"
+            print(f"Validation error: {error_msg}", file=sys.stderr)
             return False
 
 
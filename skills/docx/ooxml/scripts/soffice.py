@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Shared headless LibreOffice conversion service.
+
+Starting soffice takes seconds, which dominates batch pipelines that convert,
+validate or recalculate many documents. This module keeps one warm headless
+instance listening on a local socket and drives it over UNO, so only the first
+job pays the startup cost. Each job runs with its own timeout; if a job times
+out or the instance crashes, the instance is restarted and the job reported as
+failed (timeouts) or retried once (crashes).
+
+If a daemon started with `serve` is already listening on the port, clients
+connect to it instead of launching their own instance, so separate processes
+share one warm soffice. Such clients cannot restart the daemon's instance, so
+a job that hangs or crashes it fails instead of being retried. Without the UNO Python bridge (python3-uno), conversions
+fall back to a one-shot `soffice --headless --convert-to` subprocess per call.
+
+Usage:
+    python soffice.py serve [--port 2002]
+
+Library usage:
+    from soffice import get_service
+
+    get_service().convert("deck.pptx", "pdf", "out_dir")
+    get_service().convert("doc.docx", "html:HTML", "out_dir", timeout=10)
+    get_service().recalculate("model.xlsx")
+"""
+
+import argparse
+import atexit
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pathlib import Path
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+except ImportError:  # LibreOffice's Python bridge is optional
+    uno = None
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = int(os.environ.get("SOFFICE_PORT", "2002"))
+DEFAULT_TIMEOUT = 60  # Per-job timeout in seconds
+STARTUP_TIMEOUT = 30  # Seconds to wait for a new instance to accept connections
+
+# Export filters used for "pdf" when no filter name is given, by document type
+PDF_FILTERS = [
+    ("com.sun.star.presentation.PresentationDocument", "impress_pdf_Export"),
+    ("com.sun.star.sheet.SpreadsheetDocument", "calc_pdf_Export"),
+    ("com.sun.star.drawing.DrawingDocument", "draw_pdf_Export"),
+    ("com.sun.star.text.TextDocument", "writer_pdf_Export"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a warm headless LibreOffice instance for conversion jobs"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="Start and supervise soffice")
+    serve_parser.add_argument("--host", default=DEFAULT_HOST)
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    if uno is None:
+        sys.exit("Error: the LibreOffice Python bridge (uno) is not available")
+
+    service = SofficeService(args.host, args.port)
+    service.start()
+    if not service.owns_process:
+        sys.exit(f"Error: soffice is already listening on {args.host}:{args.port}")
+    print(f"soffice listening on {args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        # Supervise the instance and restart it whenever it exits
+        while True:
+            time.sleep(1)
+            if service.poll() is not None:
+                print("soffice exited, restarting...", file=sys.stderr)
+                service.restart()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+
+
+def _props(**kwargs):
+    """Build a UNO PropertyValue tuple from keyword arguments."""
+    return tuple(PropertyValue(Name=k, Value=v) for k, v in kwargs.items())
+
+
+class SofficeService:
+    """Client for a warm headless soffice instance, launched on first use."""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self._process = None  # Only set when this service owns the instance
+        self._profile_dir = None
+        self._desktop = None
+        self._uno_failed = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    @property
+    def available(self):
+        """True if jobs can run on a warm instance over UNO."""
+        return uno is not None and not self._uno_failed
+
+    @property
+    def owns_process(self):
+        """True if this service launched the instance it is connected to."""
+        return self._process is not None
+
+    def poll(self):
+        """Exit code of the owned instance, or None if it is running or not owned."""
+        return self._process.poll() if self._process is not None else None
+
+    def start(self):
+        """Connect to a listening instance, launching one if none is running."""
+        if self._desktop is not None:
+            return
+        if not self._port_open():
+            self._launch()
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            try:
+                self._desktop = self._connect()
+                return
+            except Exception:
+                if self._process is not None and self._process.poll() is not None:
+                    raise RuntimeError("soffice exited during startup")
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Timed out waiting for soffice to start")
+                time.sleep(0.25)
+
+    def restart(self):
+        """Kill the owned instance and start a fresh one.
+
+        Raises RuntimeError when connected to another process's instance (a
+        `serve` daemon), which this service cannot kill.
+        """
+        if self._desktop is not None and not self.owns_process:
+            self._desktop = None  # Reconnect on the next job
+            raise RuntimeError(
+                f"soffice on {self.host}:{self.port} belongs to another process "
+                "and cannot be restarted from here"
+            )
+        self._stop_process()
+        self.start()
+
+    def shutdown(self):
+        """Terminate the owned instance and remove its temporary profile."""
+        self._stop_process()
+        self._executor.shutdown(wait=False)
+
+    def convert(self, src, convert_to, outdir, timeout=DEFAULT_TIMEOUT):
+        """Convert src into outdir, using soffice --convert-to syntax ("ext[:filter]").
+
+        Returns the path of the converted file. Raises TimeoutError if the job
+        exceeds timeout, FileNotFoundError if soffice is not installed and
+        RuntimeError if the conversion fails.
+        """
+        src = Path(src).absolute()
+        outdir = Path(outdir)
+        ext, _, filter_name = convert_to.partition(":")
+        output = outdir / f"{src.stem}.{ext}"
+
+        if self.available:
+            try:
+                self.start()
+            except (FileNotFoundError, RuntimeError) as e:
+                print(f"Warning: soffice service unavailable ({e})", file=sys.stderr)
+                self._uno_failed = True
+        if not self.available:
+            return self._convert_subprocess(src, convert_to, outdir, output, timeout)
+
+        def job(desktop):
+            doc = desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(str(src)), "_blank", 0, _props(Hidden=True)
+            )
+            if doc is None:
+                raise RuntimeError(f"Could not load {src}")
+            try:
+                name = filter_name or self._default_filter(doc, ext)
+                outdir.mkdir(parents=True, exist_ok=True)
+                doc.storeToURL(
+                    uno.systemPathToFileUrl(str(output.absolute())),
+                    _props(FilterName=name, Overwrite=True),
+                )
+            finally:
+                doc.close(True)
+
+        self._run(job, timeout)
+        if not output.exists():
+            raise RuntimeError(f"Conversion of {src.name} produced no output")
+        return output
+
+    def recalculate(self, path, timeout=DEFAULT_TIMEOUT):
+        """Recalculate all formulas in a spreadsheet and save it in place.
+
+        Requires the UNO bridge; raises RuntimeError if it is unavailable.
+        """
+        if not self.available:
+            raise RuntimeError("Recalculation requires the LibreOffice UNO bridge")
+        self.start()
+        path = Path(path).absolute()
+
+        def job(desktop):
+            doc = desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(str(path)), "_blank", 0, _props(Hidden=True)
+            )
+            if doc is None:
+                raise RuntimeError(f"Could not load {path}")
+            try:
+                doc.calculateAll()
+                doc.store()
+            finally:
+                doc.close(True)
+
+        self._run(job, timeout)
+
+    def _run(self, job, timeout):
+        """Run job(desktop) with a timeout, restarting soffice on hangs or crashes."""
+        with self._lock:
+            for attempt in range(2):
+                future = self._executor.submit(job, self._desktop)
+                try:
+                    return future.result(timeout=timeout)
+                except FutureTimeoutError:
+                    # The hung call keeps the worker busy; replace both
+                    self._executor.shutdown(wait=False)
+                    self._executor = ThreadPoolExecutor(max_workers=1)
+                    if self.owns_process:
+                        self.restart()
+                    else:
+                        self._desktop = None  # Another process's instance; just disconnect
+                    raise TimeoutError(f"soffice job exceeded {timeout}s")
+                except Exception:
+                    if attempt or self._connection_alive():
+                        raise
+                    # The instance crashed under us: start a new one and retry
+                    # (restart raises if the instance is another process's)
+                    self.restart()
+
+    def _connection_alive(self):
+        try:
+            self._desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def _default_filter(self, doc, ext):
+        if ext != "pdf":
+            raise ValueError(f"Specify a filter for '{ext}' (e.g. '{ext}:FilterName')")
+        for service_name, filter_name in PDF_FILTERS:
+            if doc.supportsService(service_name):
+                return filter_name
+        return "writer_pdf_Export"
+
+    def _convert_subprocess(self, src, convert_to, outdir, output, timeout):
+        """Fallback: one cold soffice process per conversion."""
+        try:
+            result = subprocess.run(
+                [
+                    "soffice",
+                    "--headless",
+                    "--convert-to",
+                    convert_to,
+                    "--outdir",
+                    str(outdir),
+                    str(src),
+                ],
+                capture_output=True,
+                timeout=timeout,
+                text=True,
+            )
+        except subprocess.TimeoutExpired:
+            raise TimeoutError(f"soffice job exceeded {timeout}s")
+        if not output.exists():
+            error_msg = result.stderr.strip() or f"Conversion of {src.name} failed"
+            raise RuntimeError(error_msg)
+        return output
+
+    def _port_open(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.settimeout(0.5)
+            return sock.connect_ex((self.host, self.port)) == 0
+
+    def _launch(self):
+        # A private profile avoids clashing with the user's own soffice session
+        self._profile_dir = tempfile.mkdtemp(prefix="soffice-profile-")
+        self._process = subprocess.Popen(
+            [
+                "soffice",
+                "--headless",
+                "--invisible",
+                "--nologo",
+                "--nodefault",
+                "--norestore",
+                f"-env:UserInstallation={Path(self._profile_dir).as_uri()}",
+                f"--accept=socket,host={self.host},port={self.port};urp;"
+                "StarOffice.ComponentContext",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def _connect(self):
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_context
+        )
+        context = resolver.resolve(
+            f"uno:socket,host={self.host},port={self.port};urp;"
+            "StarOffice.ComponentContext"
+        )
+        return context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.frame.Desktop", context
+        )
+
+    def _stop_process(self):
+        self._desktop = None
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+        if self._profile_dir is not None:
+            shutil.rmtree(self._profile_dir, ignore_errors=True)
+            self._profile_dir = None
+
+
+_service = None
+
+
+def get_service():
+    """Return the process-wide SofficeService, shut down at interpreter exit."""
+    global _service
+    if _service is None:
+        _service = SofficeService()
+        atexit.register(_service.shutdown)
+    return _service
+
+
+if __name__ == "__main__":
+    main()
@@ -4,22 +4,286 @@ Batch image resizing with multiple strategies.
 
 Supports aspect ratio maintenance, smart cropping, thumbnail generation,
 watermarks, format conversion, and parallel processing.
+
+Resizing runs in-process by default (Pillow, or libvips via pyvips) in a
+process pool sized to the CPU count, falling back to ImageMagick for formats
+the in-process backend does not handle (e.g. animated GIF).
+
+Pipeline mode (--sizes/--formats) generates responsive variants with Pillow:
+each source is decoded once, resized in a descending cascade, and every
+size/format variant is encoded from memory.
 """
 
 import argparse
+import json
+import os
 import subprocess
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from incremental import BuildManifest, file_hash
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional
+    Image = None
+    ImageOps = None
+
+try:
+    import pyvips
+except (ImportError, OSError):  # pyvips is optional and needs libvips
+    pyvips = None
+
+
+# Output format name -> Pillow format
+PILLOW_FORMATS = {
+    'jpg': 'JPEG',
+    'jpeg': 'JPEG',
+    'png': 'PNG',
+    'webp': 'WEBP',
+    'avif': 'AVIF',
+}
+
+# Inputs decoded in-process; anything else (GIF animations, SVG, HEIC, ...)
+# goes through ImageMagick
+IN_PROCESS_INPUTS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff'}
+
+BACKENDS = ['auto', 'pillow', 'vips', 'magick']
+EXIF_ORIENTATION = 0x0112
+
+
+def target_geometry(
+    src_width: int,
+    src_height: int,
+    width: Optional[int],
+    height: Optional[int],
+    strategy: str
+) -> Tuple[int, int, Optional[Tuple[int, int, int, int]]]:
+    """
+    Compute the resize dimensions and center crop box for a strategy.
+
+    Mirrors the ImageMagick geometry used by build_resize_command.
+
+    Returns:
+        (resize_width, resize_height, crop_box or None)
+    """
+    if strategy in ('fill', 'cover', 'exact') and (not width or not height):
+        raise ValueError(f"Both width and height required for '{strategy}' strategy")
+
+    if strategy == 'thumbnail':
+        width = height = width or height or 200
+        strategy = 'fill'
+
+    if strategy == 'exact':
+        return width, height, None
+
+    scales = []
+    if width:
+        scales.append(width / src_width)
+    if height:
+        scales.append(height / src_height)
+    scale = max(scales) if strategy in ('fill', 'cover') else min(scales)
+    resize_width = max(1, round(src_width * scale))
+    resize_height = max(1, round(src_height * scale))
+
+    if strategy != 'fill':
+        return resize_width, resize_height, None
+
+    left = (resize_width - width) // 2
+    top = (resize_height - height) // 2
+    return resize_width, resize_height, (left, top, left + width, top + height)
+
+
+def save_image(image, output_path: Path, fmt: str, quality: int) -> None:
+    """Encode a Pillow image to output_path without metadata."""
+    pillow_format = PILLOW_FORMATS[fmt.lower()]
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha; flatten onto white like ImageMagick does
+        rgba = image.convert('RGBA')
+        flattened = Image.new('RGB', image.size, (255, 255, 255))
+        flattened.paste(rgba, mask=rgba.getchannel('A'))
+        image = flattened
+    elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    options = {'quality': quality}
+    if pillow_format == 'JPEG':
+        options.update(optimize=True, progressive=True)
+    elif pillow_format == 'PNG':
+        options = {'optimize': True}
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    image.save(output_path, pillow_format, **options)
+
+
+class PillowBackend:
+    """Resize in-process with Pillow."""
+
+    name = 'pillow'
+
+    @staticmethod
+    def available() -> bool:
+        return Image is not None
+
+    @staticmethod
+    def supports(input_path: Path, output_path: Path) -> bool:
+        return (
+            input_path.suffix.lower() in IN_PROCESS_INPUTS
+            and output_path.suffix.lower().lstrip('.') in PILLOW_FORMATS
+        )
+
+    def resize(
+        self,
+        input_path: Path,
+        output_path: Path,
+        width: Optional[int],
+        height: Optional[int],
+        strategy: str,
+        quality: int,
+        watermark: Optional[Path] = None
+    ) -> None:
+        with Image.open(input_path) as image:
+            stored_size = image.size
+            rotated = image.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8)
+            upright_size = stored_size[::-1] if rotated else stored_size
+            resize_width, resize_height, crop = target_geometry(
+                *upright_size, width, height, strategy
+            )
+            # JPEG shrink-on-load: decode at the smallest 1/2, 1/4 or 1/8
+            # scale that is still at least the target size (no-op otherwise)
+            draft_size = (resize_height, resize_width) if rotated else (resize_width, resize_height)
+            image.draft(image.mode, draft_size)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+
+        if image.size != (resize_width, resize_height):
+            image = image.resize((resize_width, resize_height), Image.LANCZOS)
+        if crop:
+            image = image.crop(crop)
+
+        if watermark:
+            with Image.open(watermark) as mark:
+                mark = mark.convert('RGBA')
+                image = image.convert('RGBA')
+                position = (image.width - mark.width - 10, image.height - mark.height - 10)
+                image.alpha_composite(mark, (max(0, position[0]), max(0, position[1])))
+
+        save_image(image, output_path, output_path.suffix.lstrip('.'), quality)
+
+
+class VipsBackend:
+    """Resize in-process with libvips (pyvips), streaming with shrink-on-load."""
+
+    name = 'vips'
+
+    @staticmethod
+    def available() -> bool:
+        return pyvips is not None
+
+    @staticmethod
+    def supports(input_path: Path, output_path: Path) -> bool:
+        return PillowBackend.supports(input_path, output_path)
+
+    def resize(
+        self,
+        input_path: Path,
+        output_path: Path,
+        width: Optional[int],
+        height: Optional[int],
+        strategy: str,
+        quality: int,
+        watermark: Optional[Path] = None
+    ) -> None:
+        header = pyvips.Image.new_from_file(str(input_path), access='sequential', autorotate=True)
+        resize_width, resize_height, crop = target_geometry(
+            header.width, header.height, width, height, strategy
+        )
+        image = pyvips.Image.thumbnail(
+            str(input_path), resize_width, height=resize_height, size='force'
+        )
+        if crop:
+            left, top, right, bottom = crop
+            image = image.crop(left, top, right - left, bottom - top)
+
+        if watermark:
+            mark = pyvips.Image.new_from_file(str(watermark))
+            if not image.hasalpha():
+                image = image.bandjoin(255)
+            if not mark.hasalpha():
+                mark = mark.bandjoin(255)
+            image = image.composite2(
+                mark, 'over',
+                x=max(0, image.width - mark.width - 10),
+                y=max(0, image.height - mark.height - 10)
+            )
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        options = {'strip': True}
+        if PILLOW_FORMATS[output_path.suffix.lower().lstrip('.')] != 'PNG':
+            options['Q'] = quality
+        if output_path.suffix.lower() in ('.jpg', '.jpeg') and image.hasalpha():
+            image = image.flatten(background=[255, 255, 255])
+        image.write_to_file(str(output_path), **options)
+
+
+def create_backend(name: str):
+    """
+    Create an in-process backend, or None for ImageMagick.
+
+    'auto' prefers Pillow, then libvips, then ImageMagick.
+    """
+    if name == 'magick':
+        return None
+    candidates = [PillowBackend, VipsBackend] if name == 'auto' else [
+        {'pillow': PillowBackend, 'vips': VipsBackend}[name]
+    ]
+    for backend in candidates:
+        if backend.available():
+            return backend()
+    if name == 'auto':
+        return None
+    raise RuntimeError(f"Backend '{name}' is not installed")
+
+
+# Per-process resizer used by process pool workers
+_worker_resizer = None
+
+
+def _init_worker(verbose: bool, dry_run: bool, backend: str) -> None:
+    global _worker_resizer
+    _worker_resizer = ImageResizer(verbose=verbose, dry_run=dry_run, backend=backend)
+
+
+def _resize_in_worker(task: Tuple) -> bool:
+    input_path, output_path = task[0], task[1]
+    if not _worker_resizer.dry_run:
+        print(f"Processing {input_path.name} -> {output_path.name}")
+    return _worker_resizer.resize_image(*task)
+
+
+def _variants_in_worker(task: Tuple) -> Optional[List[Dict]]:
+    return _worker_resizer._variants_or_none(*task)
 
 
 class ImageResizer:
-    """Handle image resizing operations using ImageMagick."""
+    """Handle image resizing operations using ImageMagick or in-process backends."""
 
-    def __init__(self, verbose: bool = False, dry_run: bool = False):
+    def __init__(self, verbose: bool = False, dry_run: bool = False, backend: str = 'magick'):
         self.verbose = verbose
         self.dry_run = dry_run
+        self.backend = backend
+        self._backend = create_backend(backend)
+
+    @property
+    def in_process(self) -> bool:
+        """Whether an in-process backend is active."""
+        return self._backend is not None
+
+    def uses_magick(self, input_path: Path, output_path: Path) -> bool:
+        """Whether this image needs the ImageMagick fallback."""
+        return self._backend is None or not self._backend.supports(input_path, output_path)
 
     def check_imagemagick(self) -> bool:
         """Check if ImageMagick is available."""
@@ -113,6 +377,21 @@ class ImageResizer:
         watermark: Optional[Path] = None
     ) -> bool:
         """Resize a single image."""
+        if not self.uses_magick(input_path, output_path):
+            if self.verbose or self.dry_run:
+                print(f"Resize ({self._backend.name}): {input_path} -> {output_path}")
+            if self.dry_run:
+                return True
+            try:
+                self._backend.resize(
+                    input_path, output_path, width, height,
+                    strategy, quality, watermark
+                )
+                return True
+            except Exception as e:
+                print(f"Error processing {input_path}: {e}", file=sys.stderr)
+                return False
+
         try:
             # Ensure output directory exists
             output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -155,23 +434,29 @@ class ImageResizer:
         quality: int = 85,
         format_ext: Optional[str] = None,
         watermark: Optional[Path] = None,
-        parallel: int = 1
+        parallel: int = 1,
+        manifest: Optional[BuildManifest] = None
     ) -> Tuple[int, int]:
-        """Resize multiple images."""
+        """
+        Resize multiple images.
+
+        With a manifest, images already processed with the same parameters
+        are skipped (counted in manifest.skipped) and new results are recorded.
+        """
         success_count = 0
         fail_count = 0
 
+        def output_path_for(input_path: Path) -> Path:
+            if format_ext:
+                return output_dir / f"{input_path.stem}.{format_ext.lstrip('.')}"
+            return output_dir / input_path.name
+
         def process_image(input_path: Path) -> Tuple[Path, bool]:
             """Process single image for parallel execution."""
             if not input_path.exists() or not input_path.is_file():
                 return input_path, False
 
-            # Determine output path
-            output_name = input_path.stem
-            if format_ext:
-                output_path = output_dir / f"{output_name}.{format_ext.lstrip('.')}"
-            else:
-                output_path = output_dir / input_path.name
+            output_path = output_path_for(input_path)
 
             if not self.dry_run:
                 print(f"Processing {input_path.name} -> {output_path.name}")
@@ -183,27 +468,202 @@ class ImageResizer:
 
             return input_path, success
 
+        def finish(input_path: Path, success: bool) -> None:
+            nonlocal success_count, fail_count
+            if success:
+                success_count += 1
+                if manifest and not self.dry_run:
+                    manifest.record(input_path, [output_path_for(input_path)])
+            else:
+                fail_count += 1
+
+        if manifest:
+            pending = []
+            for input_path in input_paths:
+                if input_path.is_file() and manifest.is_current(input_path, [output_path_for(input_path)]):
+                    manifest.skipped += 1
+                else:
+                    pending.append(input_path)
+            input_paths = pending
+
         # Process images
-        if parallel > 1:
+        if parallel > 1 and self.in_process:
+            # In-process backends are CPU bound: one process per core, with
+            # ImageMagick fallbacks still forked from the workers as needed
+            tasks = []
+            for input_path in input_paths:
+                if not input_path.exists() or not input_path.is_file():
+                    fail_count += 1
+                    continue
+                tasks.append((
+                    input_path, output_path_for(input_path), width, height,
+                    strategy, quality, watermark
+                ))
+
+            with ProcessPoolExecutor(
+                max_workers=parallel,
+                initializer=_init_worker,
+                initargs=(self.verbose, self.dry_run, self.backend)
+            ) as executor:
+                chunksize = max(1, min(32, len(tasks) // (parallel * 4)))
+                results = executor.map(_resize_in_worker, tasks, chunksize=chunksize)
+                for task, success in zip(tasks, results):
+                    finish(task[0], success)
+        elif parallel > 1:
             with ThreadPoolExecutor(max_workers=parallel) as executor:
                 futures = [executor.submit(process_image, path) for path in input_paths]
 
                 for future in as_completed(futures):
-                    _, success = future.result()
-                    if success:
-                        success_count += 1
-                    else:
-                        fail_count += 1
+                    finish(*future.result())
         else:
             for input_path in input_paths:
-                _, success = process_image(input_path)
-                if success:
-                    success_count += 1
+                finish(*process_image(input_path))
+
+        return success_count, fail_count
+
+    def resize_variants(
+        self,
+        input_path: Path,
+        output_dir: Path,
+        widths: List[int],
+        formats: List[str],
+        quality: int = 85
+    ) -> List[Dict]:
+        """
+        Create every width/format variant of one image from a single decode.
+
+        Widths are processed largest first and each size is resized from the
+        previous one, so every resize works on the smallest available image.
+        Widths larger than the source are clamped to the source width.
+
+        Returns:
+            List of manifest entries (path, width, height, format, bytes)
+        """
+        if Image is None:
+            raise RuntimeError("Pipeline mode requires Pillow (pip install Pillow)")
+
+        for fmt in formats:
+            if fmt.lower() not in PILLOW_FORMATS:
+                raise ValueError(f"Unsupported pipeline format: {fmt}")
+
+        entries = []
+        with Image.open(input_path) as source:
+            image = ImageOps.exif_transpose(source)
+            image.load()
+
+        done = set()
+        for width in sorted(set(widths), reverse=True):
+            width = min(width, image.width)
+            if width in done:
+                continue
+            done.add(width)
+
+            if width < image.width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.LANCZOS)
+
+            for fmt in formats:
+                output_path = output_dir / f"{input_path.stem}-{width}w.{fmt.lower()}"
+                if self.verbose or self.dry_run:
+                    print(f"Variant: {input_path.name} -> {output_path.name} ({image.width}x{image.height})")
+                if self.dry_run:
+                    continue
+                save_image(image, output_path, fmt, quality)
+                entries.append({
+                    'path': str(output_path),
+                    'width': image.width,
+                    'height': image.height,
+                    'format': fmt.lower(),
+                    'bytes': output_path.stat().st_size,
+                })
+
+        return entries
+
+    def batch_variants(
+        self,
+        input_paths: List[Path],
+        output_dir: Path,
+        widths: List[int],
+        formats: List[str],
+        quality: int = 85,
+        parallel: int = 1,
+        manifest: Optional[BuildManifest] = None
+    ) -> Tuple[int, int]:
+        """
+        Create responsive variants for multiple images.
+
+        Writes output_dir/manifest.json mapping each source to its variants.
+        With a build manifest, sources whose variants are up to date are
+        skipped and keep their entries from the previous manifest.json.
+        """
+        variants_path = output_dir / 'manifest.json'
+        variants = {}
+        success_count = 0
+        fail_count = 0
+
+        if manifest:
+            previous = {}
+            if variants_path.exists():
+                with open(variants_path, 'r') as f:
+                    previous = json.load(f).get('sources', {})
+            pending = []
+            for input_path in input_paths:
+                if str(input_path) in previous and input_path.is_file() and manifest.is_current(input_path):
+                    manifest.skipped += 1
+                    variants[str(input_path)] = previous[str(input_path)]
                 else:
+                    pending.append(input_path)
+            input_paths = pending
+
+        tasks = [(input_path, output_dir, widths, formats, quality) for input_path in input_paths]
+        if parallel > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=parallel,
+                initializer=_init_worker,
+                initargs=(self.verbose, self.dry_run, self.backend)
+            )
+            results = executor.map(_variants_in_worker, tasks)
+        else:
+            executor = None
+            results = (self._variants_or_none(*task) for task in tasks)
+
+        try:
+            for input_path, entries in zip(input_paths, results):
+                if entries is None:
                     fail_count += 1
+                else:
+                    success_count += 1
+                    variants[str(input_path)] = entries
+                    if manifest and not self.dry_run:
+                        manifest.record(input_path, [e['path'] for e in entries])
+        finally:
+            if executor:
+                executor.shutdown()
+
+        if not self.dry_run:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            with open(variants_path, 'w') as f:
+                json.dump({'sources': variants}, f, indent=2)
 
         return success_count, fail_count
 
+    def _variants_or_none(self, input_path: Path, *args) -> Optional[List[Dict]]:
+        """resize_variants that reports errors and returns None on failure."""
+        if not input_path.exists() or not input_path.is_file():
+            return None
+        try:
+            if not self.dry_run:
+                print(f"Processing {input_path.name}")
+            return self.resize_variants(input_path, *args)
+        except Exception as e:
+            print(f"Error processing {input_path}: {e}", file=sys.stderr)
+            return None
+
+
+def parse_list(value: str, item_type=str) -> List:
+    """Parse a comma-separated CLI list such as '320,640,1280'."""
+    return [item_type(item.strip()) for item in value.split(',') if item.strip()]
+
 
 def collect_images(paths: List[Path], recursive: bool = False) -> List[Path]:
     """Collect image files from paths."""
@@ -274,8 +734,31 @@ def main():
     parser.add_argument(
         '-p', '--parallel',
         type=int,
-        default=1,
-        help='Number of parallel processes (default: 1)'
+        help='Number of parallel workers (default: CPU count for in-process backends, 1 for magick)'
+    )
+    parser.add_argument(
+        '-b', '--backend',
+        choices=BACKENDS,
+        default='auto',
+        help='Resize backend; auto prefers Pillow, then libvips, then ImageMagick (default: auto)'
+    )
+    parser.add_argument(
+        '--sizes',
+        help='Pipeline mode: comma-separated output widths (e.g., 320,640,1280)'
+    )
+    parser.add_argument(
+        '--formats',
+        help='Pipeline mode: comma-separated output formats (default: --format or jpg)'
+    )
+    parser.add_argument(
+        '--manifest',
+        type=Path,
+        help='Build manifest for incremental runs: skip images unchanged since the last run'
+    )
+    parser.add_argument(
+        '--prune',
+        action='store_true',
+        help='With --manifest, delete outputs whose source was removed or that are no longer produced'
     )
     parser.add_argument(
         '-r', '--recursive',
@@ -296,17 +779,17 @@ def main():
     args = parser.parse_args()
 
     # Validate dimensions
-    if not args.width and not args.img_height:
-        print("Error: At least one of --width or --height required", file=sys.stderr)
+    if not args.sizes and not args.width and not args.img_height:
+        print("Error: At least one of --width, --height or --sizes required", file=sys.stderr)
         sys.exit(1)
 
     # Initialize resizer
-    resizer = ImageResizer(verbose=args.verbose, dry_run=args.dry_run)
-
-    # Check dependencies
-    if not resizer.check_imagemagick():
-        print("Error: ImageMagick not found", file=sys.stderr)
+    try:
+        resizer = ImageResizer(verbose=args.verbose, dry_run=args.dry_run, backend=args.backend)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
+    parallel = args.parallel or ((os.cpu_count() or 1) if resizer.in_process else 1)
 
     # Collect input images
     images = collect_images(args.inputs, args.recursive)
@@ -315,26 +798,74 @@ def main():
         print("Error: No images found", file=sys.stderr)
         sys.exit(1)
 
+    # Check dependencies
+    if args.sizes:
+        if Image is None:
+            print("Error: Pillow not found (required for --sizes)", file=sys.stderr)
+            sys.exit(1)
+    else:
+        out_ext = f".{args.format.lstrip('.')}" if args.format else None
+        needs_magick = any(
+            resizer.uses_magick(image, image.with_suffix(out_ext or image.suffix))
+            for image in images
+        )
+        if needs_magick and not resizer.check_imagemagick():
+            print("Error: ImageMagick not found", file=sys.stderr)
+            sys.exit(1)
+
     print(f"Found {len(images)} image(s) to process")
 
     # Create output directory
     if not args.dry_run:
         args.output.mkdir(parents=True, exist_ok=True)
 
-    # Process images
-    success, fail = resizer.batch_resize(
-        images,
-        args.output,
-        args.width,
-        args.img_height,
-        args.strategy,
-        args.quality,
-        args.format,
-        args.watermark,
-        args.parallel
-    )
+    manifest = None
+    if args.manifest:
+        if args.sizes:
+            params = {'sizes': parse_list(args.sizes, int), 'formats': args.formats or args.format or 'jpg'}
+        else:
+            params = {
+                'width': args.width, 'height': args.img_height,
+                'strategy': args.strategy, 'format': args.format,
+                'watermark': file_hash(args.watermark) if args.watermark else None,
+            }
+        params.update(tool='batch_resize', quality=args.quality, output=str(args.output.resolve()))
+        manifest = BuildManifest(args.manifest, params)
 
-    print(f"\nResults: {success} succeeded, {fail} failed")
+    # Process images
+    if args.sizes:
+        success, fail = resizer.batch_variants(
+            images,
+            args.output,
+            parse_list(args.sizes, int),
+            parse_list(args.formats or args.format or 'jpg'),
+            args.quality,
+            parallel,
+            manifest
+        )
+    else:
+        success, fail = resizer.batch_resize(
+            images,
+            args.output,
+            args.width,
+            args.img_height,
+            args.strategy,
+            args.quality,
+            args.format,
+            args.watermark,
+            parallel,
+            manifest
+        )
+
+    skipped = ''
+    if manifest:
+        skipped = f", {manifest.skipped} unchanged"
+        if args.prune and not args.dry_run:
+            print(f"Pruned {manifest.prune()} stale output(s)")
+        if not args.dry_run:
+            manifest.save()
+
+    print(f"\nResults: {success} succeeded, {fail} failed{skipped}")
     sys.exit(0 if fail == 0 else 1)
 
 
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Persistent build manifest for incremental batch processing.
+
+Records, for every processed source, its size, mtime, content hash, the hash
+of the processing parameters and the outputs produced. On the next run only
+sources that are new, changed, or processed with different parameters (or
+whose outputs are missing) need work. Outputs of sources that no longer exist
+can be pruned.
+
+Used by batch_resize.py and media_convert.py (--manifest).
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(path: Path) -> str:
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def params_hash(params: Dict) -> str:
+    """Stable hash of processing parameters."""
+    encoded = json.dumps(params, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class BuildManifest:
+    """Tracks processed sources so unchanged ones can be skipped."""
+
+    def __init__(self, path: Path, params: Dict):
+        self.path = Path(path)
+        self.params_hash = params_hash(params)
+        self.entries: Dict[str, Dict] = {}
+        self.skipped = 0
+        self.stale: List[str] = []
+        self._dirty = False
+        if self.path.exists():
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    self.entries = data.get('entries', {})
+            except (OSError, ValueError):
+                pass  # Unreadable manifest: rebuild everything
+
+    @staticmethod
+    def key(source: Path) -> str:
+        return str(Path(source).resolve())
+
+    def is_current(self, source: Path, outputs: Optional[List[Path]] = None) -> bool:
+        """
+        Check whether source was already processed with these parameters.
+
+        Size and mtime are compared first; the content hash is only computed
+        when the mtime changed but the size did not (e.g. files touched or
+        re-synced without changes).
+
+        Args:
+            source: Source file
+            outputs: Expected outputs (default: the outputs recorded last time)
+        """
+        entry = self.entries.get(self.key(source))
+        if not entry or entry['params'] != self.params_hash:
+            return False
+
+        expected = [self.key(p) for p in outputs] if outputs is not None else entry['outputs']
+        if sorted(expected) != sorted(entry['outputs']):
+            return False
+        if not all(os.path.exists(p) for p in expected):
+            return False
+
+        stat = Path(source).stat()
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns != entry['mtime_ns']:
+            if file_hash(source) != entry['sha256']:
+                return False
+            entry['mtime_ns'] = stat.st_mtime_ns
+            self._dirty = True
+        return True
+
+    def record(self, source: Path, outputs: Iterable[Path]) -> None:
+        """
+        Record a successfully processed source.
+
+        Outputs recorded previously for this source that it no longer produces
+        (e.g. after a format change) are remembered in self.stale for prune().
+        """
+        key = self.key(source)
+        outputs = [self.key(p) for p in outputs]
+        previous = self.entries.get(key, {}).get('outputs', [])
+        stat = Path(source).stat()
+        self.entries[key] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': file_hash(source),
+            'params': self.params_hash,
+            'outputs': outputs,
+        }
+        self._dirty = True
+        self.stale.extend(p for p in previous if p not in outputs)
+
+    def orphans(self) -> List[str]:
+        """Outputs of recorded sources that no longer exist."""
+        return [
+            output
+            for source, entry in self.entries.items()
+            if not os.path.exists(source)
+            for output in entry['outputs']
+        ]
+
+    def prune(self) -> int:
+        """
+        Delete orphaned and stale outputs and forget sources that no longer exist.
+
+        Returns:
+            Number of files deleted
+        """
+        deleted = 0
+        for output in self.orphans() + self.stale:
+            try:
+                os.remove(output)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        for source in [s for s in self.entries if not os.path.exists(s)]:
+            del self.entries[source]
+            self._dirty = True
+        self.stale = []
+        return deleted
+
+    def save(self) -> None:
+        """Write the manifest atomically if anything changed."""
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
@@ -4,13 +4,26 @@ Unified media conversion tool for video, audio, and images.
 
 Auto-detects format and applies appropriate tool (FFmpeg or ImageMagick).
 Supports quality presets, batch processing, and dry-run mode.
+
+Batch conversions run concurrently within a CPU budget (default: core
+count). Image and audio jobs use one slot each; video encodes reserve
+VIDEO_THREADS_PER_JOB slots and are limited to that many ffmpeg threads, so
+the total never oversubscribes the machine.
 """
 
 import argparse
+import os
 import subprocess
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+
+import probe_cache
+from incremental import BuildManifest
 
 
 # Format mappings
@@ -18,6 +31,9 @@ VIDEO_FORMATS = {'.mp4', '.mkv', '.avi', '.mov', '.webm', '.flv', '.wmv', '.m4v'
 AUDIO_FORMATS = {'.mp3', '.aac', '.m4a', '.opus', '.flac', '.wav', '.ogg'}
 IMAGE_FORMATS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff', '.tif'}
 
+# CPU slots (and ffmpeg -threads) per concurrent video encode
+VIDEO_THREADS_PER_JOB = 8
+
 # Quality presets
 QUALITY_PRESETS = {
     'web': {
@@ -58,6 +74,36 @@ def check_dependencies() -> Tuple[bool, bool]:
     return ffmpeg_available, magick_available
 
 
+class CpuBudget:
+    """Counting semaphore where each job reserves one slot per thread it uses."""
+
+    def __init__(self, slots: int):
+        self.slots = max(1, slots)
+        self._free = self.slots
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, count: int):
+        count = min(count, self.slots)
+        with self._cond:
+            self._cond.wait_for(lambda: self._free >= count)
+            self._free -= count
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._free += count
+                self._cond.notify_all()
+
+
+def probe_duration(file_path: Path) -> Optional[float]:
+    """Media duration in seconds via ffprobe (cached), or None if unavailable."""
+    try:
+        return float(probe_cache.probe(file_path)['format']['duration'])
+    except (subprocess.CalledProcessError, FileNotFoundError, ValueError, KeyError):
+        return None
+
+
 def detect_media_type(file_path: Path) -> str:
     """Detect media type from file extension."""
     ext = file_path.suffix.lower()
@@ -75,23 +121,28 @@ def detect_media_type(file_path: Path) -> str:
 def build_video_command(
     input_path: Path,
     output_path: Path,
-    preset: str = 'web'
+    preset: str = 'web',
+    threads: Optional[int] = None
 ) -> List[str]:
     """Build FFmpeg command for video conversion."""
     quality = QUALITY_PRESETS[preset]
 
-    return [
+    cmd = [
         'ffmpeg', '-i', str(input_path),
         '-c:v', 'libx264',
         '-preset', quality['video_preset'],
         '-crf', str(quality['video_crf']),
         '-c:a', 'aac',
         '-b:a', quality['audio_bitrate'],
-        '-movflags', '+faststart',
-        '-y',
-        str(output_path)
+        '-movflags', '+faststart'
     ]
 
+    if threads:
+        cmd.extend(['-threads', str(threads)])
+
+    cmd.extend(['-y', str(output_path)])
+    return cmd
+
 
 def build_audio_command(
     input_path: Path,
@@ -145,9 +196,10 @@ def convert_file(
     output_path: Path,
     preset: str = 'web',
     dry_run: bool = False,
-    verbose: bool = False
+    verbose: bool = False,
+    threads: Optional[int] = None
 ) -> bool:
-    """Convert a single media file."""
+    """Convert a single media file (threads limits video encodes)."""
     media_type = detect_media_type(input_path)
 
     if media_type == 'unknown':
@@ -159,7 +211,7 @@ def convert_file(
 
     # Build command based on media type
     if media_type == 'video':
-        cmd = build_video_command(input_path, output_path, preset)
+        cmd = build_video_command(input_path, output_path, preset, threads)
     elif media_type == 'audio':
         cmd = build_audio_command(input_path, output_path, preset)
     else:  # image
@@ -195,11 +247,24 @@ def batch_convert(
     output_format: Optional[str] = None,
     preset: str = 'web',
     dry_run: bool = False,
-    verbose: bool = False
+    verbose: bool = False,
+    manifest: Optional[BuildManifest] = None,
+    jobs: Optional[int] = None,
+    report: Optional[List[Dict]] = None
 ) -> Tuple[int, int]:
-    """Convert multiple files."""
+    """
+    Convert multiple files concurrently.
+
+    With a manifest, files already converted with the same settings are
+    skipped (counted in manifest.skipped) and new results are recorded.
+
+    Args:
+        jobs: CPU budget in threads (default: core count)
+        report: If given, per-file timing and throughput dicts are appended
+    """
     success_count = 0
     fail_count = 0
+    tasks = []
 
     for input_path in input_paths:
         if not input_path.exists():
@@ -222,16 +287,77 @@ def batch_convert(
                 fail_count += 1
                 continue
 
-        print(f"Converting {input_path.name} -> {output_path.name}")
+        if manifest and manifest.is_current(input_path, [output_path]):
+            manifest.skipped += 1
+            continue
 
-        if convert_file(input_path, output_path, preset, dry_run, verbose):
-            success_count += 1
-        else:
-            fail_count += 1
+        tasks.append((input_path, output_path))
+
+    budget = CpuBudget(jobs or os.cpu_count() or 1)
+    video_threads = min(VIDEO_THREADS_PER_JOB, budget.slots)
+
+    # Longest jobs first (videos, then largest files) so they don't trail at the end
+    tasks.sort(key=lambda t: (detect_media_type(t[0]) != 'video', -t[0].stat().st_size))
+
+    def run(task: Tuple[Path, Path]) -> Tuple[Path, Path, bool, Dict]:
+        input_path, output_path = task
+        is_video = detect_media_type(input_path) == 'video'
+        with budget.reserve(video_threads if is_video else 1):
+            print(f"Converting {input_path.name} -> {output_path.name}")
+            start = time.monotonic()
+            success = convert_file(
+                input_path, output_path, preset, dry_run, verbose,
+                video_threads if is_video else None
+            )
+            elapsed = time.monotonic() - start
+        return input_path, output_path, success, file_stats(input_path, output_path, elapsed, dry_run)
+
+    with ThreadPoolExecutor(max_workers=budget.slots) as executor:
+        futures = [executor.submit(run, task) for task in tasks]
+        for future in as_completed(futures):
+            input_path, output_path, success, stats = future.result()
+            if success:
+                success_count += 1
+                if manifest and not dry_run:
+                    manifest.record(input_path, [output_path])
+                if not dry_run:
+                    print(format_stats(input_path, stats))
+            else:
+                fail_count += 1
+            if report is not None:
+                report.append(dict(stats, success=success))
 
     return success_count, fail_count
 
 
+def file_stats(input_path: Path, output_path: Path, elapsed: float, dry_run: bool = False) -> Dict:
+    """Timing and throughput for one conversion."""
+    size_mb = input_path.stat().st_size / 1_000_000
+    stats = {
+        'input': str(input_path),
+        'output': str(output_path),
+        'seconds': round(elapsed, 3),
+        'input_mb': round(size_mb, 3),
+        'mb_per_s': round(size_mb / elapsed, 2) if elapsed > 0 else None,
+    }
+    if not dry_run and detect_media_type(input_path) in ('video', 'audio'):
+        duration = probe_duration(input_path)
+        if duration and elapsed > 0:
+            stats['duration'] = round(duration, 3)
+            stats['realtime_factor'] = round(duration / elapsed, 2)
+    return stats
+
+
+def format_stats(input_path: Path, stats: Dict) -> str:
+    """One-line summary of a finished conversion."""
+    line = f"  {input_path.name}: {stats['seconds']:.2f}s"
+    if stats['mb_per_s'] is not None:
+        line += f", {stats['mb_per_s']:.1f} MB/s"
+    if 'realtime_factor' in stats:
+        line += f", {stats['realtime_factor']:.1f}x realtime"
+    return line
+
+
 def main():
     """Main entry point."""
     parser = argparse.ArgumentParser(
@@ -258,6 +384,26 @@ def main():
         default='web',
         help='Quality preset (default: web)'
     )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        help=f'CPU budget for batch conversion; videos use {VIDEO_THREADS_PER_JOB} each (default: CPU count)'
+    )
+    parser.add_argument(
+        '--manifest',
+        type=Path,
+        help='Build manifest for incremental batch runs: skip files unchanged since the last run'
+    )
+    parser.add_argument(
+        '--prune',
+        action='store_true',
+        help='With --manifest, delete outputs whose source was removed or that are no longer produced'
+    )
+    parser.add_argument(
+        '--probe-cache',
+        type=Path,
+        help=f'JSON file caching ffprobe results across runs (default: ${probe_cache.CACHE_ENV})'
+    )
     parser.add_argument(
         '-n', '--dry-run',
         action='store_true',
@@ -271,6 +417,9 @@ def main():
 
     args = parser.parse_args()
 
+    if args.probe_cache:
+        probe_cache.set_cache_file(args.probe_cache)
+
     # Check dependencies
     ffmpeg_ok, magick_ok = check_dependencies()
     if not ffmpeg_ok and not magick_ok:
@@ -294,16 +443,42 @@ def main():
         if not args.output:
             output_dir = None  # Will convert in place with new format
 
+        manifest = None
+        if args.manifest:
+            manifest = BuildManifest(args.manifest, {
+                'tool': 'media_convert',
+                'preset': QUALITY_PRESETS[args.preset],
+                'format': args.format,
+                'output': str(output_dir.resolve()) if output_dir else None,
+            })
+
+        report = []
+        start = time.monotonic()
         success, fail = batch_convert(
             args.inputs,
             output_dir,
             args.format,
             args.preset,
             args.dry_run,
-            args.verbose
+            args.verbose,
+            manifest,
+            args.jobs,
+            report
         )
-
-        print(f"\nResults: {success} succeeded, {fail} failed")
+        elapsed = time.monotonic() - start
+
+        skipped = ''
+        if manifest:
+            skipped = f", {manifest.skipped} unchanged"
+            if args.prune and not args.dry_run:
+                print(f"Pruned {manifest.prune()} stale output(s)")
+            if not args.dry_run:
+                manifest.save()
+
+        print(f"\nResults: {success} succeeded, {fail} failed{skipped}")
+        if report and not args.dry_run and elapsed > 0:
+            total_mb = sum(r['input_mb'] for r in report)
+            print(f"Throughput: {total_mb:.1f} MB in {elapsed:.1f}s ({total_mb / elapsed:.1f} MB/s)")
         sys.exit(0 if fail == 0 else 1)
 
 
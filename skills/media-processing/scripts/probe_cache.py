@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Cached ffprobe metadata shared by the media scripts.
+
+Parsed `ffprobe -show_format -show_streams` output is cached per file and
+reused while the file's size and mtime are unchanged. The cache lives in
+memory for the life of the process and, optionally, in a JSON store on disk
+(set_cache_file() or the FFPROBE_CACHE environment variable), so repeated
+runs over a large library only probe new or changed files.
+
+Identical copies live in media-processing/scripts and ai-multimodal/scripts.
+"""
+
+import atexit
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+CACHE_ENV = 'FFPROBE_CACHE'
+CACHE_VERSION = 1
+
+_lock = threading.Lock()
+_entries: Dict[str, Dict[str, Any]] = {}
+_cache_file: Optional[Path] = None
+_dirty = False
+
+
+def set_cache_file(path: Optional[Path]) -> None:
+    """Use path as the on-disk store (None: memory only). Existing entries are loaded."""
+    global _cache_file
+    with _lock:
+        _cache_file = Path(path) if path else None
+        if not _cache_file or not _cache_file.exists():
+            return
+        try:
+            with open(_cache_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return  # Unreadable store: start over
+        if data.get('version') == CACHE_VERSION:
+            for key, entry in data.get('entries', {}).items():
+                _entries.setdefault(key, entry)
+
+
+def save() -> None:
+    """
+    Write the on-disk store atomically if anything changed.
+
+    Runs at exit, so a store that cannot be written is reported, not raised.
+    """
+    global _dirty
+    with _lock:
+        if not _cache_file or not _dirty:
+            return
+        tmp_path = None
+        try:
+            _cache_file.parent.mkdir(parents=True, exist_ok=True)
+            # A unique temp file, so concurrent runs never write into each other's
+            fd, tmp_path = tempfile.mkstemp(
+                dir=_cache_file.parent, prefix=_cache_file.name + '.', suffix='.tmp'
+            )
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'entries': _entries}, f)
+            os.replace(tmp_path, _cache_file)
+        except OSError as e:
+            print(f"Warning: could not save ffprobe cache {_cache_file}: {e}", file=sys.stderr)
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+        _dirty = False
+
+
+def clear() -> None:
+    """Forget all in-memory entries."""
+    with _lock:
+        _entries.clear()
+
+
+def probe(file_path) -> Dict[str, Any]:
+    """
+    Return ffprobe's format/streams JSON for file_path, probing at most once
+    per (path, size, mtime).
+
+    Raises:
+        subprocess.CalledProcessError, FileNotFoundError or ValueError if
+        ffprobe fails or its output is not JSON (failures are not cached)
+    """
+    global _dirty
+    try:
+        stat = os.stat(file_path)
+        key = str(Path(file_path).resolve())
+    except OSError:
+        stat = key = None  # Let ffprobe report the problem
+
+    if key:
+        with _lock:
+            entry = _entries.get(key)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['data']
+
+    cmd = [
+        'ffprobe',
+        '-v', 'quiet',
+        '-print_format', 'json',
+        '-show_format',
+        '-show_streams',
+        str(file_path)
+    ]
+    result = subprocess.run(cmd, capture_output=True, check=True)
+    data = json.loads(result.stdout)
+
+    if key:
+        with _lock:
+            _entries[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'data': data}
+            _dirty = True
+    return data
+
+
+if os.environ.get(CACHE_ENV):
+    set_cache_file(Path(os.environ[CACHE_ENV]))
+atexit.register(save)
@@ -10,7 +10,7 @@ import pytest
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from batch_resize import ImageResizer, collect_images
+from batch_resize import ImageResizer, collect_images, target_geometry
 
 
 class TestImageResizer:
@@ -313,6 +313,241 @@ class TestBatchResize:
         assert call_args[1].suffix == ".jpg"
 
 
+class TestResizeVariants:
+    """Test pipeline mode (decode once, cascade resize, encode variants)."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        pytest.importorskip("PIL")
+        self.resizer = ImageResizer()
+
+    def _make_image(self, path, size=(1600, 900), mode="RGB"):
+        from PIL import Image
+        Image.new(mode, size, (200, 100, 50) if mode == "RGB" else (200, 100, 50, 128)).save(path)
+        return path
+
+    def test_resize_variants_sizes_and_formats(self, tmp_path):
+        """Test every width/format combination is written at the right size."""
+        from PIL import Image
+        source = self._make_image(tmp_path / "photo.jpg")
+        output_dir = tmp_path / "out"
+
+        entries = self.resizer.resize_variants(
+            source, output_dir, [320, 1280, 640], ["webp", "jpg"]
+        )
+
+        assert len(entries) == 6
+        assert [e["width"] for e in entries] == [1280, 1280, 640, 640, 320, 320]
+        with Image.open(output_dir / "photo-640w.webp") as img:
+            assert img.size == (640, 360)
+        assert (output_dir / "photo-320w.jpg").stat().st_size == entries[-1]["bytes"]
+
+    def test_resize_variants_decodes_once(self, tmp_path):
+        """Test the source is opened once for all variants."""
+        from PIL import Image
+        source = self._make_image(tmp_path / "photo.png")
+
+        with patch("batch_resize.Image.open", wraps=Image.open) as mock_open:
+            self.resizer.resize_variants(
+                source, tmp_path / "out", [320, 640, 1280], ["png", "webp"]
+            )
+
+        assert mock_open.call_count == 1
+
+    def test_resize_variants_no_upscale(self, tmp_path):
+        """Test widths above the source width are clamped and deduplicated."""
+        source = self._make_image(tmp_path / "small.png", size=(500, 250))
+
+        entries = self.resizer.resize_variants(
+            source, tmp_path / "out", [320, 640, 1280], ["png"]
+        )
+
+        assert [e["width"] for e in entries] == [500, 320]
+
+    def test_resize_variants_flattens_alpha_for_jpeg(self, tmp_path):
+        """Test RGBA sources can be encoded as JPEG."""
+        source = self._make_image(tmp_path / "logo.png", mode="RGBA")
+
+        entries = self.resizer.resize_variants(
+            source, tmp_path / "out", [100], ["jpg"]
+        )
+
+        assert entries[0]["format"] == "jpg"
+
+    def test_resize_variants_unsupported_format(self, tmp_path):
+        """Test unknown pipeline formats are rejected."""
+        source = self._make_image(tmp_path / "photo.png")
+
+        with pytest.raises(ValueError):
+            self.resizer.resize_variants(source, tmp_path / "out", [100], ["xyz"])
+
+    def test_batch_variants_writes_manifest(self, tmp_path):
+        """Test batch pipeline counts results and writes the manifest."""
+        import json
+        sources = [
+            self._make_image(tmp_path / "a.png"),
+            self._make_image(tmp_path / "b.png"),
+        ]
+        missing = tmp_path / "missing.png"
+        output_dir = tmp_path / "out"
+
+        success, fail = self.resizer.batch_variants(
+            sources + [missing], output_dir, [320, 640], ["webp"], parallel=2
+        )
+
+        assert (success, fail) == (2, 1)
+        manifest = json.loads((output_dir / "manifest.json").read_text())
+        assert set(manifest["sources"]) == {str(p) for p in sources}
+        assert len(manifest["sources"][str(sources[0])]) == 2
+
+
+class TestTargetGeometry:
+    """Test in-process geometry matches the ImageMagick strategies."""
+
+    def test_fit_within_box(self):
+        assert target_geometry(1600, 900, 800, 600, "fit") == (800, 450, None)
+
+    def test_fit_single_dimension(self):
+        assert target_geometry(1600, 900, None, 300, "fit") == (533, 300, None)
+
+    def test_cover(self):
+        assert target_geometry(1600, 900, 800, 600, "cover") == (1067, 600, None)
+
+    def test_fill_crops_center(self):
+        assert target_geometry(1600, 900, 800, 600, "fill") == (1067, 600, (133, 0, 933, 600))
+
+    def test_thumbnail_is_square(self):
+        assert target_geometry(1600, 900, 200, None, "thumbnail") == (356, 200, (78, 0, 278, 200))
+
+    def test_exact(self):
+        assert target_geometry(1600, 900, 800, 600, "exact") == (800, 600, None)
+
+    def test_cover_requires_dimensions(self):
+        with pytest.raises(ValueError):
+            target_geometry(1600, 900, 800, None, "cover")
+
+
+class TestInProcessBackend:
+    """Test the Pillow backend and the ImageMagick fallback."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        pytest.importorskip("PIL")
+        self.resizer = ImageResizer(backend="pillow")
+
+    def _make_image(self, path, size=(1600, 900), exif=None):
+        from PIL import Image
+        image = Image.new("RGB", size, (10, 120, 200))
+        if exif:
+            image.save(path, exif=exif)
+        else:
+            image.save(path)
+        return path
+
+    @patch("subprocess.run")
+    def test_fill_in_process(self, mock_run, tmp_path):
+        """Test fill produces exact dimensions without forking magick."""
+        from PIL import Image
+        source = self._make_image(tmp_path / "in.png")
+
+        assert self.resizer.resize_image(
+            source, tmp_path / "out" / "in.webp", 300, 300, strategy="fill"
+        ) is True
+
+        mock_run.assert_not_called()
+        with Image.open(tmp_path / "out" / "in.webp") as img:
+            assert img.size == (300, 300)
+
+    def test_jpeg_shrink_on_load(self, tmp_path, monkeypatch):
+        """Test JPEG sources are decoded at reduced scale via draft()."""
+        from PIL import Image, JpegImagePlugin
+        source = self._make_image(tmp_path / "big.jpg", size=(4000, 3000))
+        sizes = []
+        original_draft = JpegImagePlugin.JpegImageFile.draft
+
+        def spy(image, mode, size):
+            sizes.append(size)
+            return original_draft(image, mode, size)
+
+        monkeypatch.setattr(JpegImagePlugin.JpegImageFile, "draft", spy)
+
+        assert self.resizer.resize_image(source, tmp_path / "small.jpg", 400, None) is True
+        assert sizes == [(400, 300)]
+        with Image.open(tmp_path / "small.jpg") as img:
+            assert img.size == (400, 300)
+
+    def test_exif_orientation_applied(self, tmp_path):
+        """Test rotated JPEGs are resized in their upright orientation."""
+        from PIL import Image
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        source = self._make_image(tmp_path / "rotated.jpg", size=(400, 200), exif=exif)
+
+        assert self.resizer.resize_image(source, tmp_path / "out.jpg", 100, None) is True
+        with Image.open(tmp_path / "out.jpg") as img:
+            assert img.size == (100, 200)
+
+    @patch("subprocess.run")
+    def test_gif_falls_back_to_magick(self, mock_run, tmp_path):
+        """Test formats outside the in-process set use ImageMagick."""
+        mock_run.return_value = MagicMock(returncode=0)
+
+        assert self.resizer.resize_image(
+            tmp_path / "anim.gif", tmp_path / "anim_small.gif", 100, None
+        ) is True
+
+        mock_run.assert_called_once()
+        assert mock_run.call_args[0][0][0] == "magick"
+
+    def test_batch_resize_process_pool(self, tmp_path):
+        """Test parallel batch resize runs in worker processes."""
+        from PIL import Image
+        sources = [self._make_image(tmp_path / f"img{i}.png") for i in range(4)]
+        output_dir = tmp_path / "out"
+
+        success, fail = self.resizer.batch_resize(
+            sources + [tmp_path / "missing.png"], output_dir, 160, None,
+            format_ext="jpg", parallel=2
+        )
+
+        assert (success, fail) == (4, 1)
+        with Image.open(output_dir / "img3.jpg") as img:
+            assert img.size == (160, 90)
+
+
+class TestIncrementalResize:
+    """Test batch resize with a build manifest."""
+
+    @patch.object(ImageResizer, "resize_image")
+    def test_second_run_skips_unchanged(self, mock_resize, tmp_path):
+        """Test only changed images are resized again."""
+        from incremental import BuildManifest
+
+        def fake_resize(input_path, output_path, *args):
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            output_path.write_bytes(b"resized")
+            return True
+
+        mock_resize.side_effect = fake_resize
+        images = [tmp_path / "a.jpg", tmp_path / "b.jpg"]
+        for img in images:
+            img.write_bytes(img.name.encode())
+        output_dir = tmp_path / "out"
+        resizer = ImageResizer()
+
+        manifest = BuildManifest(tmp_path / "manifest.json", {"width": 800})
+        resizer.batch_resize(images, output_dir, 800, None, manifest=manifest)
+        manifest.save()
+
+        images[1].write_bytes(b"changed content")
+        manifest = BuildManifest(tmp_path / "manifest.json", {"width": 800})
+        success, fail = resizer.batch_resize(images, output_dir, 800, None, manifest=manifest)
+
+        assert (success, fail, manifest.skipped) == (1, 0, 1)
+        assert mock_resize.call_count == 3
+        assert mock_resize.call_args[0][0] == images[1]
+
+
 class TestResizeStrategies:
     """Test different resize strategies."""
 
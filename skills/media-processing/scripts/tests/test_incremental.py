@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Tests for incremental.py"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from incremental import BuildManifest, file_hash, params_hash
+
+
+class TestBuildManifest:
+    """Test change detection and pruning."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.params = {"width": 800, "quality": 85}
+
+    def _processed(self, tmp_path, name="a.jpg"):
+        source = tmp_path / name
+        source.write_bytes(b"source-" + name.encode())
+        output = tmp_path / "out" / f"{name}.webp"
+        output.parent.mkdir(exist_ok=True)
+        output.write_bytes(b"output")
+        return source, output
+
+    def test_new_source_is_not_current(self, tmp_path):
+        """Test sources never recorded need processing."""
+        source, output = self._processed(tmp_path)
+        manifest = BuildManifest(tmp_path / "manifest.json", self.params)
+
+        assert manifest.is_current(source, [output]) is False
+
+    def test_recorded_source_is_current_after_reload(self, tmp_path):
+        """Test recorded sources are skipped on the next run."""
+        source, output = self._processed(tmp_path)
+        manifest = BuildManifest(tmp_path / "manifest.json", self.params)
+        manifest.record(source, [output])
+        manifest.save()
+
+        reloaded = BuildManifest(tmp_path / "manifest.json", self.params)
+        assert reloaded.is_current(source, [output]) is True
+        assert reloaded.is_current(source) is True
+
+    def test_changed_parameters_invalidate(self, tmp_path):
+        """Test a different parameter set reprocesses everything."""
+        source, output = self._processed(tmp_path)
+        manifest = BuildManifest(tmp_path / "manifest.json", self.params)
+        manifest.record(source, [output])
+        manifest.save()
+
+        other = BuildManifest(tmp_path / "manifest.json", {"width": 640, "quality": 85})
+        assert other.is_current(source, [output]) is False
+
+    def test_changed_content_invalidates(self, tmp_path):
+        """Test modified sources are reprocessed."""
+        source, output = self._processed(tmp_path)
+        manifest = BuildManifest(tmp_path / "manifest.json", self.params)
+        manifest.record(source, [output])
+
+        source.write_bytes(b"different content")
+        assert manifest.is_current(source, [output]) is False
+
+    def test_touched_source_with_same_content_is_current(self, tmp_path):
+        """Test an mtime-only change falls back to the content hash."""
+        source, output = self._processed(tmp_path)
+        manifest = BuildManifest(tmp_path / "manifest.json", self.params)
+        manifest.record(source, [output])
+
+        stat = source.stat()
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+        assert manifest.is_current(source, [output]) is True
+
+    def test_missing_output_invalidates(self, tmp_path):
+        """Test deleted outputs are regenerated."""
+        source, output = self._processed(tmp_path)
+        manifest = BuildManifest(tmp_path / "manifest.json", self.params)
+        manifest.record(source, [output])
+
+        output.unlink()
+        assert manifest.is_current(source, [output]) is False
+
+    def test_prune_removes_orphans_and_stale_outputs(self, tmp_path):
+        """Test pruning deletes outputs of removed sources and replaced outputs."""
+        removed, removed_output = self._processed(tmp_path, "gone.jpg")
+        kept, old_output = self._processed(tmp_path, "kept.jpg")
+        new_output = tmp_path / "out" / "kept.avif"
+        new_output.write_bytes(b"output")
+
+        manifest = BuildManifest(tmp_path / "manifest.json", self.params)
+        manifest.record(removed, [removed_output])
+        manifest.record(kept, [old_output])
+        manifest.record(kept, [new_output])
+        removed.unlink()
+
+        assert manifest.prune() == 2
+        assert not removed_output.exists()
+        assert not old_output.exists()
+        assert new_output.exists()
+        assert list(manifest.entries) == [manifest.key(kept)]
+
+    def test_corrupt_manifest_is_ignored(self, tmp_path):
+        """Test an unreadable manifest starts from scratch."""
+        path = tmp_path / "manifest.json"
+        path.write_text("{not json")
+
+        assert BuildManifest(path, self.params).entries == {}
+
+
+class TestHashes:
+    """Test hashing helpers."""
+
+    def test_params_hash_is_order_independent(self):
+        assert params_hash({"a": 1, "b": 2}) == params_hash({"b": 2, "a": 1})
+
+    def test_file_hash(self, tmp_path):
+        path = tmp_path / "f.bin"
+        path.write_bytes(b"abc")
+        assert file_hash(path) == "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
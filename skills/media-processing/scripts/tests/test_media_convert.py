@@ -2,6 +2,8 @@
 """Tests for media_convert.py"""
 
 import sys
+import threading
+import time
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
@@ -10,7 +12,11 @@ import pytest
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from incremental import BuildManifest
 from media_convert import (
+    VIDEO_THREADS_PER_JOB,
+    CpuBudget,
+    batch_convert,
     build_audio_command,
     build_image_command,
     build_video_command,
@@ -215,6 +221,111 @@ class TestFileConversion:
         assert result is False
 
 
+class TestIncrementalBatch:
+    """Test batch conversion with a build manifest."""
+
+    @patch("media_convert.convert_file")
+    def test_unchanged_files_are_skipped(self, mock_convert, tmp_path):
+        """Test a second run only converts new files."""
+        def fake_convert(input_path, output_path, *args):
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            output_path.write_bytes(b"converted")
+            return True
+
+        mock_convert.side_effect = fake_convert
+        first = tmp_path / "a.png"
+        first.write_bytes(b"a")
+        output_dir = tmp_path / "out"
+        manifest_path = tmp_path / "manifest.json"
+
+        manifest = BuildManifest(manifest_path, {"preset": "web"})
+        assert batch_convert([first], output_dir, "jpg", manifest=manifest) == (1, 0)
+        manifest.save()
+
+        second = tmp_path / "b.png"
+        second.write_bytes(b"b")
+        manifest = BuildManifest(manifest_path, {"preset": "web"})
+        assert batch_convert([first, second], output_dir, "jpg", manifest=manifest) == (1, 0)
+
+        assert manifest.skipped == 1
+        assert mock_convert.call_count == 2
+        assert mock_convert.call_args[0][0] == second
+
+
+class TestConcurrentBatch:
+    """Test the CPU-budgeted batch scheduler."""
+
+    def test_video_command_thread_budget(self):
+        """Test video encodes can be limited to a thread budget."""
+        cmd = build_video_command(Path("in.mov"), Path("out.mp4"), threads=4)
+
+        assert cmd[cmd.index("-threads") + 1] == "4"
+        assert cmd[-1] == "out.mp4"
+        assert "-threads" not in build_video_command(Path("in.mov"), Path("out.mp4"))
+
+    def test_budget_is_never_exceeded(self):
+        """Test reservations block until enough slots are free."""
+        budget = CpuBudget(4)
+        in_use = []
+        peak = [0]
+        lock = threading.Lock()
+
+        def job(cost):
+            with budget.reserve(cost):
+                with lock:
+                    in_use.append(cost)
+                    peak[0] = max(peak[0], sum(in_use))
+                time.sleep(0.01)
+                with lock:
+                    in_use.remove(cost)
+
+        threads = [threading.Thread(target=job, args=(cost,)) for cost in (3, 2, 1, 4, 1, 2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert peak[0] <= 4
+
+    @patch("media_convert.probe_duration", return_value=10.0)
+    @patch("media_convert.convert_file")
+    def test_videos_get_thread_budget_and_report(self, mock_convert, mock_probe, tmp_path):
+        """Test videos are encoded with a thread limit and per-file stats are reported."""
+        mock_convert.return_value = True
+        video = tmp_path / "clip.mov"
+        video.write_bytes(b"v" * 1000)
+        image = tmp_path / "photo.png"
+        image.write_bytes(b"i" * 10)
+        report = []
+
+        result = batch_convert(
+            [image, video], tmp_path / "out", "mp4", jobs=16, report=report
+        )
+
+        assert result == (2, 0)
+        threads_by_input = {c[0][0]: c[0][5] for c in mock_convert.call_args_list}
+        assert threads_by_input[video] == VIDEO_THREADS_PER_JOB
+        assert threads_by_input[image] is None
+        stats = {Path(r["input"]): r for r in report}
+        assert stats[video]["duration"] == 10.0
+        assert "realtime_factor" in stats[video]
+        assert "duration" not in stats[image]
+        assert all(r["success"] for r in report)
+
+    @patch("media_convert.convert_file", return_value=False)
+    def test_failures_are_counted(self, mock_convert, tmp_path):
+        """Test failed conversions are counted and reported."""
+        files = []
+        for name in ("a.png", "b.png", "c.png"):
+            path = tmp_path / name
+            path.write_bytes(b"x")
+            files.append(path)
+        report = []
+
+        assert batch_convert(files, tmp_path / "out", "jpg", jobs=2, report=report) == (0, 3)
+        assert [r["success"] for r in report] == [False, False, False]
+
+
 class TestQualityPresets:
     """Test quality preset functionality."""
 
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Tests for probe_cache.py"""
+
+import json
+import os
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import probe_cache
+
+PROBE_OUTPUT = {"format": {"duration": "12.5", "size": "4"}, "streams": []}
+
+
+class TestProbeCache:
+    """Test cached ffprobe results."""
+
+    def setup_method(self):
+        """Start each test with an empty memory-only cache."""
+        probe_cache.clear()
+        probe_cache.set_cache_file(None)
+
+    def teardown_method(self):
+        probe_cache.clear()
+        probe_cache.set_cache_file(None)
+
+    @patch("subprocess.run")
+    def test_probes_once_per_file(self, mock_run, tmp_path):
+        """Test repeated probes of an unchanged file reuse the result."""
+        mock_run.return_value = MagicMock(stdout=json.dumps(PROBE_OUTPUT).encode())
+        media = tmp_path / "clip.mp4"
+        media.write_bytes(b"data")
+
+        assert probe_cache.probe(media) == PROBE_OUTPUT
+        assert probe_cache.probe(str(media)) == PROBE_OUTPUT
+        assert mock_run.call_count == 1
+
+    @patch("subprocess.run")
+    def test_changed_file_is_probed_again(self, mock_run, tmp_path):
+        """Test a size or mtime change invalidates the entry."""
+        mock_run.return_value = MagicMock(stdout=json.dumps(PROBE_OUTPUT).encode())
+        media = tmp_path / "clip.mp4"
+        media.write_bytes(b"data")
+        probe_cache.probe(media)
+
+        media.write_bytes(b"new data")
+        probe_cache.probe(media)
+
+        stat = media.stat()
+        os.utime(media, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        probe_cache.probe(media)
+
+        assert mock_run.call_count == 3
+
+    @patch("subprocess.run")
+    def test_missing_file_is_not_cached(self, mock_run):
+        """Test files that cannot be stat'ed are always probed."""
+        mock_run.return_value = MagicMock(stdout=json.dumps(PROBE_OUTPUT).encode())
+
+        probe_cache.probe("missing.mp4")
+        probe_cache.probe("missing.mp4")
+
+        assert mock_run.call_count == 2
+
+    @patch("subprocess.run")
+    def test_failures_are_not_cached(self, mock_run, tmp_path):
+        """Test a failed probe is retried next time."""
+        media = tmp_path / "clip.mp4"
+        media.write_bytes(b"data")
+        mock_run.return_value = MagicMock(stdout=b"not json")
+
+        with pytest.raises(ValueError):
+            probe_cache.probe(media)
+
+        mock_run.return_value = MagicMock(stdout=json.dumps(PROBE_OUTPUT).encode())
+        assert probe_cache.probe(media) == PROBE_OUTPUT
+
+    @patch("subprocess.run")
+    def test_disk_store_persists_across_runs(self, mock_run, tmp_path):
+        """Test entries saved to the store are reused after a restart."""
+        mock_run.return_value = MagicMock(stdout=json.dumps(PROBE_OUTPUT).encode())
+        media = tmp_path / "clip.mp4"
+        media.write_bytes(b"data")
+        store = tmp_path / "cache" / "ffprobe.json"
+
+        probe_cache.set_cache_file(store)
+        probe_cache.probe(media)
+        probe_cache.save()
+        assert store.exists()
+
+        probe_cache.clear()
+        probe_cache.set_cache_file(store)
+        assert probe_cache.probe(media) == PROBE_OUTPUT
+        assert mock_run.call_count == 1
+
+    @patch("subprocess.run")
+    def test_unwritable_store_is_reported(self, mock_run, tmp_path, capsys):
+        """Test save() warns instead of raising when the store cannot be written."""
+        mock_run.return_value = MagicMock(stdout=json.dumps(PROBE_OUTPUT).encode())
+        media = tmp_path / "clip.mp4"
+        media.write_bytes(b"data")
+        blocker = tmp_path / "not-a-dir"
+        blocker.write_text("")
+
+        probe_cache.set_cache_file(blocker / "ffprobe.json")
+        probe_cache.probe(media)
+        probe_cache.save()
+
+        assert "could not save ffprobe cache" in capsys.readouterr().err
+
+    @patch("subprocess.run")
+    def test_save_uses_a_unique_temp_file(self, mock_run, tmp_path):
+        """Test another run's temp file is left alone and no temp file remains."""
+        mock_run.return_value = MagicMock(stdout=json.dumps(PROBE_OUTPUT).encode())
+        media = tmp_path / "clip.mp4"
+        media.write_bytes(b"data")
+        store = tmp_path / "cache" / "ffprobe.json"
+        store.parent.mkdir()
+        other_run = store.parent / "ffprobe.json.tmp"
+        other_run.write_text("partial")
+
+        probe_cache.set_cache_file(store)
+        probe_cache.probe(media)
+        probe_cache.save()
+
+        assert sorted(p.name for p in store.parent.iterdir()) == ["ffprobe.json", "ffprobe.json.tmp"]
+        assert other_run.read_text() == "partial"
+        assert json.loads(store.read_text())["version"] == probe_cache.CACHE_VERSION
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
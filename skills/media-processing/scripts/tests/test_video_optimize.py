@@ -2,6 +2,7 @@
 """Tests for video_optimize.py"""
 
 import json
+import subprocess
 import sys
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -325,6 +326,208 @@ class TestVideoOptimizer:
         assert result is False
 
 
+class TestCrfSearch:
+    """Test content-aware CRF selection."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.optimizer = VideoOptimizer()
+        self.info = VideoInfo(
+            path=Path("input.mp4"),
+            duration=120.0,
+            width=1920,
+            height=1080,
+            bitrate=5000000,
+            fps=30.0,
+            size=75000000,
+            codec="h264",
+            audio_codec="aac",
+            audio_bitrate=128000
+        )
+
+    def test_sample_windows_spread(self):
+        """Test samples are spread evenly through the video."""
+        windows = self.optimizer.sample_windows(120.0, count=3, length=4.0)
+
+        assert windows == [(28.0, 4.0), (58.0, 4.0), (88.0, 4.0)]
+
+    def test_sample_windows_short_video(self):
+        """Test a short video is sampled whole."""
+        assert self.optimizer.sample_windows(10.0, count=3, length=4.0) == [(0.0, None)]
+
+    def test_sample_windows_unknown_duration(self):
+        """Test a zero duration samples the whole file instead of zero seconds."""
+        assert self.optimizer.sample_windows(0.0) == [(0.0, None)]
+
+    @patch("subprocess.run")
+    def test_whole_file_sample_has_no_duration(self, mock_run):
+        """Test the whole-video window is encoded without -ss or -t."""
+        mock_run.return_value = MagicMock(returncode=0)
+
+        assert self.optimizer.encode_sample(Path("in.mp4"), Path("out.mkv"), [], 0.0, None)
+
+        cmd = mock_run.call_args[0][0]
+        assert "-ss" not in cmd and "-t" not in cmd
+
+    @patch("subprocess.run")
+    def test_measure_ssim(self, mock_run):
+        """Test SSIM is parsed from ffmpeg output."""
+        mock_run.return_value = MagicMock(
+            stderr="[Parsed_ssim_0 @ 0x1] SSIM Y:0.990 U:0.995 V:0.994 All:0.991234 (20.5)\n"
+        )
+
+        assert self.optimizer.measure_quality(Path("a.mp4"), Path("b.mkv")) == 0.991234
+        assert "[0:v][1:v]ssim" in mock_run.call_args[0][0]
+
+    @patch("subprocess.run")
+    def test_measure_vmaf(self, mock_run):
+        """Test VMAF is parsed from ffmpeg output."""
+        mock_run.return_value = MagicMock(stderr="[libvmaf @ 0x1] VMAF score: 94.512\n")
+
+        assert self.optimizer.measure_quality(Path("a.mp4"), Path("b.mkv"), "vmaf") == 94.512
+
+    def fake_encode(self, input_path, output_path, video_args, start=None, length=None):
+        output_path.write_bytes(b"x" * 1000)
+        return True
+
+    def test_search_picks_highest_passing_crf(self):
+        """Test bisection returns the highest CRF meeting the target."""
+        # Quality drops by 0.005 per CRF step above 16
+        def fake_quality(distorted, reference, metric="ssim"):
+            crf = int(distorted.name.split("-")[0][3:])
+            return 1.0 - 0.005 * (crf - 16)
+
+        with patch.object(self.optimizer, "encode_sample", side_effect=self.fake_encode), \
+                patch.object(self.optimizer, "measure_quality", side_effect=fake_quality) as mock_quality:
+            crf = self.optimizer.search_crf(Path("input.mp4"), self.info, [], 0.95)
+
+        assert crf == 26
+        # Bisection over 16-36 needs far fewer than 21 candidates x 3 samples
+        assert mock_quality.call_count <= 5 * 3
+
+    def test_search_falls_back_to_lowest_crf(self):
+        """Test the best-quality CRF is used when nothing meets the target."""
+        with patch.object(self.optimizer, "encode_sample", side_effect=self.fake_encode), \
+                patch.object(self.optimizer, "measure_quality", return_value=0.5):
+            assert self.optimizer.search_crf(Path("input.mp4"), self.info, [], 0.99) == 16
+
+    @patch("subprocess.run")
+    @patch.object(VideoOptimizer, "search_crf", return_value=27)
+    @patch.object(VideoOptimizer, "get_video_info")
+    def test_optimize_uses_searched_crf(self, mock_get_info, mock_search, mock_run):
+        """Test the full encode uses the searched CRF in a single pass."""
+        mock_get_info.return_value = self.info
+        mock_run.return_value = MagicMock(returncode=0)
+
+        result = self.optimizer.optimize_video(
+            Path("input.mp4"),
+            Path("output.mp4"),
+            two_pass=True,
+            target_quality=0.97
+        )
+
+        assert result is True
+        cmd = mock_run.call_args[0][0]
+        assert cmd[cmd.index("-crf") + 1] == "27"
+        assert "-pass" not in cmd
+
+
+class TestChunkedEncoding:
+    """Test segment-parallel encoding."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.optimizer = VideoOptimizer()
+
+    @staticmethod
+    def fake_ffmpeg(cmd, **kwargs):
+        """Create the files an ffmpeg invocation would write."""
+        if "segment" in cmd:
+            pattern = Path(cmd[-1])
+            for i in range(3):
+                (pattern.parent / (pattern.name % i)).write_bytes(b"src")
+        else:
+            Path(cmd[-1]).write_bytes(b"out")
+        return MagicMock(returncode=0)
+
+    @patch("subprocess.run")
+    def test_split_encode_and_join(self, mock_run, tmp_path):
+        """Test segments are encoded identically and joined without re-encoding."""
+        lists = []
+
+        def record(cmd, **kwargs):
+            if "concat" in cmd:
+                lists.append(Path(cmd[cmd.index("concat") + 4]).read_text())
+            return self.fake_ffmpeg(cmd, **kwargs)
+
+        mock_run.side_effect = record
+        video_args = ["-c:v", "libx264", "-preset", "medium", "-crf", "23"]
+
+        result = self.optimizer.encode_chunked(
+            Path("input.mp4"), tmp_path / "out.mp4", video_args, workers=2
+        )
+
+        assert result is True
+        cmds = [c[0][0] for c in mock_run.call_args_list]
+        split, encodes, join = cmds[0], cmds[1:-1], cmds[-1]
+
+        assert split[split.index("-c") + 1] == "copy"
+        assert split[split.index("-f") + 1] == "segment"
+        assert len(encodes) == 3
+        assert all(cmd[5:11] == video_args and "-an" in cmd for cmd in encodes)
+        assert join[join.index("-c:v") + 1] == "copy"
+        assert "1:a:0?" in join
+        assert lists[0].count("file '") == 3
+        assert "enc_00000.mp4" in lists[0].splitlines()[0]
+
+    @patch("subprocess.run")
+    def test_creates_missing_output_dir(self, mock_run, tmp_path):
+        """Test the output directory is created before the chunk dir inside it."""
+        mock_run.side_effect = self.fake_ffmpeg
+        output = tmp_path / "new" / "out.mp4"
+
+        assert self.optimizer.encode_chunked(Path("input.mp4"), output, ["-c:v", "libx264"])
+        assert output.exists()
+
+    @patch("subprocess.run")
+    def test_encode_failure(self, mock_run, tmp_path):
+        """Test a failing segment encode fails the whole job."""
+        def fail_encodes(cmd, **kwargs):
+            if "segment" in cmd:
+                return self.fake_ffmpeg(cmd, **kwargs)
+            raise subprocess.CalledProcessError(1, cmd)
+
+        mock_run.side_effect = fail_encodes
+
+        assert self.optimizer.encode_chunked(
+            Path("input.mp4"), tmp_path / "out.mp4", ["-c:v", "libx264"]
+        ) is False
+
+    @patch.object(VideoOptimizer, "encode_chunked", return_value=True)
+    @patch("subprocess.run")
+    @patch.object(VideoOptimizer, "get_video_info")
+    def test_short_video_is_not_chunked(self, mock_get_info, mock_run, mock_chunked):
+        """Test inputs shorter than two segments use a single encode."""
+        mock_get_info.return_value = VideoInfo(
+            path=Path("input.mp4"), duration=90.0, width=1280, height=720,
+            bitrate=2000000, fps=30.0, size=1000000, codec="h264",
+            audio_codec="aac", audio_bitrate=128000
+        )
+        mock_run.return_value = MagicMock(returncode=0)
+
+        assert self.optimizer.optimize_video(
+            Path("input.mp4"), Path("output.mp4"), chunked=True
+        ) is True
+        mock_chunked.assert_not_called()
+
+        mock_get_info.return_value.duration = 3600.0
+        assert self.optimizer.optimize_video(
+            Path("input.mp4"), Path("output.mp4"), crf=25, chunked=True
+        ) is True
+        video_args = mock_chunked.call_args[0][2]
+        assert video_args[video_args.index("-crf") + 1] == "25"
+
+
 class TestVideoInfo:
     """Test VideoInfo dataclass."""
 
@@ -4,15 +4,39 @@ Video size optimization with quality/size balance.
 
 Supports resolution reduction, frame rate adjustment, audio bitrate optimization,
 multi-pass encoding, and comparison metrics.
+
+With a target quality, a CRF search encodes a few short samples of the video,
+scores them against a lossless reference with ffmpeg's ssim or libvmaf filter,
+and encodes the full video once at the highest CRF (lowest bitrate) that meets
+the target on every sample.
+
+Chunked mode splits long inputs at keyframes, encodes the segments in
+parallel ffmpeg processes and joins them with the concat demuxer.
 """
 
 import argparse
-import json
+import os
+import re
 import subprocess
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+
+import probe_cache
+
+# x264 threads per segment encode in chunked mode
+CHUNK_THREADS = 4
+
+# CRF search bounds for libx264 (inclusive)
+CRF_SEARCH_RANGE = (16, 36)
+
+QUALITY_PATTERNS = {
+    'ssim': re.compile(r'All:([\d.]+)'),
+    'vmaf': re.compile(r'VMAF score[:=]\s*([\d.]+)'),
+}
 
 
 @dataclass
@@ -30,6 +54,14 @@ class VideoInfo:
     audio_bitrate: int
 
 
+@dataclass
+class SampleResult:
+    """Quality and bitrate of one CRF candidate over all samples."""
+    crf: int
+    quality: float
+    bitrate: int
+
+
 class VideoOptimizer:
     """Handle video optimization operations using FFmpeg."""
 
@@ -51,19 +83,9 @@ class VideoOptimizer:
             return False
 
     def get_video_info(self, input_path: Path) -> Optional[VideoInfo]:
-        """Extract video information using ffprobe."""
+        """Extract video information using ffprobe (cached, see probe_cache)."""
         try:
-            cmd = [
-                'ffprobe',
-                '-v', 'quiet',
-                '-print_format', 'json',
-                '-show_format',
-                '-show_streams',
-                str(input_path)
-            ]
-
-            result = subprocess.run(cmd, capture_output=True, check=True)
-            data = json.loads(result.stdout)
+            data = probe_cache.probe(input_path)
 
             # Find video and audio streams
             video_stream = None
@@ -136,6 +158,264 @@ class VideoOptimizer:
 
         return new_width, new_height
 
+    def sample_windows(
+        self,
+        duration: float,
+        count: int = 3,
+        length: float = 4.0
+    ) -> List[Tuple[float, Optional[float]]]:
+        """
+        Evenly spaced (start, length) windows, or the whole video if it is short.
+
+        The whole-video window has length None so no -t is passed; a zero or
+        unknown probed duration then cannot produce an empty sample.
+        """
+        if duration <= count * length:
+            return [(0.0, None)]
+
+        windows = []
+        for i in range(count):
+            center = duration * (i + 1) / (count + 1)
+            windows.append((round(max(0.0, center - length / 2), 3), length))
+        return windows
+
+    def encode_sample(
+        self,
+        input_path: Path,
+        output_path: Path,
+        video_args: List[str],
+        start: Optional[float] = None,
+        length: Optional[float] = None
+    ) -> bool:
+        """Encode a video-only sample with the given codec arguments."""
+        cmd = ['ffmpeg', '-v', 'error']
+        if start:
+            cmd.extend(['-ss', str(start)])
+        if length:
+            cmd.extend(['-t', str(length)])
+        cmd.extend(['-i', str(input_path)] + video_args + ['-an', '-y', str(output_path)])
+
+        if self.verbose:
+            print(f"Sample: {' '.join(cmd)}")
+
+        try:
+            subprocess.run(cmd, check=True, capture_output=True)
+            return True
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            print(f"Error encoding sample: {e}", file=sys.stderr)
+            return False
+
+    def measure_quality(
+        self,
+        distorted: Path,
+        reference: Path,
+        metric: str = 'ssim'
+    ) -> Optional[float]:
+        """Score distorted against reference with ffmpeg's ssim or libvmaf filter."""
+        filter_name = 'libvmaf' if metric == 'vmaf' else 'ssim'
+        cmd = [
+            'ffmpeg', '-i', str(distorted), '-i', str(reference),
+            '-lavfi', f'[0:v][1:v]{filter_name}',
+            '-f', 'null', '-'
+        ]
+
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            print(f"Error measuring {metric}: {e}", file=sys.stderr)
+            return None
+
+        matches = QUALITY_PATTERNS[metric].findall(result.stderr)
+        return float(matches[-1]) if matches else None
+
+    def search_crf(
+        self,
+        input_path: Path,
+        info: VideoInfo,
+        filter_args: List[str],
+        target_quality: float,
+        metric: str = 'ssim',
+        preset: str = 'medium',
+        samples: int = 3,
+        sample_duration: float = 4.0,
+        crf_range: Tuple[int, int] = CRF_SEARCH_RANGE
+    ) -> Optional[int]:
+        """
+        Find the highest CRF whose samples all meet target_quality.
+
+        Quality falls monotonically as CRF rises, so candidates are bisected:
+        about log2(range) sample encodes instead of one per CRF.
+
+        Returns:
+            Chosen CRF, the lowest CRF in range if none meets the target,
+            or None if sampling failed
+        """
+        windows = self.sample_windows(info.duration, samples, sample_duration)
+        results: Dict[int, SampleResult] = {}
+
+        with tempfile.TemporaryDirectory(prefix='crf-search-') as tmp:
+            tmp_dir = Path(tmp)
+
+            # Lossless references with the same scaling/fps as the final encode
+            references = []
+            for i, (start, length) in enumerate(windows):
+                reference = tmp_dir / f'ref{i}.mkv'
+                lossless = filter_args + ['-c:v', 'libx264', '-preset', 'ultrafast', '-qp', '0']
+                if not self.encode_sample(input_path, reference, lossless, start, length):
+                    return None
+                references.append((reference, length or info.duration))
+
+            def evaluate(crf: int) -> Optional[SampleResult]:
+                qualities = []
+                total_bits = 0
+                total_seconds = 0.0
+                for i, (reference, length) in enumerate(references):
+                    sample = tmp_dir / f'crf{crf}-{i}.mp4'
+                    args = ['-c:v', 'libx264', '-preset', preset, '-crf', str(crf)]
+                    if not self.encode_sample(reference, sample, args):
+                        return None
+                    quality = self.measure_quality(sample, reference, metric)
+                    if quality is None:
+                        return None
+                    qualities.append(quality)
+                    total_bits += sample.stat().st_size * 8
+                    total_seconds += length
+                return SampleResult(
+                    crf=crf,
+                    quality=min(qualities),
+                    bitrate=int(total_bits / total_seconds) if total_seconds else 0
+                )
+
+            low, high = crf_range
+            best = None
+            while low <= high:
+                crf = (low + high) // 2
+                result = evaluate(crf)
+                if result is None:
+                    return None
+                results[crf] = result
+                if result.quality >= target_quality:
+                    best = crf
+                    low = crf + 1
+                else:
+                    high = crf - 1
+
+        if self.verbose:
+            print(f"\nCRF search ({metric}, target {target_quality}):")
+            for crf in sorted(results):
+                r = results[crf]
+                print(f"  CRF {crf}: {metric} {r.quality:.4f}, {r.bitrate // 1000} kbps")
+
+        if best is None:
+            print(
+                f"Warning: no CRF in {crf_range[0]}-{crf_range[1]} reaches {metric} "
+                f"{target_quality}; using CRF {crf_range[0]}",
+                file=sys.stderr
+            )
+            return crf_range[0]
+
+        return best
+
+    def encode_chunked(
+        self,
+        input_path: Path,
+        output_path: Path,
+        video_args: List[str],
+        audio_bitrate: str = '128k',
+        segment_duration: float = 60.0,
+        workers: Optional[int] = None
+    ) -> bool:
+        """
+        Encode keyframe-aligned segments in parallel and join them losslessly.
+
+        The video stream is split with the segment muxer using stream copy, so
+        cuts land on the source's keyframes (which its encoder placed at scene
+        cuts). Each segment is encoded by its own ffmpeg process with identical
+        video_args. The results are joined with the concat demuxer without
+        re-encoding, and audio is encoded once from the original input in the
+        same pass, so there are no gaps or priming delays at the joins.
+        """
+        workers = workers or max(1, (os.cpu_count() or 1) // CHUNK_THREADS)
+        threads = max(1, (os.cpu_count() or 1) // workers)
+
+        def split_cmd(chunk_dir: Path) -> List[str]:
+            return [
+                'ffmpeg', '-v', 'error', '-i', str(input_path),
+                '-map', '0:v:0', '-c', 'copy',
+                '-f', 'segment', '-segment_time', str(segment_duration),
+                '-reset_timestamps', '1',
+                str(chunk_dir / 'src_%05d.mkv')
+            ]
+
+        def encode_cmd(source: Path, target: Path) -> List[str]:
+            return (
+                ['ffmpeg', '-v', 'error', '-i', str(source)] + video_args +
+                ['-threads', str(threads), '-an', '-y', str(target)]
+            )
+
+        def concat_cmd(list_file: Path) -> List[str]:
+            return [
+                'ffmpeg', '-v', 'error',
+                '-f', 'concat', '-safe', '0', '-i', str(list_file),
+                '-i', str(input_path),
+                '-map', '0:v:0', '-map', '1:a:0?',
+                '-c:v', 'copy',
+                '-c:a', 'aac', '-b:a', audio_bitrate,
+                '-movflags', '+faststart', '-y', str(output_path)
+            ]
+
+        if self.verbose or self.dry_run:
+            print(f"Split: {' '.join(split_cmd(Path('chunks')))}")
+            print(f"Encode ({workers} parallel): "
+                  f"{' '.join(encode_cmd(Path('chunks/src_N.mkv'), Path('chunks/enc_N.mp4')))}")
+            print(f"Join: {' '.join(concat_cmd(Path('chunks/list.txt')))}")
+
+        if self.dry_run:
+            return True
+
+        output_path.resolve().parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix='chunks-', dir=output_path.resolve().parent) as tmp:
+            chunk_dir = Path(tmp)
+            try:
+                subprocess.run(split_cmd(chunk_dir), check=True, capture_output=True)
+
+                sources = sorted(chunk_dir.glob('src_*.mkv'))
+                if not sources:
+                    print("Error: splitting produced no segments", file=sys.stderr)
+                    return False
+                targets = [chunk_dir / f'enc_{i:05d}.mp4' for i in range(len(sources))]
+
+                def encode(pair: Tuple[Path, Path]) -> None:
+                    subprocess.run(encode_cmd(*pair), check=True, capture_output=True)
+
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    list(pool.map(encode, zip(sources, targets)))
+
+                list_file = chunk_dir / 'list.txt'
+                with open(list_file, 'w') as f:
+                    for target in targets:
+                        escaped = target.as_posix().replace("'", "'\\''")
+                        f.write(f"file '{escaped}'\n")
+
+                subprocess.run(concat_cmd(list_file), check=True, capture_output=True)
+                return True
+
+            except subprocess.CalledProcessError as e:
+                print(f"Error in chunked encode: {e}", file=sys.stderr)
+                return False
+
+    def print_output_info(self, info: VideoInfo, output_path: Path) -> None:
+        """Print output video info and size reduction (verbose mode)."""
+        output_info = self.get_video_info(output_path)
+        if output_info and self.verbose:
+            print(f"\nOutput video info:")
+            print(f"  Resolution: {output_info.width}x{output_info.height}")
+            print(f"  FPS: {output_info.fps:.2f}")
+            print(f"  Bitrate: {output_info.bitrate // 1000} kbps")
+            print(f"  Size: {output_info.size / (1024*1024):.2f} MB")
+            reduction = (1 - output_info.size / info.size) * 100
+            print(f"  Size reduction: {reduction:.1f}%")
+
     def optimize_video(
         self,
         input_path: Path,
@@ -146,9 +426,23 @@ class VideoOptimizer:
         crf: int = 23,
         audio_bitrate: str = '128k',
         preset: str = 'medium',
-        two_pass: bool = False
+        two_pass: bool = False,
+        target_quality: Optional[float] = None,
+        metric: str = 'ssim',
+        samples: int = 3,
+        sample_duration: float = 4.0,
+        chunked: bool = False,
+        segment_duration: float = 60.0,
+        workers: Optional[int] = None
     ) -> bool:
-        """Optimize a video file."""
+        """
+        Optimize a video file.
+
+        If target_quality is set (SSIM 0-1 or VMAF 0-100, per metric), the CRF
+        is chosen by search_crf instead of using crf or two_pass. If chunked,
+        inputs longer than two segments are encoded with encode_chunked (CRF
+        only).
+        """
         # Get input video info
         info = self.get_video_info(input_path)
         if not info:
@@ -167,20 +461,50 @@ class VideoOptimizer:
             info.width, info.height, max_width, max_height
         )
 
-        # Build FFmpeg command
-        cmd = ['ffmpeg', '-i', str(input_path)]
-
         # Video filters
+        filter_args = []
         filters = []
         if target_width != info.width or target_height != info.height:
             filters.append(f'scale={target_width}:{target_height}')
 
         if filters:
-            cmd.extend(['-vf', ','.join(filters)])
+            filter_args.extend(['-vf', ','.join(filters)])
 
         # Frame rate adjustment
         if target_fps and target_fps < info.fps:
-            cmd.extend(['-r', str(target_fps)])
+            filter_args.extend(['-r', str(target_fps)])
+
+        # Content-aware CRF
+        if target_quality is not None:
+            two_pass = False
+            if self.dry_run:
+                print(f"CRF search for {metric} >= {target_quality} skipped in dry run; using CRF {crf}")
+            else:
+                found = self.search_crf(
+                    input_path, info, filter_args, target_quality,
+                    metric, preset, samples, sample_duration
+                )
+                if found is None:
+                    print("Error: CRF search failed", file=sys.stderr)
+                    return False
+                crf = found
+                print(f"Selected CRF {crf} for {metric} >= {target_quality}")
+
+        # Segment-parallel encoding
+        if chunked and info.duration > 2 * segment_duration:
+            if two_pass:
+                print("Note: two-pass is not used in chunked mode; encoding with CRF")
+            video_args = filter_args + ['-c:v', 'libx264', '-preset', preset, '-crf', str(crf)]
+            if not self.encode_chunked(
+                input_path, output_path, video_args, audio_bitrate, segment_duration, workers
+            ):
+                return False
+            if not self.dry_run:
+                self.print_output_info(info, output_path)
+            return True
+
+        # Build FFmpeg command
+        cmd = ['ffmpeg', '-i', str(input_path)] + filter_args
 
         # Video encoding
         if two_pass:
@@ -241,18 +565,7 @@ class VideoOptimizer:
         # Execute
         try:
             subprocess.run(cmd, check=True, capture_output=not self.verbose)
-
-            # Get output info
-            output_info = self.get_video_info(output_path)
-            if output_info and self.verbose:
-                print(f"\nOutput video info:")
-                print(f"  Resolution: {output_info.width}x{output_info.height}")
-                print(f"  FPS: {output_info.fps:.2f}")
-                print(f"  Bitrate: {output_info.bitrate // 1000} kbps")
-                print(f"  Size: {output_info.size / (1024*1024):.2f} MB")
-                reduction = (1 - output_info.size / info.size) * 100
-                print(f"  Size reduction: {reduction:.1f}%")
-
+            self.print_output_info(info, output_path)
             return True
 
         except subprocess.CalledProcessError as e:
@@ -355,6 +668,51 @@ def main():
         action='store_true',
         help='Use two-pass encoding (better quality)'
     )
+    parser.add_argument(
+        '--target-quality',
+        type=float,
+        help='Pick the highest CRF meeting this quality on sample encodes '
+             '(e.g. 0.98 for SSIM, 93 for VMAF); overrides --crf/--two-pass'
+    )
+    parser.add_argument(
+        '--metric',
+        choices=['ssim', 'vmaf'],
+        default='ssim',
+        help='Quality metric for --target-quality (vmaf needs ffmpeg with libvmaf, default: ssim)'
+    )
+    parser.add_argument(
+        '--samples',
+        type=int,
+        default=3,
+        help='Number of sample segments for --target-quality (default: 3)'
+    )
+    parser.add_argument(
+        '--sample-duration',
+        type=float,
+        default=4.0,
+        help='Length of each sample segment in seconds (default: 4)'
+    )
+    parser.add_argument(
+        '--chunked',
+        action='store_true',
+        help='Split at keyframes and encode segments in parallel (long inputs)'
+    )
+    parser.add_argument(
+        '--segment-duration',
+        type=float,
+        default=60.0,
+        help='Target segment length in seconds for --chunked (default: 60)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help=f'Parallel segment encodes for --chunked (default: CPU count / {CHUNK_THREADS})'
+    )
+    parser.add_argument(
+        '--probe-cache',
+        type=Path,
+        help=f'JSON file caching ffprobe results across runs (default: ${probe_cache.CACHE_ENV})'
+    )
     parser.add_argument(
         '--compare',
         action='store_true',
@@ -378,6 +736,9 @@ def main():
         print(f"Error: Input file not found: {args.input}", file=sys.stderr)
         sys.exit(1)
 
+    if args.probe_cache:
+        probe_cache.set_cache_file(args.probe_cache)
+
     # Initialize optimizer
     optimizer = VideoOptimizer(verbose=args.verbose, dry_run=args.dry_run)
 
@@ -397,7 +758,14 @@ def main():
         args.crf,
         args.audio_bitrate,
         args.preset,
-        args.two_pass
+        args.two_pass,
+        args.target_quality,
+        args.metric,
+        args.samples,
+        args.sample_duration,
+        args.chunked,
+        args.segment_duration,
+        args.workers
     )
 
     if not success:
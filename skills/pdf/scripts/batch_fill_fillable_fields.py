@@ -0,0 +1,174 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pypdf import PdfReader, PdfWriter
+
+from extract_form_field_info import get_field_info
+from fill_fillable_fields import monkeypatch_pydpf_method, validation_error_for_field_value
+
+
+# Fills one fillable PDF template for many records (CSV or JSONL) in parallel.
+#
+# The template's fields are extracted once and every record is validated against
+# them before any PDF is written. Each worker process parses the template once and
+# then fills its share of records. Each record maps field IDs to values (the
+# `field_id`s from extract_form_field_info.py); an optional `_output` key names
+# the output file (two records may not share one). Empty CSV cells are left
+# unfilled. A JSONL line that is not an object, or a record that fails to fill,
+# is reported and does not stop the others.
+
+
+OUTPUT_KEY = "_output"
+RECORDS_PER_TASK = 25
+
+# Per-worker state, set by `init_worker`.
+_template_reader = None
+_field_pages = None
+
+
+def load_records(records_path):
+    if records_path.lower().endswith(".csv"):
+        with open(records_path, newline="", encoding="utf-8") as f:
+            return [{k: v for k, v in row.items() if v != ""} for row in csv.DictReader(f)]
+    with open(records_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# Returns a list of error messages for one record; empty if it is valid.
+def validate_record(record, fields_by_id):
+    errors = []
+    for field_id, value in record.items():
+        if field_id == OUTPUT_KEY:
+            continue
+        field = fields_by_id.get(field_id)
+        if not field:
+            errors.append(f"ERROR: `{field_id}` is not a valid field ID")
+            continue
+        err = validation_error_for_field_value(field, value)
+        if err:
+            errors.append(err)
+    return errors
+
+
+def output_path_for(record, index, output_dir):
+    name = record.get(OUTPUT_KEY) or f"record_{index + 1:05d}"
+    if not name.lower().endswith(".pdf"):
+        name += ".pdf"
+    return os.path.join(output_dir, os.path.basename(name))
+
+
+def init_worker(template_path, field_pages):
+    global _template_reader, _field_pages
+    monkeypatch_pydpf_method()
+    _template_reader = PdfReader(template_path)
+    _field_pages = field_pages
+
+
+def fill_record(record, output_path):
+    # Group by page number.
+    values_by_page = {}
+    for field_id, value in record.items():
+        if field_id != OUTPUT_KEY:
+            values_by_page.setdefault(_field_pages[field_id], {})[field_id] = value
+
+    writer = PdfWriter(clone_from=_template_reader)
+    for page, field_values in values_by_page.items():
+        writer.update_page_form_field_values(writer.pages[page - 1], field_values, auto_regenerate=False)
+    # See fill_fillable_fields.py; needed by many viewers to show the values.
+    writer.set_need_appearances_writer(True)
+
+    with open(output_path, "wb") as f:
+        writer.write(f)
+    return os.path.getsize(output_path)
+
+
+# Returns (filled count, bytes written, [(output_path, error message), ...]).
+def fill_records(tasks):
+    filled = 0
+    bytes_written = 0
+    failures = []
+    for record, output_path in tasks:
+        try:
+            bytes_written += fill_record(record, output_path)
+            filled += 1
+        except Exception as e:
+            failures.append((output_path, f"{type(e).__name__}: {e}"))
+    return filled, bytes_written, failures
+
+
+def batch_fill(template_path, records_path, output_dir, workers=None):
+    start = time.monotonic()
+    field_info = get_field_info(PdfReader(template_path))
+    fields_by_id = {f["field_id"]: f for f in field_info}
+    field_pages = {field_id: f["page"] for field_id, f in fields_by_id.items()}
+    records = load_records(records_path)
+
+    tasks = []
+    invalid = 0
+    record_for_output = {}
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            invalid += 1
+            print(f"Record {index + 1}: ERROR: expected a JSON object, got `{json.dumps(record)[:60]}`")
+            continue
+        errors = validate_record(record, fields_by_id)
+        output_path = output_path_for(record, index, output_dir)
+        # Compare case-insensitively so outputs don't collide on case-insensitive filesystems
+        other = record_for_output.setdefault(os.path.normcase(output_path).lower(), index)
+        if other != index:
+            errors.append(f"ERROR: output `{os.path.basename(output_path)}` is already used by record {other + 1}")
+        if errors:
+            invalid += 1
+            for err in errors:
+                print(f"Record {index + 1}: {err}")
+            continue
+        tasks.append((record, output_path))
+
+    os.makedirs(output_dir, exist_ok=True)
+    chunks = [tasks[i:i + RECORDS_PER_TASK] for i in range(0, len(tasks), RECORDS_PER_TASK)]
+    filled = 0
+    bytes_written = 0
+    failed = 0
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count() or 1,
+        initializer=init_worker,
+        initargs=(template_path, field_pages),
+    ) as pool:
+        for count, size, failures in pool.map(fill_records, chunks):
+            filled += count
+            bytes_written += size
+            for output_path, error in failures:
+                failed += 1
+                print(f"\nFailed to write {output_path}: {error}")
+            print(f"Filled {filled}/{len(tasks)} records", end="\r", flush=True)
+
+    elapsed = time.monotonic() - start
+    report = {
+        "records": len(records),
+        "filled": filled,
+        "invalid": invalid,
+        "failed": failed,
+        "seconds": round(elapsed, 2),
+        "records_per_second": round(filled / elapsed, 1) if elapsed else None,
+        "megabytes_written": round(bytes_written / 1024 / 1024, 2),
+    }
+    print()
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill a PDF form template for many records")
+    parser.add_argument("template_pdf", help="Fillable PDF template")
+    parser.add_argument("records", help="Records as .csv (header = field IDs) or .jsonl")
+    parser.add_argument("output_dir", help="Directory for filled PDFs")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+    report = batch_fill(args.template_pdf, args.records, args.output_dir, args.workers)
+    if report["invalid"] or report["failed"]:
+        sys.exit(1)
@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, FloatObject, NameObject, TextStringObject
+
+from batch_fill_fillable_fields import batch_fill, fill_records, init_worker
+
+
+def write_template(path):
+    """Writes a one-page PDF with a single text field, `name`."""
+    writer = PdfWriter()
+    page = writer.add_blank_page(200, 200)
+    field = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Annot"),
+        NameObject("/Subtype"): NameObject("/Widget"),
+        NameObject("/FT"): NameObject("/Tx"),
+        NameObject("/T"): TextStringObject("name"),
+        NameObject("/Rect"): ArrayObject([FloatObject(v) for v in (10, 10, 150, 30)]),
+        NameObject("/DA"): TextStringObject("/Helv 0 Tf 0 g"),
+    }))
+    page[NameObject("/Annots")] = ArrayObject([field])
+    writer._root_object[NameObject("/AcroForm")] = DictionaryObject({
+        NameObject("/Fields"): ArrayObject([field]),
+    })
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+# Currently this is not run automatically in CI; it's just for documentation and manual checking.
+class TestBatchFill(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.template = os.path.join(self.tmp.name, "template.pdf")
+        self.output_dir = os.path.join(self.tmp.name, "out")
+        write_template(self.template)
+
+    def run_batch(self, records):
+        """Helper to write records as JSONL and fill them; returns (report, printed text)"""
+        records_path = os.path.join(self.tmp.name, "records.jsonl")
+        with open(records_path, "w") as f:
+            f.write("\n".join(json.dumps(r) for r in records) + "\n")
+        out = StringIO()
+        with redirect_stdout(out):
+            report = batch_fill(self.template, records_path, self.output_dir, workers=1)
+        return report, out.getvalue()
+
+    def filled_value(self, name):
+        return PdfReader(os.path.join(self.output_dir, name)).get_fields()["name"].get("/V")
+
+    def test_fills_every_record(self):
+        report, _ = self.run_batch([{"name": "Ada"}, {"name": "Grace", "_output": "grace"}])
+        self.assertEqual((report["filled"], report["invalid"], report["failed"]), (2, 0, 0))
+        self.assertEqual(self.filled_value("record_00001.pdf"), "Ada")
+        self.assertEqual(self.filled_value("grace.pdf"), "Grace")
+
+    def test_duplicate_output_is_rejected(self):
+        """Outputs differing only by case or extension would overwrite each other"""
+        report, printed = self.run_batch([
+            {"name": "Ada", "_output": "same"},
+            {"name": "Grace", "_output": "SAME.pdf"},
+        ])
+        self.assertEqual((report["filled"], report["invalid"]), (1, 1))
+        self.assertIn("Record 2: ERROR: output `SAME.pdf` is already used by record 1", printed)
+        self.assertEqual(self.filled_value("same.pdf"), "Ada")
+
+    def test_non_object_lines_are_invalid_records(self):
+        report, printed = self.run_batch([["Ada"], {"name": "Grace"}, "Linus", {"unknown": "x"}])
+        self.assertEqual((report["records"], report["filled"], report["invalid"]), (4, 1, 3))
+        self.assertIn("Record 1: ERROR: expected a JSON object", printed)
+        self.assertIn("Record 3: ERROR: expected a JSON object", printed)
+        self.assertIn("Record 4: ERROR: `unknown` is not a valid field ID", printed)
+        self.assertEqual(self.filled_value("record_00002.pdf"), "Grace")
+
+    def test_failed_record_does_not_stop_others(self):
+        # A directory where the output file should go makes that one write fail
+        os.makedirs(os.path.join(self.output_dir, "blocked.pdf"))
+        report, printed = self.run_batch([
+            {"name": "Ada", "_output": "blocked"},
+            {"name": "Grace"},
+        ])
+        self.assertEqual((report["filled"], report["failed"]), (1, 1))
+        self.assertIn("Failed to write", printed)
+        self.assertIn("blocked.pdf", printed)
+        self.assertEqual(self.filled_value("record_00002.pdf"), "Grace")
+
+    def test_fill_records_collects_failures(self):
+        init_worker(self.template, {"name": 1})
+        missing_dir = os.path.join(self.tmp.name, "missing", "a.pdf")
+        good = os.path.join(self.tmp.name, "b.pdf")
+        filled, size, failures = fill_records([({"name": "Ada"}, missing_dir), ({"name": "Grace"}, good)])
+        self.assertEqual(filled, 1)
+        self.assertEqual(size, os.path.getsize(good))
+        self.assertEqual([path for path, _ in failures], [missing_dir])
+        self.assertTrue(failures[0][1].startswith("FileNotFoundError: "))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,35 +1,111 @@
+import argparse
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 from pdf2image import convert_from_path
+from pypdf import PdfReader
 
 
-# Converts each page of a PDF to a PNG image.
+# Converts each page of a PDF to an image (PNG by default).
+#
+# Pages are rendered in small ranges by a pool of pdftoppm workers, each at the
+# DPI that makes the page fit within `max_dim`, so no page is rendered larger
+# than needed and only a few pages are held in memory at a time. Each page is
+# written as soon as its range has been rendered.
 
 
-def convert(pdf_path, output_dir, max_dim=1000):
-    images = convert_from_path(pdf_path, dpi=200)
+MAX_DPI = 200
+PAGES_PER_JOB = 4
+FORMATS = {"png": "PNG", "jpeg": "JPEG", "jpg": "JPEG", "webp": "WEBP"}
 
-    for i, image in enumerate(images):
-        # Scale image if needed to keep width/height under `max_dim`
-        width, height = image.size
-        if width > max_dim or height > max_dim:
-            scale_factor = min(max_dim / width, max_dim / height)
-            new_width = int(width * scale_factor)
-            new_height = int(height * scale_factor)
-            image = image.resize((new_width, new_height))
-        
-        image_path = os.path.join(output_dir, f"page_{i+1}.png")
-        image.save(image_path)
-        print(f"Saved page {i+1} as {image_path} (size: {image.size})")
 
-    print(f"Converted {len(images)} pages to PNG images")
+# Parses a selection like "1-3,7,10-" into sorted 1-based page numbers.
+def parse_page_selection(selection, page_count):
+    pages = set()
+    for part in selection.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            first = int(start) if start else 1
+            last = int(end) if end else page_count
+        else:
+            first = last = int(part)
+        if first < 1 or last > page_count or first > last:
+            raise ValueError(f"Invalid page range '{part}' (document has {page_count} pages)")
+        pages.update(range(first, last + 1))
+    return sorted(pages)
+
+
+# DPI at which the page's longest side is `max_dim` pixels, capped at MAX_DPI.
+def dpi_for_page(page, max_dim):
+    box = page.cropbox
+    longest_side_inches = max(float(box.width), float(box.height)) / 72
+    return max(1, min(MAX_DPI, round(max_dim / longest_side_inches, 2)))
+
+
+# Groups consecutive pages rendered at the same DPI into (first, last, dpi) jobs.
+def plan_jobs(reader, pages, max_dim):
+    jobs = []
+    for page_number in pages:
+        dpi = dpi_for_page(reader.pages[page_number - 1], max_dim)
+        if jobs:
+            first, last, job_dpi = jobs[-1]
+            if page_number == last + 1 and dpi == job_dpi and last - first + 1 < PAGES_PER_JOB:
+                jobs[-1] = (first, page_number, dpi)
+                continue
+        jobs.append((page_number, page_number, dpi))
+    return jobs
+
+
+def render_job(pdf_path, output_dir, job, max_dim, fmt):
+    first, last, dpi = job
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=first, last_page=last)
+    saved = []
+    for page_number, image in zip(range(first, last + 1), images):
+        # Rounding can leave a page a pixel over `max_dim`
+        if image.width > max_dim or image.height > max_dim:
+            image.thumbnail((max_dim, max_dim))
+        if FORMATS[fmt] == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        image_path = os.path.join(output_dir, f"page_{page_number}.{fmt}")
+        image.save(image_path, FORMATS[fmt])
+        saved.append((page_number, image_path, image.size))
+        image.close()
+    return saved
+
+
+def convert(pdf_path, output_dir, max_dim=1000, pages=None, fmt="png", workers=None):
+    reader = PdfReader(pdf_path)
+    page_count = len(reader.pages)
+    selected = parse_page_selection(pages, page_count) if pages else list(range(1, page_count + 1))
+    jobs = plan_jobs(reader, selected, max_dim)
+    os.makedirs(output_dir, exist_ok=True)
+
+    converted = 0
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = [pool.submit(render_job, pdf_path, output_dir, job, max_dim, fmt) for job in jobs]
+        for future in futures:
+            for page_number, image_path, size in future.result():
+                print(f"Saved page {page_number} as {image_path} (size: {size})")
+                converted += 1
+
+    print(f"Converted {converted} pages to {fmt.upper()} images")
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: convert_pdf_to_images.py [input pdf] [output directory]")
+    parser = argparse.ArgumentParser(description="Convert PDF pages to images")
+    parser.add_argument("pdf_path", help="Input PDF")
+    parser.add_argument("output_dir", help="Directory for page images")
+    parser.add_argument("--pages", help="Pages to convert, e.g. 1-3,7,10- (default: all)")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="png", help="Output image format (default: png)")
+    parser.add_argument("--max-dim", type=int, default=1000, help="Maximum width/height in pixels (default: 1000)")
+    parser.add_argument("--workers", type=int, help="Parallel render processes (default: CPU count)")
+    args = parser.parse_args()
+    try:
+        convert(args.pdf_path, args.output_dir, args.max_dim, args.pages, args.format, args.workers)
+    except ValueError as e:
+        print(f"Error: {e}")
         sys.exit(1)
-    pdf_path = sys.argv[1]
-    output_directory = sys.argv[2]
-    convert(pdf_path, output_directory)
@@ -1,5 +1,8 @@
 import json
+import os
+import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image, ImageDraw
 
@@ -8,31 +11,110 @@ from PIL import Image, ImageDraw
 # Claude creates when determining where to add text annotations in PDFs. See forms.md.
 
 
+PAGE_IMAGE_PATTERN = re.compile(r"page_(\d+)\.(png|jpe?g|webp)$", re.IGNORECASE)
+CONTACT_SHEET_COLUMNS = 4
+CONTACT_SHEET_TILE_WIDTH = 400
+
+
+# Returns {page_number: [(entry_box, label_box), ...]} from one pass over the fields.
+def group_boxes_by_page(fields_data):
+    boxes_by_page = {}
+    for field in fields_data["form_fields"]:
+        boxes_by_page.setdefault(field["page_number"], []).append(
+            (field['entry_bounding_box'], field['label_bounding_box'])
+        )
+    return boxes_by_page
+
+
+def draw_boxes(boxes, input_path, output_path):
+    with Image.open(input_path) as img:
+        img = img.convert("RGB")
+    draw = ImageDraw.Draw(img)
+    for entry_box, label_box in boxes:
+        # Draw red rectangle over entry bounding box and blue rectangle over the label.
+        draw.rectangle(entry_box, outline='red', width=2)
+        draw.rectangle(label_box, outline='blue', width=2)
+    img.save(output_path)
+    return img
+
+
 def create_validation_image(page_number, fields_json_path, input_path, output_path):
     # Input file should be in the `fields.json` format described in forms.md.
     with open(fields_json_path, 'r') as f:
         data = json.load(f)
 
-        img = Image.open(input_path)
-        draw = ImageDraw.Draw(img)
-        num_boxes = 0
-        
-        for field in data["form_fields"]:
-            if field["page_number"] == page_number:
-                entry_box = field['entry_bounding_box']
-                label_box = field['label_bounding_box']
-                # Draw red rectangle over entry bounding box and blue rectangle over the label.
-                draw.rectangle(entry_box, outline='red', width=2)
-                draw.rectangle(label_box, outline='blue', width=2)
-                num_boxes += 2
-        
-        img.save(output_path)
-        print(f"Created validation image at {output_path} with {num_boxes} bounding boxes")
+    boxes = group_boxes_by_page(data).get(page_number, [])
+    draw_boxes(boxes, input_path, output_path)
+    print(f"Created validation image at {output_path} with {len(boxes) * 2} bounding boxes")
+
+
+# Draws every page image in `image_dir` (named page_N.png, as created by
+# convert_pdf_to_images.py) concurrently. PIL releases the GIL while decoding and
+# encoding, so threads overlap the expensive work.
+def create_validation_images(fields_json_path, image_dir, output_dir, contact_sheet_path=None):
+    # Output images keep the page image names, so they would replace the originals.
+    if os.path.realpath(output_dir) == os.path.realpath(image_dir):
+        print(f"ERROR: Output dir must differ from the page image dir ({image_dir})")
+        sys.exit(1)
+
+    with open(fields_json_path, 'r') as f:
+        boxes_by_page = group_boxes_by_page(json.load(f))
+
+    pages = []
+    for name in os.listdir(image_dir):
+        match = PAGE_IMAGE_PATTERN.match(name)
+        if match:
+            pages.append((int(match.group(1)), name))
+    pages.sort()
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    def validate_page(page):
+        page_number, name = page
+        boxes = boxes_by_page.get(page_number, [])
+        output_path = os.path.join(output_dir, name)
+        img = draw_boxes(boxes, os.path.join(image_dir, name), output_path)
+        print(f"Created validation image at {output_path} with {len(boxes) * 2} bounding boxes")
+        if not contact_sheet_path:
+            return None
+        img.thumbnail((CONTACT_SHEET_TILE_WIDTH, CONTACT_SHEET_TILE_WIDTH * 4))
+        return img
+
+    with ThreadPoolExecutor() as pool:
+        tiles = list(pool.map(validate_page, pages))
+
+    missing = sorted(set(boxes_by_page) - {page_number for page_number, _ in pages})
+    if missing:
+        print(f"WARNING: No page image found for pages with fields: {missing}")
+
+    if contact_sheet_path and tiles:
+        create_contact_sheet(tiles, contact_sheet_path)
+        print(f"Created contact sheet at {contact_sheet_path} with {len(tiles)} pages")
+
+
+def create_contact_sheet(tiles, output_path, padding=10):
+    cols = min(CONTACT_SHEET_COLUMNS, len(tiles))
+    rows = (len(tiles) + cols - 1) // cols
+    tile_height = max(tile.height for tile in tiles)
+    sheet = Image.new(
+        "RGB",
+        (cols * CONTACT_SHEET_TILE_WIDTH + (cols + 1) * padding, rows * tile_height + (rows + 1) * padding),
+        "white",
+    )
+    for i, tile in enumerate(tiles):
+        row, col = divmod(i, cols)
+        sheet.paste(tile, (padding + col * (CONTACT_SHEET_TILE_WIDTH + padding), padding + row * (tile_height + padding)))
+    sheet.save(output_path)
 
 
 if __name__ == "__main__":
+    if len(sys.argv) in (5, 6) and sys.argv[1] == "--all":
+        contact_sheet = sys.argv[5] if len(sys.argv) == 6 else None
+        create_validation_images(sys.argv[2], sys.argv[3], sys.argv[4], contact_sheet)
+        sys.exit(0)
     if len(sys.argv) != 5:
         print("Usage: create_validation_image.py [page number] [fields.json file] [input image path] [output image path]")
+        print("       create_validation_image.py --all [fields.json file] [page image dir] [output dir] [contact sheet path (optional)]")
         sys.exit(1)
     page_number = int(sys.argv[1])
     fields_json_path = sys.argv[2]
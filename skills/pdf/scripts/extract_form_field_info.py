@@ -9,14 +9,50 @@ from pypdf import PdfReader
 
 
 # This matches the format used by PdfReader `get_fields` and `update_page_form_field_values` methods.
-def get_full_annotation_field_id(annotation):
-    components = []
-    while annotation:
+# `cache` maps already-resolved field objects to their full names, so fields sharing
+# ancestors (e.g. thousands of widgets under a few parents) only resolve each parent once.
+def get_full_annotation_field_id(annotation, cache=None):
+    if cache is None:
+        cache = {}
+    key = _object_key(annotation)
+    if key not in cache:
+        parent = annotation.get('/Parent')
+        parent_id = get_full_annotation_field_id(parent, cache) if parent else None
         field_name = annotation.get('/T')
-        if field_name:
-            components.append(field_name)
-        annotation = annotation.get('/Parent')
-    return ".".join(reversed(components)) if components else None
+        if field_name and parent_id:
+            cache[key] = f"{parent_id}.{field_name}"
+        else:
+            cache[key] = field_name or parent_id
+    return cache[key]
+
+
+def _object_key(obj):
+    ref = getattr(obj, "indirect_reference", None)
+    return (ref.idnum, ref.generation) if ref is not None else id(obj)
+
+
+# Builds an index of every widget annotation in one pass over the pages:
+# {full field name: [{"page": 1, "rect": [...], "states": ["/On", "/Off"]}, ...]}
+# Radio groups have one widget per option under the same name.
+def build_widget_index(reader: PdfReader):
+    widget_index = {}
+    name_cache = {}
+    for page_index, page in enumerate(reader.pages):
+        for ann in page.get('/Annots', []):
+            ann = ann.get_object()
+            field_id = get_full_annotation_field_id(ann, name_cache)
+            if field_id is None:
+                continue
+            try:
+                states = list(ann["/AP"]["/N"].keys())
+            except (KeyError, AttributeError, TypeError):
+                states = []
+            widget_index.setdefault(field_id, []).append({
+                "page": page_index + 1,
+                "rect": ann.get('/Rect'),
+                "states": states,
+            })
+    return widget_index
 
 
 def make_field_dict(field, field_id):
@@ -59,8 +95,8 @@ def make_field_dict(field, field_id):
 #     // Per-type additional fields described in forms.md
 #   },
 # ]
-def get_field_info(reader: PdfReader):
-    fields = reader.get_fields()
+def get_field_info(reader: PdfReader, widget_index=None):
+    fields = reader.get_fields() or {}
 
     field_info_by_id = {}
     possible_radio_names = set()
@@ -81,27 +117,25 @@ def get_field_info(reader: PdfReader):
     # See https://westhealth.github.io/exploring-fillable-forms-with-pdfrw.html
     radio_fields_by_id = {}
 
-    for page_index, page in enumerate(reader.pages):
-        annotations = page.get('/Annots', [])
-        for ann in annotations:
-            field_id = get_full_annotation_field_id(ann)
-            if field_id in field_info_by_id:
-                field_info_by_id[field_id]["page"] = page_index + 1
-                field_info_by_id[field_id]["rect"] = ann.get('/Rect')
-            elif field_id in possible_radio_names:
-                try:
-                    # ann['/AP']['/N'] should have two items. One of them is '/Off',
-                    # the other is the active value.
-                    on_values = [v for v in ann["/AP"]["/N"] if v != "/Off"]
-                except KeyError:
-                    continue
+    if widget_index is None:
+        widget_index = build_widget_index(reader)
+
+    for field_id, widgets in widget_index.items():
+        if field_id in field_info_by_id:
+            # Like a page-order scan, the last widget wins for fields shown more than once.
+            field_info_by_id[field_id]["page"] = widgets[-1]["page"]
+            field_info_by_id[field_id]["rect"] = widgets[-1]["rect"]
+        elif field_id in possible_radio_names:
+            for widget in widgets:
+                # The widget's normal appearances should have two items. One of them
+                # is '/Off', the other is the active value.
+                on_values = [v for v in widget["states"] if v != "/Off"]
                 if len(on_values) == 1:
-                    rect = ann.get("/Rect")
                     if field_id not in radio_fields_by_id:
                         radio_fields_by_id[field_id] = {
                             "field_id": field_id,
                             "type": "radio_group",
-                            "page": page_index + 1,
+                            "page": widget["page"],
                             "radio_options": [],
                         }
                     # Note: at least on macOS 15.7, Preview.app doesn't show selected
@@ -110,7 +144,7 @@ def get_field_info(reader: PdfReader):
                     # Chrome/Firefox/Acrobat/etc).
                     radio_fields_by_id[field_id]["radio_options"].append({
                         "value": on_values[0],
-                        "rect": rect,
+                        "rect": widget["rect"],
                     })
 
     # Some PDFs have form field definitions without corresponding annotations,
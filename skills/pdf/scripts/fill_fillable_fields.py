@@ -9,7 +9,9 @@ from extract_form_field_info import get_field_info
 # Fills fillable form fields in a PDF. See forms.md.
 
 
-def fill_pdf_fields(input_pdf_path: str, fields_json_path: str, output_pdf_path: str):
+# `field_info` can be the output of `get_field_info` for the same PDF (e.g. computed once
+# and reused across fills); otherwise it is extracted from the input PDF.
+def fill_pdf_fields(input_pdf_path: str, fields_json_path: str, output_pdf_path: str, field_info=None):
     with open(fields_json_path) as f:
         fields = json.load(f)
     # Group by page number.
@@ -25,7 +27,8 @@ def fill_pdf_fields(input_pdf_path: str, fields_json_path: str, output_pdf_path:
     reader = PdfReader(input_pdf_path)
 
     has_error = False
-    field_info = get_field_info(reader)
+    if field_info is None:
+        field_info = get_field_info(reader)
     fields_by_ids = {f["field_id"]: f for f in field_info}
     for field in fields:
         existing_field = fields_by_ids.get(field["field_id"])
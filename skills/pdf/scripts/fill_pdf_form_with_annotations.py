@@ -1,5 +1,6 @@
 import json
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 from pypdf import PdfReader, PdfWriter
 from pypdf.annotations import FreeText
@@ -8,21 +9,17 @@ from pypdf.annotations import FreeText
 # Fills a PDF by adding text annotations defined in `fields.json`. See forms.md.
 
 
-def transform_coordinates(bbox, image_width, image_height, pdf_width, pdf_height):
-    """Transform bounding box from image coordinates to PDF coordinates"""
+def transform_page_boxes(bboxes, image_width, image_height, pdf_width, pdf_height):
+    """Transform a page's bounding boxes from image coordinates to PDF coordinates"""
     # Image coordinates: origin at top-left, y increases downward
     # PDF coordinates: origin at bottom-left, y increases upward
+    # Each box becomes (left, bottom, right, top) with the Y axis flipped
     x_scale = pdf_width / image_width
     y_scale = pdf_height / image_height
-    
-    left = bbox[0] * x_scale
-    right = bbox[2] * x_scale
-    
-    # Flip Y coordinates for PDF
-    top = pdf_height - (bbox[1] * y_scale)
-    bottom = pdf_height - (bbox[3] * y_scale)
-    
-    return left, bottom, right, top
+    return [
+        (b[0] * x_scale, pdf_height - b[3] * y_scale, b[2] * x_scale, pdf_height - b[1] * y_scale)
+        for b in bboxes
+    ]
 
 
 def fill_pdf_form(input_pdf_path, fields_json_path, output_pdf_path):
@@ -39,67 +36,90 @@ def fill_pdf_form(input_pdf_path, fields_json_path, output_pdf_path):
     # Copy all pages to writer
     writer.append(reader)
     
-    # Get PDF dimensions for each page
-    pdf_dimensions = {}
-    for i, page in enumerate(reader.pages):
-        mediabox = page.mediabox
-        pdf_dimensions[i + 1] = [mediabox.width, mediabox.height]
+    # Index image dimensions by page number once
+    image_dimensions = {
+        p["page_number"]: (p["image_width"], p["image_height"])
+        for p in fields_data["pages"]
+    }
     
-    # Process each form field
-    annotations = []
+    # Group non-empty fields by page
+    fields_by_page = {}
     for field in fields_data["form_fields"]:
-        page_num = field["page_number"]
-        
-        # Get page dimensions and transform coordinates.
-        page_info = next(p for p in fields_data["pages"] if p["page_number"] == page_num)
-        image_width = page_info["image_width"]
-        image_height = page_info["image_height"]
-        pdf_width, pdf_height = pdf_dimensions[page_num]
+        # Skip empty fields
+        if "entry_text" not in field or not field["entry_text"].get("text"):
+            continue
+        fields_by_page.setdefault(field["page_number"], []).append(field)
+    
+    # Process each page's fields as one batch
+    num_annotations = 0
+    for page_num, page_fields in sorted(fields_by_page.items()):
+        # page_number is 1-based in fields.json, 0-based for pypdf
+        page = writer.pages[page_num - 1]
+        mediabox = page.mediabox
+        image_width, image_height = image_dimensions[page_num]
         
-        transformed_entry_box = transform_coordinates(
-            field["entry_bounding_box"],
+        rects = transform_page_boxes(
+            [field["entry_bounding_box"] for field in page_fields],
             image_width, image_height,
-            pdf_width, pdf_height
+            mediabox.width, mediabox.height
         )
         
-        # Skip empty fields
-        if "entry_text" not in field or "text" not in field["entry_text"]:
-            continue
-        entry_text = field["entry_text"]
-        text = entry_text["text"]
-        if not text:
-            continue
-        
-        font_name = entry_text.get("font", "Arial")
-        font_size = str(entry_text.get("font_size", 14)) + "pt"
-        font_color = entry_text.get("font_color", "000000")
+        for field, rect in zip(page_fields, rects):
+            entry_text = field["entry_text"]
+            font_name = entry_text.get("font", "Arial")
+            font_size = str(entry_text.get("font_size", 14)) + "pt"
+            font_color = entry_text.get("font_color", "000000")
 
-        # Font size/color seems to not work reliably across viewers:
-        # https://github.com/py-pdf/pypdf/issues/2084
-        annotation = FreeText(
-            text=text,
-            rect=transformed_entry_box,
-            font=font_name,
-            font_size=font_size,
-            font_color=font_color,
-            border_color=None,
-            background_color=None,
-        )
-        annotations.append(annotation)
-        # page_number is 0-based for pypdf
-        writer.add_annotation(page_number=page_num - 1, annotation=annotation)
+            # Font size/color seems to not work reliably across viewers:
+            # https://github.com/py-pdf/pypdf/issues/2084
+            annotation = FreeText(
+                text=entry_text["text"],
+                rect=rect,
+                font=font_name,
+                font_size=font_size,
+                font_color=font_color,
+                border_color=None,
+                background_color=None,
+            )
+            # Passing the page object avoids a page lookup per annotation
+            writer.add_annotation(page_number=page, annotation=annotation)
+        num_annotations += len(page_fields)
         
     # Save the filled PDF
     with open(output_pdf_path, "wb") as output:
         writer.write(output)
     
     print(f"Successfully filled PDF form and saved to {output_pdf_path}")
-    print(f"Added {len(annotations)} text annotations")
+    print(f"Added {num_annotations} text annotations")
+
+
+def fill_pdf_forms(jobs, workers=None):
+    """Fill several documents in parallel; each job is (input_pdf, fields_json, output_pdf)
+
+    Returns the number of jobs that failed.
+    """
+    failures = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fill_pdf_form, *job) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"ERROR: Failed to fill {job[0]}: {e}")
+                failures += 1
+    return failures
 
 
 if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--batch":
+        # jobs.json: [{"input": ..., "fields": ..., "output": ...}, ...]
+        with open(sys.argv[2], "r") as f:
+            jobs = [(job["input"], job["fields"], job["output"]) for job in json.load(f)]
+        failures = fill_pdf_forms(jobs)
+        sys.exit(1 if failures else 0)
     if len(sys.argv) != 4:
         print("Usage: fill_pdf_form_with_annotations.py [input pdf] [fields.json] [output pdf]")
+        print("       fill_pdf_form_with_annotations.py --batch [jobs.json]")
         sys.exit(1)
     input_pdf = sys.argv[1]
     fields_json = sys.argv[2]
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Assemble PowerPoint decks from slides taken from several template files.
+
+Usage:
+    python assemble.py output.pptx brand.pptx:0,3 library.pptx:12,40 brand.pptx:7
+    python assemble.py --jobs jobs.json
+
+The first form builds one deck. Each argument after the output path is a
+template file followed by comma-separated 0-based slide indices; slides appear
+in the order given. The masters, layouts and theme come from the first template
+unless --base is given.
+
+The second form builds many decks in one process. Templates are loaded once
+and reused across all jobs. jobs.json contains a list of jobs (or an object
+with a "jobs" list):
+
+    [
+      {
+        "output": "out/q3-review.pptx",
+        "base": "brand.pptx",
+        "slides": [
+          {"template": "brand.pptx", "index": 0},
+          {"template": "library.pptx", "index": 12}
+        ]
+      }
+    ]
+
+Copied slides are attached to the base layout with identical content (by
+hash), falling back to a layout with the same name and then to the first
+layout. Images, media and other leaf parts are deduplicated by content hash,
+so an image used by many slides is stored once in the output. Notes slides are
+not copied.
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+from copy import deepcopy
+from io import BytesIO
+from pathlib import Path
+
+from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.package import PartFactory, XmlPart
+from pptx.opc.packuri import PackURI
+
+R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+# Relationships to deck structure that are never copied with a slide. References
+# to them (e.g. jump-to-slide hyperlinks) are removed from the copied XML.
+STRUCTURAL_RELTYPES = {RT.SLIDE, RT.SLIDE_LAYOUT, RT.SLIDE_MASTER, RT.NOTES_SLIDE}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Assemble decks from slides of several PowerPoint templates.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python assemble.py output.pptx brand.pptx:0,3 library.pptx:12,40
+    Creates output.pptx with slides 0 and 3 of brand.pptx, then 12 and 40 of library.pptx
+
+  python assemble.py --jobs jobs.json
+    Builds every deck listed in jobs.json, loading each template only once
+
+Note: Slide indices are 0-based (first slide is 0, second is 1, etc.)
+        """,
+    )
+    parser.add_argument("output", nargs="?", help="Path for output PPTX file")
+    parser.add_argument(
+        "slides", nargs="*", help="Slide specs as template.pptx:i,j,k (0-based)"
+    )
+    parser.add_argument("--base", help="Template providing masters and layouts")
+    parser.add_argument("--jobs", help="JSON file describing many output decks")
+
+    args = parser.parse_args()
+
+    try:
+        if args.jobs:
+            with open(args.jobs, "r", encoding="utf-8") as f:
+                jobs = json.load(f)
+            if isinstance(jobs, dict):
+                jobs = jobs.get("jobs", [])
+        elif args.output and args.slides:
+            jobs = [
+                {
+                    "output": args.output,
+                    "base": args.base,
+                    "slides": parse_slide_specs(args.slides),
+                }
+            ]
+        else:
+            parser.error("Provide an output path and slide specs, or --jobs")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    library = TemplateLibrary()
+    failed = 0
+    for job in jobs:
+        try:
+            slides = [(s["template"], s["index"]) for s in job["slides"]]
+            assemble_presentation(job["output"], slides, job.get("base"), library)
+        except (KeyError, ValueError, OSError) as e:
+            print(f"Error assembling {job.get('output', '<missing output>')}: {e}")
+            failed += 1
+
+    if len(jobs) > 1:
+        print(f"\nAssembled {len(jobs) - failed}/{len(jobs)} decks")
+    if failed:
+        sys.exit(1)
+
+
+def parse_slide_specs(specs):
+    """Parse 'template.pptx:0,3' specs into a list of slide dicts."""
+    slides = []
+    for spec in specs:
+        template, sep, indices = spec.rpartition(":")
+        if not sep or not template:
+            raise ValueError(f"Invalid slide spec '{spec}' (expected file.pptx:0,1)")
+        try:
+            slides.extend(
+                {"template": template, "index": int(x.strip())}
+                for x in indices.split(",")
+            )
+        except ValueError:
+            raise ValueError(f"Invalid slide indices in '{spec}'")
+    return slides
+
+
+class TemplateLibrary:
+    """Loads each template once and serves it to every assembly job."""
+
+    def __init__(self):
+        self._presentations = {}
+        self._blobs = {}
+
+    def presentation(self, path):
+        """Return the loaded template; treat it as read-only."""
+        key = Path(path).resolve()
+        if key not in self._presentations:
+            self._presentations[key] = Presentation(BytesIO(self.blob(path)))
+        return self._presentations[key]
+
+    def blob(self, path):
+        """Return the raw bytes of the template file."""
+        key = Path(path).resolve()
+        if key not in self._blobs:
+            self._blobs[key] = key.read_bytes()
+        return self._blobs[key]
+
+
+class DeckAssembler:
+    """Copies slides from source templates into one destination presentation."""
+
+    def __init__(self, prs):
+        self.prs = prs
+        self.package = prs.part.package
+        self._parts_by_hash = {}
+        self._partnames = set()
+        self._layouts_by_hash = {}
+        self._layouts_by_name = {}
+        self._layout_cache = {}
+
+        for part in self.package.iter_parts():
+            self._partnames.add(part.partname)
+            if not part.rels:
+                self._parts_by_hash[_content_key(part)] = part
+        for layout in prs.slide_layouts:
+            self._layouts_by_hash.setdefault(_content_key(layout.part), layout)
+            self._layouts_by_name.setdefault(layout.name, layout)
+
+    def clear_slides(self):
+        """Remove every slide so the deck keeps only masters, layouts and theme."""
+        sld_id_lst = self.prs.slides._sldIdLst
+        for sld_id in list(sld_id_lst):
+            self.prs.part.drop_rel(sld_id.rId)
+            sld_id_lst.remove(sld_id)
+
+    def copy_slide(self, source_slide):
+        """Append a copy of source_slide (from any presentation) to the deck."""
+        layout = self._match_layout(source_slide.slide_layout)
+        new_slide = self.prs.slides.add_slide(layout)
+        new_el = new_slide.part._element
+        source_el = source_slide.part._element
+
+        # Replace the generated content with the source slide's content
+        for child in list(new_el):
+            new_el.remove(child)
+        for child in source_el:
+            new_el.append(deepcopy(child))
+        for name, value in source_el.attrib.items():
+            new_el.set(name, value)
+
+        # Recreate relationships in the destination and remap rIds
+        _remap_rIds(new_el, self._import_rels(source_slide.part, new_slide.part))
+
+        return new_slide
+
+    def _match_layout(self, source_layout):
+        """Find the destination layout for a source layout, by hash then by name."""
+        key = id(source_layout.part)
+        if key not in self._layout_cache:
+            layout = self._layouts_by_hash.get(_content_key(source_layout.part))
+            if layout is None:
+                layout = self._layouts_by_name.get(source_layout.name)
+            if layout is None:
+                print(
+                    f"  Warning: no layout matching '{source_layout.name}', "
+                    "using the first layout"
+                )
+                layout = self.prs.slide_layouts[0]
+            self._layout_cache[key] = layout
+        return self._layout_cache[key]
+
+    def _import_part(self, source_part):
+        """Return a destination part equivalent to source_part.
+
+        Leaf parts (images, media, embedded files) are shared when a part with
+        the same content already exists. Parts with their own relationships
+        (charts, diagrams) are cloned together with everything they reference.
+        """
+        if not source_part.rels:
+            key = _content_key(source_part)
+            if key not in self._parts_by_hash:
+                self._parts_by_hash[key] = self._clone_part(source_part)
+            return self._parts_by_hash[key]
+
+        part = self._clone_part(source_part)
+        rId_map = self._import_rels(source_part, part)
+        if isinstance(part, XmlPart):
+            _remap_rIds(part._element, rId_map)
+        return part
+
+    def _import_rels(self, source_part, part):
+        """Relate part to imported copies of source_part's targets.
+
+        Returns a mapping of source rId to new rId, or to None for structural
+        relationships that are not copied.
+        """
+        rId_map = {}
+        for rId, rel in source_part.rels.items():
+            if rel.reltype in STRUCTURAL_RELTYPES:
+                rId_map[rId] = None
+            elif rel.is_external:
+                rId_map[rId] = part.relate_to(
+                    rel.target_ref, rel.reltype, is_external=True
+                )
+            else:
+                target = self._import_part(rel.target_part)
+                rId_map[rId] = part.relate_to(target, rel.reltype)
+        return rId_map
+
+    def _clone_part(self, source_part):
+        partname = self._next_partname(source_part.partname)
+        return PartFactory(
+            partname, source_part.content_type, self.package, source_part.blob
+        )
+
+    def _next_partname(self, partname):
+        tmpl = re.sub(r"\d*(\.\w+)$", r"%d\1", str(partname))
+        n = 1
+        while PackURI(tmpl % n) in self._partnames:
+            n += 1
+        new_partname = PackURI(tmpl % n)
+        self._partnames.add(new_partname)
+        return new_partname
+
+
+def _content_key(part):
+    return part.content_type, hashlib.sha256(part.blob).hexdigest()
+
+
+def _remap_rIds(element, rId_map):
+    """Rewrite r:id/r:embed/r:link (etc.) attributes using rId_map.
+
+    Attributes whose rId maps to None are removed.
+    """
+    for el in element.iter():
+        for name, value in list(el.attrib.items()):
+            if not name.startswith(R_NS) or value not in rId_map:
+                continue
+            if rId_map[value] is None:
+                del el.attrib[name]
+            else:
+                el.set(name, rId_map[value])
+
+
+def assemble_presentation(output_path, slides, base_path=None, library=None):
+    """
+    Create a presentation from slides taken from one or more templates.
+
+    Args:
+        output_path: Path for output PPTX file
+        slides: List of (template_path, slide_index) pairs, 0-based, in order
+        base_path: Template providing masters, layouts and theme
+            (default: the template of the first slide)
+        library: TemplateLibrary to reuse loaded templates across calls
+    """
+    if not slides:
+        raise ValueError("No slides to assemble")
+    library = library or TemplateLibrary()
+    base_path = base_path or slides[0][0]
+
+    # Validate indices before building anything
+    for template_path, idx in slides:
+        total_slides = len(library.presentation(template_path).slides)
+        if idx < 0 or idx >= total_slides:
+            raise ValueError(
+                f"Slide index {idx} out of range for {template_path} "
+                f"(0-{total_slides - 1})"
+            )
+
+    prs = Presentation(BytesIO(library.blob(base_path)))
+    assembler = DeckAssembler(prs)
+    assembler.clear_slides()
+
+    print(f"Assembling {len(slides)} slides into {output_path}...")
+    for template_path, idx in slides:
+        assembler.copy_slide(library.presentation(template_path).slides[idx])
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    prs.save(output_path)
+    print(f"Saved {output_path} with {len(prs.slides)} slides")
+
+
+if __name__ == "__main__":
+    main()
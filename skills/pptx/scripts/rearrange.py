@@ -12,6 +12,7 @@ Slides can be repeated (e.g., 34 appears twice).
 import argparse
 import shutil
 import sys
+from collections import Counter
 from copy import deepcopy
 from pathlib import Path
 
@@ -127,29 +128,15 @@ def duplicate_slide(pres, index):
     return new_slide
 
 
-def delete_slide(pres, index):
-    """Delete a slide from the presentation."""
-    rId = pres.slides._sldIdLst[index].rId
-    pres.part.drop_rel(rId)
-    del pres.slides._sldIdLst[index]
-
-
-def reorder_slides(pres, slide_index, target_index):
-    """Move a slide from one position to another."""
-    slides = pres.slides._sldIdLst
-
-    # Remove slide element from current position
-    slide_element = slides[slide_index]
-    slides.remove(slide_element)
-
-    # Insert at target position
-    slides.insert(target_index, slide_element)
-
-
 def rearrange_presentation(template_path, output_path, slide_sequence):
     """
     Create a new presentation with slides from template in specified order.
 
+    The final slide list is planned up front: the first use of each template
+    slide keeps the original, later uses get duplicates, unused slides are
+    dropped, and sldIdLst is rebuilt once in the requested order. This keeps
+    the work linear in the number of slides.
+
     Args:
         template_path: Path to template PPTX file
         output_path: Path for output PPTX file
@@ -162,64 +149,49 @@ def rearrange_presentation(template_path, output_path, slide_sequence):
     else:
         prs = Presentation(template_path)
 
-    total_slides = len(prs.slides)
+    sld_id_lst = prs.slides._sldIdLst
+    original_ids = list(sld_id_lst)
+    total_slides = len(original_ids)
 
     # Validate indices
     for idx in slide_sequence:
         if idx < 0 or idx >= total_slides:
             raise ValueError(f"Slide index {idx} out of range (0-{total_slides - 1})")
 
-    # Track original slides and their duplicates
-    slide_map = []  # List of actual slide indices for final presentation
-    duplicated = {}  # Track duplicates: original_idx -> [duplicate_indices]
-
-    # Step 1: DUPLICATE repeated slides
+    # Step 1: PLAN the final sequence, duplicating repeated slides
     print(f"Processing {len(slide_sequence)} slides from template...")
+    repeats = Counter(slide_sequence)
+    used = set()
+    final_ids = []
     for i, template_idx in enumerate(slide_sequence):
-        if template_idx in duplicated and duplicated[template_idx]:
-            # Already duplicated this slide, use the duplicate
-            slide_map.append(duplicated[template_idx].pop(0))
-            print(f"  [{i}] Using duplicate of slide {template_idx}")
-        elif slide_sequence.count(template_idx) > 1 and template_idx not in duplicated:
-            # First occurrence of a repeated slide - create duplicates
-            slide_map.append(template_idx)
-            duplicates = []
-            count = slide_sequence.count(template_idx) - 1
-            print(
-                f"  [{i}] Using original slide {template_idx}, creating {count} duplicate(s)"
-            )
-            for _ in range(count):
-                duplicate_slide(prs, template_idx)
-                duplicates.append(len(prs.slides) - 1)
-            duplicated[template_idx] = duplicates
+        if template_idx not in used:
+            used.add(template_idx)
+            final_ids.append(original_ids[template_idx])
+            if repeats[template_idx] > 1:
+                print(
+                    f"  [{i}] Using original slide {template_idx}, "
+                    f"creating {repeats[template_idx] - 1} duplicate(s)"
+                )
+            else:
+                print(f"  [{i}] Using original slide {template_idx}")
         else:
-            # Unique slide or first occurrence already handled, use original
-            slide_map.append(template_idx)
-            print(f"  [{i}] Using original slide {template_idx}")
-
-    # Step 2: DELETE unwanted slides (work backwards)
-    slides_to_keep = set(slide_map)
-    print(f"\nDeleting {len(prs.slides) - len(slides_to_keep)} unused slides...")
-    for i in range(len(prs.slides) - 1, -1, -1):
-        if i not in slides_to_keep:
-            delete_slide(prs, i)
-            # Update slide_map indices after deletion
-            slide_map = [idx - 1 if idx > i else idx for idx in slide_map]
-
-    # Step 3: REORDER to final sequence
-    print(f"Reordering {len(slide_map)} slides to final sequence...")
-    for target_pos in range(len(slide_map)):
-        # Find which slide should be at target_pos
-        current_pos = slide_map[target_pos]
-        if current_pos != target_pos:
-            reorder_slides(prs, current_pos, target_pos)
-            # Update slide_map: the move shifts other slides
-            for i in range(len(slide_map)):
-                if slide_map[i] > current_pos and slide_map[i] <= target_pos:
-                    slide_map[i] -= 1
-                elif slide_map[i] < current_pos and slide_map[i] >= target_pos:
-                    slide_map[i] += 1
-            slide_map[target_pos] = target_pos
+            # duplicate_slide appends a new sldId to the end of the list
+            duplicate_slide(prs, template_idx)
+            final_ids.append(sld_id_lst[-1])
+            print(f"  [{i}] Using duplicate of slide {template_idx}")
+
+    # Step 2: DROP relationships of unused slides
+    unused = [sld_id for idx, sld_id in enumerate(original_ids) if idx not in used]
+    print(f"\nDeleting {len(unused)} unused slides...")
+    for sld_id in unused:
+        prs.part.drop_rel(sld_id.rId)
+
+    # Step 3: REBUILD sldIdLst once in the final order
+    print(f"Reordering {len(final_ids)} slides to final sequence...")
+    for sld_id in list(sld_id_lst):
+        sld_id_lst.remove(sld_id)
+    for sld_id in final_ids:
+        sld_id_lst.append(sld_id)
 
     # Save the presentation
     prs.save(output_path)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Tests for assemble.py"""
+
+import sys
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from PIL import Image
+from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.util import Inches
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from assemble import R_NS, TemplateLibrary, assemble_presentation
+
+TITLE_ONLY = 5  # Index of "Title Only" in python-pptx's default template
+
+
+def png_bytes(color="red"):
+    buffer = BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def add_slide(prs, layout_index, title, image=None):
+    slide = prs.slides.add_slide(prs.slide_layouts[layout_index])
+    slide.shapes.title.text = title
+    if image:
+        slide.shapes.add_picture(BytesIO(image), Inches(1), Inches(2))
+    return slide
+
+
+@pytest.fixture
+def templates(tmp_path):
+    """Two templates that share an image and differ in one layout."""
+    logo = png_bytes()
+
+    brand = Presentation()
+    first = add_slide(brand, 0, "Brand cover", logo)
+    jump = add_slide(brand, TITLE_ONLY, "Agenda")
+    link = jump.shapes.add_textbox(Inches(1), Inches(3), Inches(2), Inches(1))
+    link.click_action.target_slide = first  # Structural link to another slide
+    link.text_frame.text = "Back to cover"
+    link.text_frame.paragraphs[0].runs[0].hyperlink.address = "https://example.com"
+    brand_path = tmp_path / "brand.pptx"
+    brand.save(brand_path)
+
+    library = Presentation()
+    # Same name as the brand layout but different content: matched by name
+    library.slide_layouts[TITLE_ONLY]._element.set("preserve", "1")
+    # A layout the brand template does not have at all: first layout is used
+    library.slide_layouts[6].name = "Library Only"
+    library.slide_layouts[6]._element.set("preserve", "1")
+    add_slide(library, 0, "Library cover", logo)
+    add_slide(library, TITLE_ONLY, "Library content", png_bytes("blue"))
+    blank = library.slides.add_slide(library.slide_layouts[6])
+    blank.shapes.add_picture(BytesIO(logo), Inches(1), Inches(1))
+    library_path = tmp_path / "library.pptx"
+    library.save(library_path)
+
+    return brand_path, library_path
+
+
+def assemble(tmp_path, templates, slides):
+    brand_path, library_path = templates
+    paths = {"brand": brand_path, "library": library_path}
+    output = tmp_path / "out" / "deck.pptx"
+    assemble_presentation(output, [(paths[name], index) for name, index in slides])
+    return Presentation(output)
+
+
+class TestAssemble:
+    """Test decks assembled from several templates."""
+
+    def test_relationships_resolve(self, tmp_path, templates):
+        """Test every relationship of every copied slide points at a saved part."""
+        prs = assemble(tmp_path, templates, [
+            ("brand", 0), ("library", 1), ("brand", 1), ("library", 0), ("library", 2),
+        ])
+
+        assert [s.shapes.title.text if s.shapes.title else None for s in prs.slides] == [
+            "Brand cover", "Library content", "Agenda", "Library cover", None,
+        ]
+        partnames = {part.partname for part in prs.part.package.iter_parts()}
+        for slide in prs.slides:
+            rIds = set(slide.part.rels)
+            for rel in slide.part.rels.values():
+                if not rel.is_external:
+                    assert rel.target_part.partname in partnames
+            # No r:id/r:embed attribute refers to a relationship that was dropped
+            for el in slide.part._element.iter():
+                for name, value in el.attrib.items():
+                    if name.startswith(R_NS):
+                        assert value in rIds
+
+    def test_media_is_stored_once(self, tmp_path, templates):
+        """Test an image used by slides of both templates is deduplicated."""
+        prs = assemble(tmp_path, templates, [("brand", 0), ("library", 0), ("library", 2)])
+
+        images = [p for p in prs.part.package.iter_parts() if p.content_type == "image/png"]
+        assert len(images) == 1
+        targets = {
+            rel.target_part.partname
+            for slide in prs.slides for rel in slide.part.rels.values()
+            if rel.reltype == RT.IMAGE
+        }
+        assert targets == {images[0].partname}
+
+    def test_structural_links_are_dropped(self, tmp_path, templates):
+        """Test jump-to-slide links are removed but external hyperlinks are kept."""
+        prs = assemble(tmp_path, templates, [("brand", 1)])
+
+        reltypes = {rel.reltype for rel in prs.slides[0].part.rels.values()}
+        assert RT.SLIDE not in reltypes
+        assert RT.HYPERLINK in reltypes
+
+    def test_layout_matching(self, tmp_path, templates, capsys):
+        """Test layouts match by content, then by name, then fall back to the first."""
+        prs = assemble(tmp_path, templates, [
+            ("brand", 0), ("library", 0), ("library", 1), ("library", 2),
+        ])
+
+        layouts = [slide.slide_layout.name for slide in prs.slides]
+        assert layouts == ["Title Slide", "Title Slide", "Title Only", prs.slide_layouts[0].name]
+        assert "no layout matching 'Library Only'" in capsys.readouterr().out
+        # The first slide's template is the base; only its layouts are in the deck
+        assert len(prs.slide_layouts) == len(Presentation(templates[0]).slide_layouts)
+
+    def test_library_loads_each_template_once(self, tmp_path, templates):
+        """Test templates are reused across assembly jobs."""
+        brand_path, _ = templates
+        library = TemplateLibrary()
+
+        assemble_presentation(tmp_path / "a.pptx", [(brand_path, 0)], library=library)
+        assemble_presentation(tmp_path / "b.pptx", [(brand_path, 1)], library=library)
+
+        assert library.presentation(brand_path) is library.presentation(str(brand_path))
+        assert len(Presentation(tmp_path / "b.pptx").slides) == 1
+
+    def test_index_out_of_range(self, tmp_path, templates):
+        """Test an invalid index is rejected before anything is written."""
+        with pytest.raises(ValueError, match="out of range"):
+            assemble(tmp_path, templates, [("brand", 5)])
+        assert not (tmp_path / "out").exists()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
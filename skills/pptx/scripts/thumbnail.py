@@ -18,8 +18,18 @@ Grid limits by column count:
 - 5 cols: max 30 slides per grid (5×6) [default]
 - 6 cols: max 42 slides per grid (6×7)
 
+Slides are rasterized directly at thumbnail width by a pool of pdftoppm
+processes, each handling a range of pages, and grids are assembled as soon as
+their pages are ready.
+
+Rendered slides are cached by a hash of the slide XML and everything it depends
+on (layout, master, theme, media), so repeated runs only re-render slides whose
+inputs changed. The cache lives in ~/.cache/pptx-thumbnails unless --cache-dir
+or --no-cache is given.
+
 Usage:
-    python thumbnail.py input.pptx [output_prefix] [--cols N] [--outline-placeholders]
+    python thumbnail.py input.pptx [output_prefix] [--cols N] [--outline-placeholders] [--workers N]
+                        [--cache-dir DIR | --no-cache]
 
 Examples:
     python thumbnail.py presentation.pptx
@@ -41,18 +51,32 @@ Examples:
 """
 
 import argparse
+import hashlib
+import math
+import os
+import shutil
 import subprocess
 import sys
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ooxml" / "scripts"))
+
 from inventory import extract_text_inventory
 from PIL import Image, ImageDraw, ImageFont
 from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from soffice import get_service
 
 # Constants
 THUMBNAIL_WIDTH = 300  # Fixed thumbnail width in pixels
-CONVERSION_DPI = 100  # DPI for PDF to image conversion
+MAX_PAGES_PER_JOB = 10  # Upper bound on pages rasterized by one pdftoppm process
+CACHE_VERSION = 1  # Bump to invalidate cached tiles when rendering changes
+DEFAULT_CACHE_DIR = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "pptx-thumbnails"
+)
 MAX_COLS = 6  # Maximum number of columns
 DEFAULT_COLS = 5  # Default number of columns
 JPEG_QUALITY = 95  # JPEG compression quality
@@ -86,6 +110,24 @@ def main():
         action="store_true",
         help="Outline text placeholders with a colored border",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of parallel pdftoppm processes (default: CPU count)",
+    )
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Directory for cached slide tiles (default: {DEFAULT_CACHE_DIR})",
+    )
+    cache_group.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Render every slide without reading or writing the tile cache",
+    )
 
     args = parser.parse_args()
 
@@ -118,13 +160,19 @@ def main():
                 if placeholder_regions:
                     print(f"Found placeholders on {len(placeholder_regions)} slides")
 
-            # Convert slides to images
-            slide_images = convert_to_images(input_path, Path(temp_dir), CONVERSION_DPI)
-            if not slide_images:
+            # Convert slides to images (rendered lazily as grids consume them)
+            total_slides, slide_images = convert_to_images(
+                input_path,
+                Path(temp_dir),
+                THUMBNAIL_WIDTH,
+                max(1, args.workers),
+                cache_dir=None if args.no_cache else args.cache_dir,
+            )
+            if not total_slides:
                 print("Error: No slides found")
                 sys.exit(1)
 
-            print(f"Found {len(slide_images)} slides")
+            print(f"Found {total_slides} slides")
 
             # Create grids (max cols×(cols+1) images per grid)
             grid_files = create_grids(
@@ -134,6 +182,7 @@ def main():
                 output_path,
                 placeholder_regions,
                 slide_dimensions,
+                total=total_slides,
             )
 
             # Print saved files
@@ -194,8 +243,16 @@ def get_placeholder_regions(pptx_path):
     return placeholder_regions, (slide_width_inches, slide_height_inches)
 
 
-def convert_to_images(pptx_path, temp_dir, dpi):
-    """Convert PowerPoint to images via PDF, handling hidden slides."""
+def convert_to_images(pptx_path, temp_dir, width, workers=1, cache_dir=None):
+    """Convert PowerPoint to thumbnail images via PDF, handling hidden slides.
+
+    Returns a tuple of (total_slides, images). images is an iterator yielding
+    one image path per slide in slide order; pages are rasterized in parallel
+    and yielded as soon as the range containing them has been rendered.
+
+    With a cache_dir, slides whose cache key already has a tile are taken from
+    the cache and only the remaining slides are exported and rasterized.
+    """
     # Detect hidden slides
     print("Analyzing presentation...")
     prs = Presentation(str(pptx_path))
@@ -212,63 +269,186 @@ def convert_to_images(pptx_path, temp_dir, dpi):
     if hidden_slides:
         print(f"Hidden slides: {sorted(hidden_slides)}")
 
-    pdf_path = temp_dir / f"{pptx_path.stem}.pdf"
+    # Hidden slides are not exported, so size their placeholder from the slide
+    slide_width = prs.slide_width or 9144000
+    slide_height = prs.slide_height or 5143500
+    placeholder_size = (width, round(width * slide_height / slide_width))
+
+    # Plan each slide: ("hidden", None), ("cached", tile) or ("render", tile)
+    plan = []
+    keys = compute_slide_keys(prs, width) if cache_dir else None
+    for slide_num in range(1, total_slides + 1):
+        if slide_num in hidden_slides:
+            plan.append(("hidden", None))
+            continue
+        tile = Path(cache_dir) / f"{keys[slide_num - 1]}.jpg" if cache_dir else None
+        plan.append(("cached", tile) if tile and tile.exists() else ("render", tile))
+
+    stale = [num for num, (kind, _) in enumerate(plan, 1) if kind == "render"]
+    if cache_dir:
+        print(f"Cached slides: {sum(kind == 'cached' for kind, _ in plan)}")
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+
+    pdf_path = None
+    if stale:
+        render_source = pptx_path
+        if len(stale) < total_slides - len(hidden_slides):
+            # Hide up-to-date slides so only stale ones are exported. Hiding
+            # rather than deleting keeps slide number fields unchanged.
+            for slide_num, slide in enumerate(prs.slides, 1):
+                if plan[slide_num - 1][0] == "cached":
+                    slide.element.set("show", "0")
+            render_source = temp_dir / pptx_path.name
+            prs.save(str(render_source))
+        pdf_path = convert_to_pdf(render_source, temp_dir)
+        print(
+            f"Converting {len(stale)} slide(s) to images at {width}px width "
+            f"with {workers} worker(s)..."
+        )
+
+    images = iter_slide_images(
+        pdf_path, temp_dir, plan, placeholder_size, width, workers
+    )
+    return total_slides, images
+
+
+def compute_slide_keys(prs, width):
+    """Return a cache key per slide from the slide part and all parts it depends on.
 
-    # Convert to PDF
+    Each key hashes the slide XML together with its layout, master, theme and
+    media parts (reached through relationships), external link targets, the
+    slide size and the render width. Notes are ignored, and masters do not pull
+    in their sibling layouts, so editing one layout only invalidates its slides.
+    Slides with slide number fields also include their position.
+    """
+    part_digests = {}
+
+    def part_digest(part):
+        if part.partname not in part_digests:
+            part_digests[part.partname] = hashlib.sha256(part.blob).hexdigest()
+        return part_digests[part.partname]
+
+    keys = []
+    for idx, slide in enumerate(prs.slides):
+        digest = hashlib.sha256(
+            f"{CACHE_VERSION}:{width}:{prs.slide_width}x{prs.slide_height}".encode()
+        )
+        if b'type="slidenum"' in slide.part.blob:
+            digest.update(f":position={idx}".encode())
+
+        seen = set()
+        stack = [slide.part]
+        while stack:
+            part = stack.pop()
+            if part.partname in seen:
+                continue
+            seen.add(part.partname)
+            digest.update(f"{part.partname}={part_digest(part)}\n".encode())
+            for rId, rel in sorted(part.rels.items()):
+                if rel.reltype == RT.NOTES_SLIDE:
+                    continue
+                if rel.is_external:
+                    digest.update(f"{rId}->{rel.target_ref}\n".encode())
+                elif rel.reltype != RT.SLIDE_LAYOUT or part is slide.part:
+                    stack.append(rel.target_part)
+        keys.append(digest.hexdigest())
+
+    return keys
+
+
+def convert_to_pdf(pptx_path, temp_dir):
+    """Convert the presentation to PDF with the shared LibreOffice service."""
     print("Converting to PDF...")
+    try:
+        return get_service().convert(pptx_path, "pdf", temp_dir)
+    except Exception as e:
+        raise RuntimeError(f"PDF conversion failed: {e}")
+
+
+def get_pdf_page_count(pdf_path):
+    """Read the page count of a PDF with pdfinfo."""
     result = subprocess.run(
-        [
-            "soffice",
-            "--headless",
-            "--convert-to",
-            "pdf",
-            "--outdir",
-            str(temp_dir),
-            str(pptx_path),
-        ],
-        capture_output=True,
-        text=True,
+        ["pdfinfo", str(pdf_path)], capture_output=True, text=True
     )
-    if result.returncode != 0 or not pdf_path.exists():
-        raise RuntimeError("PDF conversion failed")
+    for line in result.stdout.splitlines():
+        if line.startswith("Pages:"):
+            return int(line.split()[1])
+    raise RuntimeError("Could not determine PDF page count")
+
 
-    # Convert PDF to images
-    print(f"Converting to images at {dpi} DPI...")
+def render_page_range(pdf_path, temp_dir, first, last, width):
+    """Rasterize PDF pages first..last (1-based, inclusive) at the given width."""
+    prefix = temp_dir / f"page-{first:05d}"
     result = subprocess.run(
-        ["pdftoppm", "-jpeg", "-r", str(dpi), str(pdf_path), str(temp_dir / "slide")],
+        [
+            "pdftoppm",
+            "-jpeg",
+            "-f",
+            str(first),
+            "-l",
+            str(last),
+            "-scale-to-x",
+            str(width),
+            "-scale-to-y",
+            "-1",
+            str(pdf_path),
+            str(prefix),
+        ],
         capture_output=True,
         text=True,
     )
     if result.returncode != 0:
-        raise RuntimeError("Image conversion failed")
+        raise RuntimeError(f"Image conversion failed for pages {first}-{last}")
 
-    visible_images = sorted(temp_dir.glob("slide-*.jpg"))
+    return sorted(temp_dir.glob(f"{prefix.name}-*.jpg"))
 
-    # Create full list with placeholders for hidden slides
-    all_images = []
-    visible_idx = 0
 
-    # Get placeholder dimensions from first visible slide
-    if visible_images:
-        with Image.open(visible_images[0]) as img:
-            placeholder_size = img.size
-    else:
-        placeholder_size = (1920, 1080)
+def iter_slide_images(pdf_path, temp_dir, plan, placeholder_size, width, workers):
+    """Yield slide images in slide order following a per-slide plan.
 
-    for slide_num in range(1, total_slides + 1):
-        if slide_num in hidden_slides:
-            # Create placeholder image for hidden slide
-            placeholder_path = temp_dir / f"hidden-{slide_num:03d}.jpg"
-            placeholder_img = create_hidden_slide_placeholder(placeholder_size)
-            placeholder_img.save(placeholder_path, "JPEG")
-            all_images.append(placeholder_path)
-        else:
-            # Use the actual visible slide image
-            if visible_idx < len(visible_images):
-                all_images.append(visible_images[visible_idx])
-                visible_idx += 1
-
-    return all_images
+    Hidden slides get a placeholder, cached slides their cached tile, and the
+    remaining slides are taken in order from the pages of pdf_path. The PDF is
+    split into page ranges rendered concurrently by separate pdftoppm
+    processes; ranges are consumed in order, so each image is yielded as soon
+    as its own range is done. Rendered pages are copied into the cache when
+    the plan gives them a tile path.
+    """
+    page_count = get_pdf_page_count(pdf_path) if pdf_path else 0
+    pages_per_job = max(1, min(MAX_PAGES_PER_JOB, math.ceil(page_count / workers)))
+    ranges = [
+        (first, min(first + pages_per_job - 1, page_count))
+        for first in range(1, page_count + 1, pages_per_job)
+    ]
+
+    placeholder_path = None
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(render_page_range, pdf_path, temp_dir, first, last, width)
+            for first, last in ranges
+        ]
+        rendered_images = (path for future in futures for path in future.result())
+
+        for kind, tile in plan:
+            if kind == "hidden":
+                # All hidden slides share one placeholder image
+                if placeholder_path is None:
+                    placeholder_path = temp_dir / "hidden.jpg"
+                    placeholder_img = create_hidden_slide_placeholder(placeholder_size)
+                    placeholder_img.save(placeholder_path, "JPEG")
+                yield placeholder_path
+            elif kind == "cached":
+                yield tile
+            else:
+                # Use the actual rendered slide image
+                image_path = next(rendered_images, None)
+                if image_path is None:
+                    continue
+                if tile is not None:
+                    # Write under a temporary name so readers never see partial tiles
+                    partial = tile.with_suffix(f".{os.getpid()}.tmp")
+                    shutil.copyfile(image_path, partial)
+                    os.replace(partial, tile)
+                yield image_path
 
 
 def create_grids(
@@ -278,22 +458,30 @@ def create_grids(
     output_path,
     placeholder_regions=None,
     slide_dimensions=None,
+    total=None,
 ):
-    """Create multiple thumbnail grids from slide images, max cols×(cols+1) images per grid."""
+    """Create multiple thumbnail grids from slide images, max cols×(cols+1) images per grid.
+
+    image_paths may be any iterable; when it is not a list, total must give the
+    number of images it will yield. Each grid is written as soon as its images
+    are available.
+    """
     # Maximum images per grid is cols × (cols + 1) for better proportions
     max_images_per_grid = cols * (cols + 1)
     grid_files = []
+    if total is None:
+        total = len(image_paths)
+    images = iter(image_paths)
 
     print(
         f"Creating grids with {cols} columns (max {max_images_per_grid} images per grid)"
     )
 
     # Split images into chunks
-    for chunk_idx, start_idx in enumerate(
-        range(0, len(image_paths), max_images_per_grid)
-    ):
-        end_idx = min(start_idx + max_images_per_grid, len(image_paths))
-        chunk_images = image_paths[start_idx:end_idx]
+    for chunk_idx, start_idx in enumerate(range(0, total, max_images_per_grid)):
+        chunk_images = list(islice(images, max_images_per_grid))
+        if not chunk_images:
+            break
 
         # Create grid for this chunk
         grid = create_grid(
@@ -301,7 +489,7 @@ def create_grids(
         )
 
         # Generate output filename
-        if len(image_paths) <= max_images_per_grid:
+        if total <= max_images_per_grid:
             # Single grid - use base filename without suffix
             grid_filename = output_path
         else:
@@ -391,9 +579,9 @@ def create_grid(
                 if slide_dimensions:
                     slide_width_inches, slide_height_inches = slide_dimensions
                 else:
-                    # Fallback: estimate from image size at CONVERSION_DPI
-                    slide_width_inches = orig_w / CONVERSION_DPI
-                    slide_height_inches = orig_h / CONVERSION_DPI
+                    # Fallback: assume a standard 10-inch wide slide
+                    slide_width_inches = 10.0
+                    slide_height_inches = 10.0 * orig_h / orig_w
 
                 x_scale = orig_w / slide_width_inches
                 y_scale = orig_h / slide_height_inches
@@ -413,8 +601,8 @@ def create_grid(
                     # Draw highlight outline with red color and thick stroke
                     # Using a bright red outline instead of fill
                     stroke_width = max(
-                        5, min(orig_w, orig_h) // 150
-                    )  # Thicker proportional stroke width
+                        2, min(orig_w, orig_h) // 75
+                    )  # Proportional stroke width at thumbnail scale
                     overlay_draw.rectangle(
                         [(px_left, px_top), (px_left + px_width, px_top + px_height)],
                         outline=(255, 0, 0, 255),  # Bright red, fully opaque
@@ -0,0 +1,1060 @@
+#!/usr/bin/env python3
+"""
+In-process Excel formula evaluation for recalc.py
+
+Builds a dependency graph over the formulas in a workbook (read with openpyxl),
+evaluates them in topological order and returns the computed values, without
+launching LibreOffice. Only a common subset of Excel is supported: arithmetic,
+comparison and concatenation operators, cell and range references (including
+other sheets) and the functions in FUNCTIONS. Anything else (defined names,
+array formulas, circular references, unknown functions) raises
+UnsupportedFormulaError so callers can fall back to LibreOffice.
+"""
+
+import datetime
+import math
+import re
+from collections import deque
+from decimal import ROUND_DOWN, ROUND_HALF_UP, ROUND_UP, Decimal
+
+from openpyxl import load_workbook
+from openpyxl.formula.tokenizer import Token, Tokenizer
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.utils.datetime import CALENDAR_WINDOWS_1900, to_excel
+
+
+class UnsupportedFormulaError(Exception):
+    """Raised when a workbook uses features the engine cannot evaluate"""
+
+
+class ExcelError:
+    """An Excel error value such as #DIV/0!"""
+
+    __slots__ = ('code',)
+
+    def __init__(self, code):
+        self.code = code
+
+    def __eq__(self, other):
+        return isinstance(other, ExcelError) and other.code == self.code
+
+    def __hash__(self):
+        return hash(self.code)
+
+    def __repr__(self):
+        return self.code
+
+    __str__ = __repr__
+
+
+DIV0 = ExcelError('#DIV/0!')
+VALUE = ExcelError('#VALUE!')
+REF = ExcelError('#REF!')
+NA = ExcelError('#N/A')
+NUM = ExcelError('#NUM!')
+ERROR_CODES = frozenset(['#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A'])
+
+# Cell types openpyxl returns for date-formatted cells
+DATE_TYPES = (datetime.datetime, datetime.date, datetime.time, datetime.timedelta)
+
+REF_PATTERN = re.compile(
+    r"^(?:(?:'(?P<qsheet>(?:[^']|'')+)'|(?P<sheet>[^'!]+))!)?"
+    r"(?P<start>\$?[A-Za-z]{0,3}\$?\d*)(?::(?P<end>\$?[A-Za-z]{0,3}\$?\d*))?$"
+)
+CELL_PATTERN = re.compile(r'^\$?([A-Za-z]{0,3})\$?(\d*)$')
+
+# Operator precedence for infix operators (higher binds tighter)
+PRECEDENCE = {
+    '=': 1, '<>': 1, '<': 1, '>': 1, '<=': 1, '>=': 1,
+    '&': 2,
+    '+': 3, '-': 3,
+    '*': 4, '/': 4,
+    '^': 5,
+}
+
+
+class Range:
+    """A rectangular block of evaluated cell values (list of rows)"""
+
+    __slots__ = ('rows',)
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def values(self):
+        for row in self.rows:
+            yield from row
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+
+class _Parser:
+    """Recursive-descent parser over openpyxl formula tokens"""
+
+    def __init__(self, formula):
+        try:
+            tokens = Tokenizer(formula).items
+        except Exception as e:
+            raise UnsupportedFormulaError(f'Cannot tokenize {formula}: {e}')
+        self.tokens = [t for t in tokens if t.type != Token.WSPACE]
+        self.pos = 0
+
+    def parse(self):
+        node = self.expression(0)
+        if self.pos != len(self.tokens):
+            raise UnsupportedFormulaError(f'Unexpected token {self.peek().value!r}')
+        return node
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        if token is None:
+            raise UnsupportedFormulaError('Unexpected end of formula')
+        self.pos += 1
+        return token
+
+    def expression(self, min_precedence):
+        left = self.unary()
+        while True:
+            token = self.peek()
+            if token is None or token.type != Token.OP_IN:
+                return left
+            precedence = PRECEDENCE.get(token.value)
+            if precedence is None:
+                raise UnsupportedFormulaError(f'Unsupported operator {token.value}')
+            if precedence < min_precedence:
+                return left
+            self.take()
+            # ^ is left-associative in Excel, like the others
+            right = self.expression(precedence + 1)
+            left = ('binop', token.value, left, right)
+
+    def unary(self):
+        token = self.peek()
+        if token is not None and token.type == Token.OP_PRE:
+            self.take()
+            operand = self.unary()
+            return ('neg', operand) if token.value == '-' else operand
+        return self.postfix(self.primary())
+
+    def postfix(self, node):
+        while self.peek() is not None and self.peek().type == Token.OP_POST:
+            self.take()
+            node = ('percent', node)
+        return node
+
+    def primary(self):
+        token = self.take()
+        if token.type == Token.OPERAND:
+            return self.operand(token)
+        if token.type == Token.PAREN and token.subtype == Token.OPEN:
+            node = self.expression(0)
+            closing = self.take()
+            if closing.type != Token.PAREN:
+                raise UnsupportedFormulaError('Unbalanced parentheses')
+            return node
+        if token.type == Token.FUNC and token.subtype == Token.OPEN:
+            name = token.value[:-1].upper()
+            for prefix in ('_XLFN.', '_XLWS.'):
+                if name.startswith(prefix):
+                    name = name[len(prefix):]
+            args = []
+            if self._at_func_close():
+                self.take()
+                return ('func', name, args)
+            while True:
+                token = self.peek()
+                if token is not None and (token.type == Token.SEP or self._at_func_close()):
+                    # Omitted argument, e.g. IF(A1,,1)
+                    args.append(('empty',))
+                else:
+                    args.append(self.expression(0))
+                token = self.take()
+                if token.type == Token.FUNC and token.subtype == Token.CLOSE:
+                    return ('func', name, args)
+                if token.type != Token.SEP or token.subtype != Token.ARG:
+                    raise UnsupportedFormulaError(f'Unexpected {token.value!r} in {name}')
+        raise UnsupportedFormulaError(f'Unsupported token {token.value!r}')
+
+    def _at_func_close(self):
+        token = self.peek()
+        return token is not None and token.type == Token.FUNC and token.subtype == Token.CLOSE
+
+    def operand(self, token):
+        if token.subtype == Token.NUMBER:
+            number = float(token.value)
+            return ('const', int(number) if number.is_integer() and 'E' not in token.value.upper() else number)
+        if token.subtype == Token.TEXT:
+            return ('const', token.value[1:-1].replace('""', '"'))
+        if token.subtype == Token.LOGICAL:
+            return ('const', token.value.upper() == 'TRUE')
+        if token.subtype == Token.ERROR:
+            return ('const', ExcelError(token.value))
+        if token.subtype == Token.RANGE:
+            return parse_reference(token.value)
+        raise UnsupportedFormulaError(f'Unsupported operand {token.value!r}')
+
+
+def parse_reference(text):
+    """Parse A1, $A$1:B2, Sheet!A:A or 'My Sheet'!1:3 into a ref node"""
+    match = REF_PATTERN.match(text)
+    if not match or not match.group('start'):
+        raise UnsupportedFormulaError(f'Unsupported reference {text} (defined names are not supported)')
+    sheet = match.group('qsheet')
+    sheet = sheet.replace("''", "'") if sheet else match.group('sheet')
+    start = _parse_cell(match.group('start'))
+    end = _parse_cell(match.group('end')) if match.group('end') else start
+    if start is None or end is None:
+        raise UnsupportedFormulaError(f'Unsupported reference {text}')
+    is_range = match.group('end') is not None
+    if not is_range and None in start:
+        # A bare word like Tax is a defined name, not a column
+        raise UnsupportedFormulaError(f'Unsupported reference {text} (defined names are not supported)')
+    return ('ref', sheet, start, end, is_range)
+
+
+def _parse_cell(text):
+    match = CELL_PATTERN.match(text)
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    col = column_index_from_string(match.group(1).upper()) if match.group(1) else None
+    row = int(match.group(2)) if match.group(2) else None
+    return row, col
+
+
+# ---------------------------------------------------------------------------
+# Workbook model and dependency graph
+# ---------------------------------------------------------------------------
+
+class FormulaEngine:
+    """
+    Evaluates the formulas of a workbook in-process
+
+    Cells are keyed by (sheet_name, row, column) tuples.
+    """
+
+    def __init__(self, filename):
+        wb = load_workbook(filename, data_only=False)
+        self.constants = {}
+        self.formulas = {}
+        self.bounds = {}
+        try:
+            for ws in wb.worksheets:
+                self.bounds[ws.title] = (ws.max_row, ws.max_column)
+                for row in ws.iter_rows():
+                    for cell in row:
+                        value = cell.value
+                        if value is None:
+                            continue
+                        key = (ws.title, cell.row, cell.column)
+                        if isinstance(value, str) and value.startswith('='):
+                            self.formulas[key] = value
+                        elif isinstance(value, (int, float, str, bool)):
+                            self.constants[key] = value
+                        elif hasattr(value, 'text'):
+                            raise UnsupportedFormulaError(f'Array formula in {cell_name(key)}')
+                        elif isinstance(value, DATE_TYPES):
+                            # Dates are numbers (serials) to Excel formulas
+                            self.constants[key] = to_excel(value, wb.epoch)
+                        else:
+                            self.constants[key] = value
+        finally:
+            wb.close()
+        self._ast = {}
+        self.values = {}
+
+    def parsed(self, key):
+        if key not in self._ast:
+            self._ast[key] = _Parser(self.formulas[key]).parse()
+        return self._ast[key]
+
+    def references(self, key):
+        """Blocks read by the formula in key, as (sheet, r1, c1, r2, c2) tuples"""
+        refs = []
+        _collect_refs(self.parsed(key), refs)
+        rects = []
+        for sheet, start, end, _ in refs:
+            sheet = sheet or key[0]
+            if sheet in self.bounds:
+                rects.append(self._resolve(sheet, start, end))
+        return rects
+
+    def precedents(self, key):
+        """All cells referenced by the formula in key"""
+        return [cell for rect in self.references(key) for cell in rect_cells(rect)]
+
+    def build_graph(self):
+        """
+        Build the formula dependency graph
+
+        Returns:
+            dict mapping each formula cell to the set of formula cells it reads
+        """
+        graph = {}
+        formulas = self.formulas
+        for key in formulas:
+            graph[key] = {cell for cell in self.precedents(key) if cell in formulas}
+        return graph
+
+    def load_cached_values(self, filename):
+        """
+        Seed self.values with the values last saved for each formula cell
+
+        Formula cells without a saved value (e.g. written by openpyxl and never
+        recalculated) are left out.
+        """
+        wb = load_workbook(filename, data_only=True, read_only=True)
+        try:
+            for ws in wb.worksheets:
+                for row in ws.iter_rows():
+                    for cell in row:
+                        if cell.value is None or not hasattr(cell, 'column'):
+                            continue
+                        key = (ws.title, cell.row, cell.column)
+                        if key in self.formulas:
+                            value = cell.value
+                            if isinstance(value, str) and value in ERROR_CODES:
+                                value = ExcelError(value)
+                            elif isinstance(value, DATE_TYPES):
+                                value = to_excel(value, wb.epoch)
+                            self.values[key] = value
+        finally:
+            wb.close()
+
+    def evaluate(self, graph=None, cells=None):
+        """
+        Evaluate formulas in dependency order
+
+        Args:
+            graph: Dependency graph from build_graph (built if omitted)
+            cells: Only evaluate these formula cells; other formula cells must
+                already have values in self.values
+
+        Returns:
+            dict mapping formula cells to their computed values
+        """
+        graph = graph if graph is not None else self.build_graph()
+        for key in topological_order(graph, cells):
+            try:
+                value = self._eval(self.parsed(key), key[0])
+            except RecursionError:
+                raise UnsupportedFormulaError(f'Formula too deeply nested in {cell_name(key)}')
+            if isinstance(value, Range):
+                value = _implicit_value(value)
+            self.values[key] = 0 if value is None else value
+        return self.values
+
+    def _resolve(self, sheet, start, end):
+        # Whole rows/columns are clipped to the used area of the sheet
+        max_row, max_col = self.bounds[sheet]
+        r1, c1 = start
+        r2, c2 = end
+        r1, r2 = (r1 or 1), (r2 or max_row)
+        c1, c2 = (c1 or 1), (c2 or max_col)
+        r1, r2 = min(r1, r2), min(max(r1, r2), max(max_row, r1))
+        c1, c2 = min(c1, c2), min(max(c1, c2), max(max_col, c1))
+        return sheet, r1, c1, r2, c2
+
+    def _cell_value(self, key):
+        if key in self.formulas:
+            if key not in self.values:
+                raise UnsupportedFormulaError(f'{cell_name(key)} evaluated before its inputs')
+            return self.values[key]
+        return self.constants.get(key)
+
+    def _eval(self, node, sheet):
+        kind = node[0]
+        if kind == 'const':
+            return node[1]
+        if kind == 'empty':
+            return None
+        if kind == 'ref':
+            _, ref_sheet, start, end, is_range = node
+            ref_sheet = ref_sheet or sheet
+            if ref_sheet not in self.bounds:
+                return REF
+            if not is_range and start[0] and start[1]:
+                return self._cell_value((ref_sheet, start[0], start[1]))
+            _, r1, c1, r2, c2 = self._resolve(ref_sheet, start, end)
+            return Range([
+                [self._cell_value((ref_sheet, r, c)) for c in range(c1, c2 + 1)]
+                for r in range(r1, r2 + 1)
+            ])
+        if kind == 'neg':
+            value = _to_number(self._scalar(node[1], sheet))
+            return value if isinstance(value, ExcelError) else -value
+        if kind == 'percent':
+            value = _to_number(self._scalar(node[1], sheet))
+            return value if isinstance(value, ExcelError) else value / 100
+        if kind == 'binop':
+            return _binop(node[1], self._scalar(node[2], sheet), self._scalar(node[3], sheet))
+        if kind == 'func':
+            func = FUNCTIONS.get(node[1])
+            if func is None:
+                raise UnsupportedFormulaError(f'Unsupported function {node[1]}')
+            return func(*[self._eval(arg, sheet) for arg in node[2]])
+        raise UnsupportedFormulaError(f'Unsupported expression {kind}')
+
+    def _scalar(self, node, sheet):
+        value = self._eval(node, sheet)
+        return _implicit_value(value) if isinstance(value, Range) else value
+
+
+class DependencyGraph:
+    """
+    Formula dependency graph that can be cached and queried for the formulas
+    downstream of changed cells
+
+    Stores, for each formula cell, the blocks of cells it reads.
+    """
+
+    def __init__(self, references):
+        self.references = references
+        self._dependents = None
+
+    @classmethod
+    def from_engine(cls, engine):
+        return cls({key: engine.references(key) for key in engine.formulas})
+
+    @classmethod
+    def from_json(cls, data):
+        return cls({tuple(key): [tuple(rect) for rect in rects] for key, rects in data})
+
+    def to_json(self):
+        return [[list(key), [list(rect) for rect in rects]] for key, rects in self.references.items()]
+
+    def dependents(self):
+        """dict mapping each referenced cell to the formula cells that read it"""
+        if self._dependents is None:
+            dependents = {}
+            for key, rects in self.references.items():
+                for rect in rects:
+                    for cell in rect_cells(rect):
+                        dependents.setdefault(cell, set()).add(key)
+            self._dependents = dependents
+        return self._dependents
+
+    def precedents(self, cells):
+        """Graph for topological_order, restricted to the given formula cells"""
+        formulas = self.references
+        return {
+            key: {cell for rect in formulas[key] for cell in rect_cells(rect) if cell in formulas}
+            for key in cells
+        }
+
+    def downstream(self, changed):
+        """All formula cells that directly or indirectly read a changed cell"""
+        dependents = self.dependents()
+        affected = set()
+        pending = deque(changed)
+        while pending:
+            for key in dependents.get(pending.popleft(), ()):
+                if key not in affected:
+                    affected.add(key)
+                    pending.append(key)
+        return affected
+
+
+def rect_cells(rect):
+    """Cells of a (sheet, r1, c1, r2, c2) block"""
+    sheet, r1, c1, r2, c2 = rect
+    return [(sheet, r, c) for r in range(r1, r2 + 1) for c in range(c1, c2 + 1)]
+
+
+def _collect_refs(node, refs):
+    if node[0] == 'ref':
+        refs.append((node[1], node[2], node[3], node[4]))
+    elif node[0] in ('neg', 'percent'):
+        _collect_refs(node[1], refs)
+    elif node[0] == 'binop':
+        _collect_refs(node[2], refs)
+        _collect_refs(node[3], refs)
+    elif node[0] == 'func':
+        for arg in node[2]:
+            _collect_refs(arg, refs)
+
+
+def _implicit_value(value):
+    if len(value.rows) == 1 and len(value.rows[0]) == 1:
+        return value.rows[0][0]
+    raise UnsupportedFormulaError('Range used where a single value is expected')
+
+
+def topological_order(graph, cells=None):
+    """
+    Order formula cells so every cell comes after the cells it reads
+
+    Args:
+        graph: dict mapping formula cells to the formula cells they read
+        cells: Restrict the order to this subset (default: all cells)
+
+    Raises:
+        UnsupportedFormulaError: on circular references
+    """
+    subset = set(graph) if cells is None else set(cells)
+    indegree = {key: 0 for key in subset}
+    dependents = {}
+    for key in subset:
+        for dep in graph[key]:
+            if dep in subset:
+                indegree[key] += 1
+                dependents.setdefault(dep, []).append(key)
+    queue = deque(key for key, count in indegree.items() if count == 0)
+    order = []
+    while queue:
+        key = queue.popleft()
+        order.append(key)
+        for dependent in dependents.get(key, ()):
+            indegree[dependent] -= 1
+            if indegree[dependent] == 0:
+                queue.append(dependent)
+    if len(order) != len(subset):
+        raise UnsupportedFormulaError('Circular reference')
+    return order
+
+
+def cell_name(key):
+    """Format a (sheet, row, column) key as Sheet!A1"""
+    sheet, row, col = key
+    return f'{sheet}!{get_column_letter(col)}{row}'
+
+
+# ---------------------------------------------------------------------------
+# Operators and coercion
+# ---------------------------------------------------------------------------
+
+def _date_serial(value):
+    # Values that bypassed load-time conversion; assumes the 1900 date system
+    return to_excel(value, CALENDAR_WINDOWS_1900)
+
+
+def _to_number(value):
+    if isinstance(value, ExcelError):
+        return value
+    if value is None:
+        return 0
+    if isinstance(value, DATE_TYPES):
+        return _date_serial(value)
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value.strip()) if value.strip() else VALUE
+        except ValueError:
+            return VALUE
+    return VALUE
+
+
+def _to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        # Like Excel's General format: at most 15 significant digits
+        return '%.15G' % value if value else '0'
+    return str(value)
+
+
+def _to_bool(value):
+    if isinstance(value, ExcelError):
+        return value
+    if isinstance(value, str):
+        if value.upper() in ('TRUE', 'FALSE'):
+            return value.upper() == 'TRUE'
+        return VALUE
+    number = _to_number(value)
+    return number if isinstance(number, ExcelError) else number != 0
+
+
+def _compare_key(value):
+    # Excel orders numbers < text < logicals; text compares case-insensitively
+    if isinstance(value, bool):
+        return (2, value)
+    if isinstance(value, str):
+        return (1, value.lower())
+    if isinstance(value, DATE_TYPES):
+        return (0, _date_serial(value))
+    return (0, value)
+
+
+def _binop(op, left, right):
+    for value in (left, right):
+        if isinstance(value, ExcelError):
+            return value
+    if op == '&':
+        return _to_text(left) + _to_text(right)
+    if op in ('=', '<>', '<', '>', '<=', '>='):
+        if left is None:
+            left = '' if isinstance(right, str) else False if isinstance(right, bool) else 0
+        if right is None:
+            right = '' if isinstance(left, str) else False if isinstance(left, bool) else 0
+        a, b = _compare_key(left), _compare_key(right)
+        return {
+            '=': a == b, '<>': a != b, '<': a < b,
+            '>': a > b, '<=': a <= b, '>=': a >= b,
+        }[op]
+    a, b = _to_number(left), _to_number(right)
+    for value in (a, b):
+        if isinstance(value, ExcelError):
+            return value
+    if op == '+':
+        return a + b
+    if op == '-':
+        return a - b
+    if op == '*':
+        return a * b
+    if op == '/':
+        return DIV0 if b == 0 else a / b
+    if op == '^':
+        try:
+            result = a ** b
+        except (OverflowError, ZeroDivisionError):
+            return NUM if a != 0 else DIV0
+        return NUM if isinstance(result, complex) else result
+    raise UnsupportedFormulaError(f'Unsupported operator {op}')
+
+
+# ---------------------------------------------------------------------------
+# Functions
+# ---------------------------------------------------------------------------
+
+def _numbers(args):
+    """Numbers from arguments using SUM-style rules, or the first error found"""
+    numbers = []
+    for arg in args:
+        if isinstance(arg, Range):
+            for value in arg.values():
+                if isinstance(value, ExcelError):
+                    return value
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    numbers.append(value)
+        else:
+            value = _to_number(arg)
+            if isinstance(value, ExcelError):
+                return value
+            numbers.append(value)
+    return numbers
+
+
+def _numeric(func):
+    def wrapper(*args):
+        numbers = _numbers(args)
+        return numbers if isinstance(numbers, ExcelError) else func(numbers)
+    return wrapper
+
+
+def _scalar_args(func):
+    def wrapper(*args):
+        values = []
+        for arg in args:
+            if isinstance(arg, Range):
+                arg = _implicit_value(arg)
+            values.append(arg)
+        return func(*values)
+    return wrapper
+
+
+def _with_numbers(*args):
+    numbers = [_to_number(arg) for arg in args]
+    for number in numbers:
+        if isinstance(number, ExcelError):
+            return number, None
+    return None, numbers
+
+
+def _round(mode):
+    @_scalar_args
+    def round_func(value, digits=0):
+        error, numbers = _with_numbers(value, digits)
+        if error:
+            return error
+        value, digits = numbers
+        quantum = Decimal(1).scaleb(-int(digits))
+        result = float(Decimal(repr(value)).quantize(quantum, rounding=mode))
+        return int(result) if digits <= 0 else result
+    return round_func
+
+
+def _matches(criteria):
+    """Build a predicate for SUMIF/COUNTIF style criteria"""
+    if isinstance(criteria, str):
+        for op in ('<=', '>=', '<>', '<', '>', '='):
+            if criteria.startswith(op):
+                operand = criteria[len(op):]
+                break
+        else:
+            op, operand = '=', criteria
+        number = _to_number(operand) if operand else None
+        if isinstance(number, (int, float)) and not isinstance(number, ExcelError):
+            target = number
+        elif op in ('=', '<>') and any(ch in operand for ch in '*?'):
+            pattern = re.compile(
+                '^' + re.escape(operand).replace(r'\*', '.*').replace(r'\?', '.') + '$',
+                re.IGNORECASE,
+            )
+            return lambda v: (isinstance(v, str) and bool(pattern.match(v))) == (op == '=')
+        else:
+            target = operand
+    else:
+        op, target = '=', criteria
+
+    def predicate(value):
+        if value is None:
+            return op == '<>' if target != '' else op == '='
+        if isinstance(target, (int, float)) and not isinstance(value, (int, float)):
+            return op == '<>'
+        if isinstance(target, str) and not isinstance(value, str):
+            return op == '<>'
+        result = _binop(op, value, target)
+        return result is True
+    return predicate
+
+
+def _sumif(range_, criteria, sum_range=None):
+    predicate = _matches(criteria)
+    targets = list((sum_range or range_).values())
+    total = 0
+    for value, target in zip(range_.values(), targets):
+        if predicate(value) and isinstance(target, (int, float)) and not isinstance(target, bool):
+            total += target
+    return total
+
+
+def _countif(range_, criteria):
+    predicate = _matches(criteria)
+    return sum(1 for value in range_.values() if predicate(value))
+
+
+def _averageif(range_, criteria, average_range=None):
+    predicate = _matches(criteria)
+    targets = list((average_range or range_).values())
+    numbers = [
+        t for v, t in zip(range_.values(), targets)
+        if predicate(v) and isinstance(t, (int, float)) and not isinstance(t, bool)
+    ]
+    return sum(numbers) / len(numbers) if numbers else DIV0
+
+
+def _sumproduct(*ranges):
+    columns = [list(r.values()) if isinstance(r, Range) else [r] for r in ranges]
+    if len({len(c) for c in columns}) != 1:
+        return VALUE
+    total = 0
+    for values in zip(*columns):
+        product = 1
+        for value in values:
+            if isinstance(value, ExcelError):
+                return value
+            product *= value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+        total += product
+    return total
+
+
+def _if(condition, if_true=True, if_false=False):
+    if isinstance(condition, Range):
+        condition = _implicit_value(condition)
+    condition = _to_bool(condition)
+    if isinstance(condition, ExcelError):
+        return condition
+    result = if_true if condition else if_false
+    return 0 if result is None else result
+
+
+def _iferror(value, fallback):
+    if isinstance(value, Range):
+        value = _implicit_value(value)
+    return fallback if isinstance(value, ExcelError) else value
+
+
+def _ifna(value, fallback):
+    if isinstance(value, Range):
+        value = _implicit_value(value)
+    return fallback if value == NA else value
+
+
+def _logical(combine):
+    def func(*args):
+        results = []
+        for arg in args:
+            values = arg.values() if isinstance(arg, Range) else [arg]
+            for value in values:
+                if value is None or (isinstance(arg, Range) and isinstance(value, str)):
+                    continue
+                value = _to_bool(value)
+                if isinstance(value, ExcelError):
+                    return value
+                results.append(value)
+        return combine(results) if results else VALUE
+    return func
+
+
+def _lookup_position(lookup, values, match_type):
+    if isinstance(lookup, ExcelError):
+        return lookup
+    if match_type == 0:
+        predicate = _matches(lookup) if isinstance(lookup, str) else None
+        for i, value in enumerate(values):
+            if (predicate(value) if predicate else _binop('=', value, lookup) is True):
+                return i
+        return NA
+    best = None
+    for i, value in enumerate(values):
+        if value is None or isinstance(value, ExcelError):
+            continue
+        if _compare_key(value)[0] != _compare_key(lookup)[0]:
+            continue
+        if match_type > 0 and _binop('<=', value, lookup) is True:
+            best = i
+        elif match_type < 0 and _binop('>=', value, lookup) is True:
+            best = i
+        else:
+            break
+    return NA if best is None else best
+
+
+def _vlookup(lookup, table, col_index, approximate=True):
+    if isinstance(lookup, Range):
+        lookup = _implicit_value(lookup)
+    col_index = _to_number(col_index)
+    if isinstance(col_index, ExcelError):
+        return col_index
+    col_index = int(col_index)
+    if col_index < 1 or col_index > len(table.rows[0]):
+        return REF
+    position = _lookup_position(lookup, [row[0] for row in table.rows], 1 if _to_bool(approximate) is True else 0)
+    if isinstance(position, ExcelError):
+        return position
+    return table.rows[position][col_index - 1]
+
+
+def _hlookup(lookup, table, row_index, approximate=True):
+    transposed = Range([list(col) for col in zip(*table.rows)])
+    return _vlookup(lookup, transposed, row_index, approximate)
+
+
+def _match(lookup, range_, match_type=1):
+    if isinstance(lookup, Range):
+        lookup = _implicit_value(lookup)
+    match_type = _to_number(match_type)
+    if isinstance(match_type, ExcelError):
+        return match_type
+    position = _lookup_position(lookup, list(range_.values()), match_type)
+    return position if isinstance(position, ExcelError) else position + 1
+
+
+def _index(range_, row_num, col_num=None):
+    error, numbers = _with_numbers(row_num, col_num or 0)
+    if error:
+        return error
+    row_num, col_num = (int(n) for n in numbers)
+    rows = range_.rows
+    if len(rows) == 1 and col_num == 0:
+        row_num, col_num = 1, row_num
+    elif len(rows[0]) == 1 and col_num == 0:
+        col_num = 1
+    if row_num < 0 or col_num < 0 or row_num > len(rows) or col_num > len(rows[0]):
+        return REF
+    if row_num == 0 or col_num == 0:
+        raise UnsupportedFormulaError('INDEX returning a whole row or column')
+    return rows[row_num - 1][col_num - 1]
+
+
+def _npv(rate, *args):
+    if isinstance(rate, Range):
+        rate = _implicit_value(rate)
+    rate = _to_number(rate)
+    if isinstance(rate, ExcelError):
+        return rate
+    numbers = _numbers(args)
+    if isinstance(numbers, ExcelError):
+        return numbers
+    return sum(value / (1 + rate) ** (i + 1) for i, value in enumerate(numbers))
+
+
+@_scalar_args
+def _pmt(rate, nper, pv, fv=0, when=0):
+    error, numbers = _with_numbers(rate, nper, pv, fv, when)
+    if error:
+        return error
+    rate, nper, pv, fv, when = numbers
+    if nper == 0:
+        return NUM
+    if rate == 0:
+        return -(pv + fv) / nper
+    factor = (1 + rate) ** nper
+    return -(rate * (pv * factor + fv)) / ((1 + rate * (1 if when else 0)) * (factor - 1))
+
+
+def _string_func(func):
+    @_scalar_args
+    def wrapper(*args):
+        for arg in args:
+            if isinstance(arg, ExcelError):
+                return arg
+        return func(*args)
+    return wrapper
+
+
+def _concat(*args):
+    parts = []
+    for arg in args:
+        for value in (arg.values() if isinstance(arg, Range) else [arg]):
+            if isinstance(value, ExcelError):
+                return value
+            parts.append(_to_text(value))
+    return ''.join(parts)
+
+
+def _text_count(count):
+    count = _to_number(count)
+    if isinstance(count, ExcelError):
+        return count
+    return VALUE if count < 0 else int(count)
+
+
+@_string_func
+def _left(text, count=1):
+    count = _text_count(count)
+    return count if isinstance(count, ExcelError) else _to_text(text)[:count]
+
+
+@_string_func
+def _right(text, count=1):
+    count = _text_count(count)
+    if isinstance(count, ExcelError):
+        return count
+    return _to_text(text)[-count:] if count else ''
+
+
+@_string_func
+def _mid(text, start, count):
+    start, count = _to_number(start), _text_count(count)
+    for value in (start, count):
+        if isinstance(value, ExcelError):
+            return value
+    if start < 1:
+        return VALUE
+    start = int(start) - 1
+    return _to_text(text)[start:start + count]
+
+
+def _math(func):
+    @_scalar_args
+    def wrapper(*args):
+        error, numbers = _with_numbers(*args)
+        if error:
+            return error
+        try:
+            return func(*numbers)
+        except ZeroDivisionError:
+            return DIV0
+        except (ValueError, OverflowError):
+            return NUM
+    return wrapper
+
+
+def _is(predicate):
+    def wrapper(value):
+        if isinstance(value, Range):
+            value = _implicit_value(value)
+        return predicate(value)
+    return wrapper
+
+
+def _count(args, predicate):
+    count = 0
+    for arg in args:
+        for value in (arg.values() if isinstance(arg, Range) else [arg]):
+            if predicate(value, isinstance(arg, Range)):
+                count += 1
+    return count
+
+
+def _is_number(value, in_range):
+    if isinstance(value, bool):
+        return not in_range
+    if isinstance(value, (int, float)):
+        return True
+    return not in_range and isinstance(_to_number(value), (int, float))
+
+
+def _average(numbers):
+    return sum(numbers) / len(numbers) if numbers else DIV0
+
+
+def _median(numbers):
+    if not numbers:
+        return NUM
+    ordered = sorted(numbers)
+    mid = len(ordered) // 2
+    return ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+def _product(numbers):
+    result = 1
+    for number in numbers:
+        result *= number
+    return result
+
+
+FUNCTIONS = {
+    'SUM': _numeric(sum),
+    'AVERAGE': _numeric(_average),
+    'MIN': _numeric(lambda n: min(n) if n else 0),
+    'MAX': _numeric(lambda n: max(n) if n else 0),
+    'MEDIAN': _numeric(_median),
+    'PRODUCT': _numeric(_product),
+    'COUNT': lambda *args: _count(args, _is_number),
+    'COUNTA': lambda *args: _count(args, lambda v, _: v is not None),
+    'COUNTBLANK': lambda *args: _count(args, lambda v, _: v is None or v == ''),
+    'SUMIF': _sumif,
+    'COUNTIF': _countif,
+    'AVERAGEIF': _averageif,
+    'SUMPRODUCT': _sumproduct,
+    'ROUND': _round(ROUND_HALF_UP),
+    'ROUNDUP': _round(ROUND_UP),
+    'ROUNDDOWN': _round(ROUND_DOWN),
+    'INT': _math(lambda x: math.floor(x)),
+    'ABS': _math(abs),
+    'MOD': _math(lambda a, b: a - b * math.floor(a / b)),
+    'POWER': _math(lambda a, b: a ** b),
+    'SQRT': _math(math.sqrt),
+    'EXP': _math(math.exp),
+    'LN': _math(math.log),
+    'IF': _if,
+    'IFERROR': _iferror,
+    'IFNA': _ifna,
+    'AND': _logical(all),
+    'OR': _logical(any),
+    'NOT': _scalar_args(lambda v: _to_bool(v) if isinstance(_to_bool(v), ExcelError) else not _to_bool(v)),
+    'TRUE': lambda: True,
+    'FALSE': lambda: False,
+    'NA': lambda: NA,
+    'ISBLANK': _is(lambda v: v is None),
+    'ISNUMBER': _is(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)),
+    'ISTEXT': _is(lambda v: isinstance(v, str)),
+    'ISERROR': _is(lambda v: isinstance(v, ExcelError)),
+    'ISNA': _is(lambda v: v == NA),
+    'CONCATENATE': _concat,
+    'CONCAT': _concat,
+    'LEN': _string_func(lambda s: len(_to_text(s))),
+    'LEFT': _left,
+    'RIGHT': _right,
+    'MID': _mid,
+    'UPPER': _string_func(lambda s: _to_text(s).upper()),
+    'LOWER': _string_func(lambda s: _to_text(s).lower()),
+    'TRIM': _string_func(lambda s: ' '.join(_to_text(s).split())),
+    'VLOOKUP': _vlookup,
+    'HLOOKUP': _hlookup,
+    'MATCH': _match,
+    'INDEX': _index,
+    'NPV': _npv,
+    'PMT': _pmt,
+}
@@ -2,20 +2,66 @@
 """
 Excel Formula Recalculation Script
 Recalculates all formulas in an Excel file using LibreOffice
+
+Uses the shared warm soffice instance from the docx skill's soffice.py when
+that skill and the UNO bridge are available, and otherwise runs a one-shot
+soffice with a Basic macro. With
+--engine python, formulas are evaluated in-process by formula_engine.py and
+LibreOffice is only used when the workbook needs features the engine lacks.
 """
 
+import argparse
+import hashlib
 import json
 import sys
 import subprocess
 import os
 import platform
+import posixpath
+import queue
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string, get_column_letter
+from defusedxml.ElementTree import iterparse, parse
+from formula_engine import (
+    DependencyGraph, ExcelError, FormulaEngine, UnsupportedFormulaError,
+    cell_name, parse_reference, rect_cells
+)
+
+# soffice.py is shared with the docx and pptx skills rather than copied here
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'docx' / 'ooxml' / 'scripts'))
+try:
+    from soffice import get_service
+except ImportError:  # docx skill not installed alongside; use one-shot soffice
+    def get_service():
+        return None
+
+EXCEL_ERRORS = ['#VALUE!', '#DIV/0!', '#REF!', '#NAME?', '#NULL!', '#NUM!', '#N/A']
+ERROR_SET = frozenset(EXCEL_ERRORS)
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+WORKBOOK_SUFFIXES = ('.xlsx', '.xlsm')
+GRAPH_CACHE_VERSION = 1
+CELL_REF = re.compile(r'([A-Z]+)(\d+)')
 
 
-def setup_libreoffice_macro():
-    """Setup LibreOffice macro for recalculation if not already configured"""
-    if platform.system() == 'Darwin':
+def setup_libreoffice_macro(profile_dir=None):
+    """
+    Setup LibreOffice macro for recalculation if not already configured
+    
+    Args:
+        profile_dir: Private LibreOffice profile directory (default: the
+            user's own profile)
+    """
+    profile_args = []
+    if profile_dir:
+        macro_dir = os.path.join(profile_dir, 'user', 'basic', 'Standard')
+        profile_args = [profile_arg(profile_dir)]
+    elif platform.system() == 'Darwin':
         macro_dir = os.path.expanduser('~/Library/Application Support/LibreOffice/4/user/basic/Standard')
     else:
         macro_dir = os.path.expanduser('~/.config/libreoffice/4/user/basic/Standard')
@@ -28,7 +74,7 @@ def setup_libreoffice_macro():
                 return True
     
     if not os.path.exists(macro_dir):
-        subprocess.run(['soffice', '--headless', '--terminate_after_init'], 
+        subprocess.run(['soffice', '--headless', '--terminate_after_init'] + profile_args, 
                       capture_output=True, timeout=10)
         os.makedirs(macro_dir, exist_ok=True)
     
@@ -50,23 +96,25 @@ def setup_libreoffice_macro():
         return False
 
 
-def recalc(filename, timeout=30):
+def profile_arg(profile_dir):
+    """soffice argument selecting a private user profile"""
+    return f'-env:UserInstallation={Path(profile_dir).absolute().as_uri()}'
+
+
+def recalc_with_macro(abs_path, timeout, profile_dir=None):
     """
-    Recalculate formulas in Excel file and report any errors
+    Recalculate by launching soffice with the RecalculateAndSave macro
     
     Args:
-        filename: Path to Excel file
+        abs_path: Absolute path to Excel file
         timeout: Maximum time to wait for recalculation (seconds)
+        profile_dir: Private LibreOffice profile directory, so several
+            recalculations can run at once
     
     Returns:
-        dict with error locations and counts
+        dict with an error message on failure, None on success
     """
-    if not Path(filename).exists():
-        return {'error': f'File {filename} does not exist'}
-    
-    abs_path = str(Path(filename).absolute())
-    
-    if not setup_libreoffice_macro():
+    if not setup_libreoffice_macro(profile_dir):
         return {'error': 'Failed to setup LibreOffice macro'}
     
     cmd = [
@@ -74,6 +122,8 @@ def recalc(filename, timeout=30):
         'vnd.sun.star.script:Standard.Module1.RecalculateAndSave?language=Basic&location=application',
         abs_path
     ]
+    if profile_dir:
+        cmd.insert(3, profile_arg(profile_dir))
     
     # Handle timeout command differences between Linux and macOS
     if platform.system() != 'Windows':
@@ -89,7 +139,11 @@ def recalc(filename, timeout=30):
         if timeout_cmd:
             cmd = [timeout_cmd, str(timeout)] + cmd
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    try:
+        # Backstop for platforms without a timeout command
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout + 10)
+    except subprocess.TimeoutExpired:
+        return {'error': f'Recalculation timed out after {timeout} seconds'}
     
     if result.returncode != 0 and result.returncode != 124:  # 124 is timeout exit code
         error_msg = result.stderr or 'Unknown error during recalculation'
@@ -98,56 +152,308 @@ def recalc(filename, timeout=30):
         else:
             return {'error': error_msg}
     
+    return None
+
+
+def _local(tag):
+    """Strip the namespace from an element tag"""
+    return tag.rpartition('}')[2]
+
+
+def _sheet_paths(zf):
+    """
+    List worksheets in workbook order
+    
+    Returns:
+        list of (sheet name, zip member path) tuples
+    """
+    targets = {}
+    for rel in parse(zf.open('xl/_rels/workbook.xml.rels')).getroot():
+        target = rel.get('Target', '')
+        if target.startswith('/'):
+            targets[rel.get('Id')] = target.lstrip('/')
+        else:
+            targets[rel.get('Id')] = posixpath.normpath(posixpath.join('xl', target))
+    
+    sheets = []
+    for el in parse(zf.open('xl/workbook.xml')).getroot().iter():
+        if _local(el.tag) == 'sheet':
+            path = targets.get(el.get(REL_NS + 'id'))
+            if path in zf.NameToInfo:
+                sheets.append((el.get('name'), path))
+    return sheets
+
+
+def _error_string_indices(zf):
+    """Indices of shared strings whose text is exactly an Excel error"""
+    indices = {}
+    if 'xl/sharedStrings.xml' not in zf.NameToInfo:
+        return indices
+    index = 0
+    for _, el in iterparse(zf.open('xl/sharedStrings.xml')):
+        if _local(el.tag) != 'si':
+            continue
+        text = ''.join(t.text or '' for t in el.iter() if _local(t.tag) == 't')
+        if text in ERROR_SET:
+            indices[str(index)] = text
+        index += 1
+        el.clear()
+    return indices
+
+
+class ErrorCollector:
+    """
+    Collects error locations, optionally as run-length-encoded ranges
+    
+    In compact mode, vertically adjacent errors of the same type in a column
+    are merged into one range such as Sheet1!C2:C90000, so cells must be added
+    in row order. If on_error is given, each location (or range) is passed to
+    it as soon as it is complete instead of being stored.
+    """
+    
+    def __init__(self, compact=False, on_error=None):
+        self.compact = compact
+        self.on_error = on_error
+        self.details = {err: [] for err in EXCEL_ERRORS}
+        self.counts = dict.fromkeys(EXCEL_ERRORS, 0)
+        self._runs = {}
+    
+    def add(self, sheet, column, row, err):
+        self.counts[err] = self.counts.get(err, 0) + 1
+        if not self.compact:
+            self._emit(err, f'{sheet}!{column}{row}', 1)
+            return
+        key = (sheet, column, err)
+        run = self._runs.get(key)
+        if run and run[1] == row - 1:
+            run[1] = row
+            return
+        if run:
+            self._flush(key, run)
+        self._runs[key] = [row, row]
+    
+    def finish(self):
+        """Flush open ranges; call at the end of each sheet"""
+        for key, run in self._runs.items():
+            self._flush(key, run)
+        self._runs = {}
+    
+    def _flush(self, key, run):
+        sheet, column, err = key
+        start, end = run
+        location = f'{sheet}!{column}{start}' if start == end else f'{sheet}!{column}{start}:{column}{end}'
+        self._emit(err, location, end - start + 1)
+    
+    def _emit(self, err, location, count):
+        if self.on_error:
+            self.on_error({'error': err, 'location': location, 'count': count})
+        else:
+            self.details.setdefault(err, []).append(location)
+
+
+def _row_cells(row):
+    """
+    Yield (column index, cell) for the <c> elements of a <row>
+    
+    The r attribute of a cell is optional; without it the cell follows the
+    previous one in the row.
+    """
+    column = 0
+    for cell in row:
+        if _local(cell.tag) != 'c':
+            continue
+        ref = cell.get('r')
+        column = column_index_from_string(CELL_REF.match(ref).group(1)) if ref else column + 1
+        yield column, cell
+
+
+def scan_workbook(filename, collector=None):
+    """
+    Find error values and count formulas in one streaming pass
+    
+    Reads the sheet XML directly, so cached values and formulas come from the
+    same pass and only one row is held in memory at a time.
+    
+    Args:
+        filename: Path to Excel file
+        collector: ErrorCollector receiving the errors (default: a plain one)
+    
+    Returns:
+        tuple of (dict mapping error type to locations, formula count)
+    """
+    collector = collector or ErrorCollector()
+    formula_count = 0
+    
+    with zipfile.ZipFile(filename) as zf:
+        error_strings = _error_string_indices(zf)
+        for sheet_name, path in _sheet_paths(zf):
+            row_number = 0
+            for _, row in iterparse(zf.open(path)):
+                if _local(row.tag) != 'row':
+                    continue
+                # Like cells, rows without r follow the previous one
+                row_number = int(row.get('r', row_number + 1))
+                for column, cell in _row_cells(row):
+                    cell_type = cell.get('t')
+                    value = None
+                    for child in cell:
+                        tag = _local(child.tag)
+                        if tag == 'f':
+                            formula_count += 1
+                        elif tag == 'v':
+                            value = child.text
+                        elif tag == 'is':
+                            value = ''.join(t.text or '' for t in child.iter() if _local(t.tag) == 't')
+                    
+                    if cell_type == 's':
+                        err = error_strings.get(value)
+                    elif cell_type in ('e', 'str', 'inlineStr') and value in ERROR_SET:
+                        err = value
+                    else:
+                        err = None
+                    if err:
+                        collector.add(sheet_name, get_column_letter(column), row_number, err)
+                row.clear()
+            collector.finish()
+    
+    return collector.details, formula_count
+
+
+def summarize_errors(error_details, formula_count, counts=None, limit=20):
+    """
+    Build the JSON report from error locations
+    
+    Args:
+        error_details: dict mapping error type to a list of locations
+        formula_count: Number of formulas in the workbook
+        counts: dict mapping error type to number of cells, when locations
+            are ranges or were streamed elsewhere (default: one per location)
+        limit: Maximum locations listed per error type (None for all)
+    
+    Returns:
+        dict with status, error counts and locations
+    """
+    if counts is None:
+        counts = {err: len(locations) for err, locations in error_details.items()}
+    total_errors = sum(counts.values())
+    result = {
+        'status': 'success' if total_errors == 0 else 'errors_found',
+        'total_errors': total_errors,
+        'error_summary': {}
+    }
+    
+    # Add non-empty error categories
+    for err_type, count in counts.items():
+        if count:
+            locations = error_details.get(err_type, [])
+            result['error_summary'][err_type] = {'count': count}
+            if locations:  # Empty when streamed via on_error
+                result['error_summary'][err_type]['locations'] = locations[:limit] if limit else locations
+    
+    result['total_formulas'] = formula_count
+    return result
+
+
+def recalc_in_process(filename, collector=None):
+    """
+    Evaluate all formulas with the in-process engine
+    
+    The workbook file is not modified; computed values are only used for the
+    error report.
+    
+    Args:
+        filename: Path to Excel file
+        collector: ErrorCollector receiving the errors (default: a plain one)
+    
+    Returns:
+        dict with error locations and counts
+    
+    Raises:
+        UnsupportedFormulaError: if the workbook needs LibreOffice
+    """
+    engine = FormulaEngine(filename)
+    values = engine.evaluate()
+    
+    errors = [(key, value.code) for key, value in values.items() if isinstance(value, ExcelError)]
+    errors.extend(
+        (key, value) for key, value in engine.constants.items()
+        if isinstance(value, str) and value in ERROR_SET
+    )
+    # Same order as the sheet scan: by sheet, then row, then column
+    sheet_order = {name: i for i, name in enumerate(engine.bounds)}
+    errors.sort(key=lambda e: (sheet_order[e[0][0]], e[0][1], e[0][2]))
+    
+    collector = collector or ErrorCollector()
+    sheet = None
+    for key, err in errors:
+        if key[0] != sheet:
+            collector.finish()
+            sheet = key[0]
+        collector.add(key[0], get_column_letter(key[2]), key[1], err)
+    collector.finish()
+    
+    result = summarize_errors(collector.details, len(engine.formulas), collector.counts,
+                              None if collector.compact else 20)
+    result['engine'] = 'python'
+    return result
+
+
+def recalc(filename, timeout=30, engine='libreoffice', profile_dir=None, compact=False, on_error=None):
+    """
+    Recalculate formulas in Excel file and report any errors
+    
+    Args:
+        filename: Path to Excel file
+        timeout: Maximum time to wait for recalculation (seconds)
+        engine: 'libreoffice', or 'python' to evaluate in-process and fall
+            back to LibreOffice for unsupported formulas
+        profile_dir: Run a one-shot soffice with this private profile instead
+            of the shared instance
+        compact: List every error, merged into column ranges, instead of
+            the first 20 cells per type
+        on_error: Called with each error location as it is found, instead of
+            listing locations in the result
+    
+    Returns:
+        dict with error locations and counts
+    """
+    if not Path(filename).exists():
+        return {'error': f'File {filename} does not exist'}
+    
+    fallback_reason = None
+    if engine == 'python':
+        try:
+            return recalc_in_process(filename, ErrorCollector(compact, on_error))
+        except UnsupportedFormulaError as e:
+            fallback_reason = str(e)
+        except Exception as e:
+            return {'error': str(e)}
+    
+    abs_path = str(Path(filename).absolute())
+    
+    service = None if profile_dir else get_service()
+    if service and service.available:
+        try:
+            service.recalculate(abs_path, timeout)
+        except TimeoutError:
+            # soffice was killed before saving, so the cached values are stale
+            return {'error': f'Recalculation timed out after {timeout} seconds'}
+        except Exception as e:
+            return {'error': f'Recalculation failed: {e}'}
+    else:
+        error = recalc_with_macro(abs_path, timeout, profile_dir)
+        if error:
+            return error
+    
     # Check for Excel errors in the recalculated file - scan ALL cells
     try:
-        wb = load_workbook(filename, data_only=True)
-        
-        excel_errors = ['#VALUE!', '#DIV/0!', '#REF!', '#NAME?', '#NULL!', '#NUM!', '#N/A']
-        error_details = {err: [] for err in excel_errors}
-        total_errors = 0
-        
-        for sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            # Check ALL rows and columns - no limits
-            for row in ws.iter_rows():
-                for cell in row:
-                    if cell.value is not None and isinstance(cell.value, str):
-                        for err in excel_errors:
-                            if err in cell.value:
-                                location = f"{sheet_name}!{cell.coordinate}"
-                                error_details[err].append(location)
-                                total_errors += 1
-                                break
-        
-        wb.close()
+        collector = ErrorCollector(compact, on_error)
+        error_details, formula_count = scan_workbook(filename, collector)
         
-        # Build result summary
-        result = {
-            'status': 'success' if total_errors == 0 else 'errors_found',
-            'total_errors': total_errors,
-            'error_summary': {}
-        }
-        
-        # Add non-empty error categories
-        for err_type, locations in error_details.items():
-            if locations:
-                result['error_summary'][err_type] = {
-                    'count': len(locations),
-                    'locations': locations[:20]  # Show up to 20 locations
-                }
-        
-        # Add formula count for context - also check ALL cells
-        wb_formulas = load_workbook(filename, data_only=False)
-        formula_count = 0
-        for sheet_name in wb_formulas.sheetnames:
-            ws = wb_formulas[sheet_name]
-            for row in ws.iter_rows():
-                for cell in row:
-                    if cell.value and isinstance(cell.value, str) and cell.value.startswith('='):
-                        formula_count += 1
-        wb_formulas.close()
-        
-        result['total_formulas'] = formula_count
+        result = summarize_errors(error_details, formula_count, collector.counts, None if compact else 20)
+        if fallback_reason:
+            result['engine'] = 'libreoffice'
+            result['fallback_reason'] = fallback_reason
         
         return result
         
@@ -155,23 +461,319 @@ def recalc(filename, timeout=30):
         return {'error': str(e)}
 
 
+def recalc_batch(directory, workers=4, timeout=30, engine='libreoffice'):
+    """
+    Recalculate every workbook in a directory in parallel
+    
+    Each worker runs its own soffice with a private temporary profile (with the
+    macro installed on first use), so workers never share LibreOffice state.
+    
+    Args:
+        directory: Directory containing .xlsx/.xlsm files
+        workers: Number of concurrent recalculations
+        timeout: Maximum time per workbook (seconds)
+        engine: Passed to recalc()
+    
+    Returns:
+        dict with totals and the recalc() result for each file
+    """
+    files = sorted(
+        str(p) for p in Path(directory).iterdir()
+        if p.suffix.lower() in WORKBOOK_SUFFIXES and not p.name.startswith('~$')
+    )
+    workers = max(1, min(workers, len(files) or 1))
+    profiles = queue.Queue()
+    profile_dirs = [tempfile.mkdtemp(prefix='recalc-profile-') for _ in range(workers)]
+    for profile_dir in profile_dirs:
+        profiles.put(profile_dir)
+    
+    def recalc_file(filename):
+        profile_dir = profiles.get()
+        start = time.monotonic()
+        try:
+            result = recalc(filename, timeout, engine, profile_dir)
+        except Exception as e:
+            result = {'error': str(e)}
+        finally:
+            profiles.put(profile_dir)
+        result['seconds'] = round(time.monotonic() - start, 2)
+        return result
+    
+    start = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = dict(zip(files, pool.map(recalc_file, files)))
+    finally:
+        for profile_dir in profile_dirs:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+    
+    statuses = [r.get('status', 'failed') for r in results.values()]
+    return {
+        'files': len(files),
+        'success': statuses.count('success'),
+        'errors_found': statuses.count('errors_found'),
+        'failed': statuses.count('failed'),
+        'total_errors': sum(r.get('total_errors', 0) for r in results.values()),
+        'seconds': round(time.monotonic() - start, 2),
+        'results': results
+    }
+
+
+def formula_fingerprint(filename):
+    """
+    Hash the formulas and sheet dimensions of a workbook
+    
+    Input values are not included, so the hash only changes when the formula
+    structure does.
+    """
+    digest = hashlib.sha256(str(GRAPH_CACHE_VERSION).encode())
+    with zipfile.ZipFile(filename) as zf:
+        for sheet_name, path in _sheet_paths(zf):
+            digest.update(b'\0sheet\0' + sheet_name.encode())
+            row_number = 0
+            for _, el in iterparse(zf.open(path)):
+                tag = _local(el.tag)
+                if tag == 'dimension':
+                    digest.update(el.get('ref', '').encode())
+                elif tag == 'row':
+                    row_number = int(el.get('r', row_number + 1))
+                    for column, cell in _row_cells(el):
+                        for child in cell:
+                            if _local(child.tag) == 'f':
+                                digest.update(f"\0{column},{row_number}\0{sorted(child.attrib.items())}\0{child.text or ''}".encode())
+                    el.clear()
+    return digest.hexdigest()
+
+
+def graph_cache_path(filename):
+    """Dependency graph cache stored next to the workbook"""
+    path = Path(filename)
+    return path.with_name(f'.{path.name}.depgraph.json')
+
+
+def load_dependency_graph(filename, engine=None):
+    """
+    Load the cached dependency graph, rebuilding it if the formulas changed
+    
+    Args:
+        filename: Path to Excel file
+        engine: FormulaEngine already loaded for this file, if any
+    
+    Returns:
+        tuple of (DependencyGraph, True if it came from the cache)
+    """
+    key = formula_fingerprint(filename)
+    cache_path = graph_cache_path(filename)
+    try:
+        with open(cache_path, 'r') as f:
+            cached = json.load(f)
+        if cached.get('key') == key:
+            return DependencyGraph.from_json(cached['references']), True
+    except (OSError, ValueError, KeyError):
+        pass
+    
+    graph = DependencyGraph.from_engine(engine or FormulaEngine(filename))
+    tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({'key': key, 'references': graph.to_json()}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # Caching is best effort, e.g. read-only directories
+    return graph, False
+
+
+def parse_changed_cells(changed, default_sheet):
+    """
+    Parse 'Sheet1!B2,Sheet1!C3:C9' into cell keys
+    
+    References without a sheet name refer to default_sheet.
+    """
+    cells = []
+    for part in _split_references(changed):
+        _, sheet, start, end, _ = parse_reference(part)
+        if None in start or None in end:
+            raise ValueError(f'Changed cells must be cells or ranges, not whole rows/columns: {part}')
+        sheet = sheet or default_sheet
+        cells.extend(rect_cells((sheet, min(start[0], end[0]), min(start[1], end[1]),
+                                 max(start[0], end[0]), max(start[1], end[1]))))
+    return cells
+
+
+def _split_references(text):
+    # Split on commas outside quoted sheet names
+    parts, current, quoted = [], '', False
+    for ch in text:
+        if ch == "'":
+            quoted = not quoted
+        if ch == ',' and not quoted:
+            parts.append(current.strip())
+            current = ''
+        else:
+            current += ch
+    parts.append(current.strip())
+    return [p for p in parts if p]
+
+
+def recalc_changed(filename, changed, timeout=30, engine='libreoffice', compact=False, on_error=None):
+    """
+    Report the formulas affected by changed cells and any errors among them
+    
+    The dependency graph is cached next to the workbook (keyed by a hash of
+    its formulas), so repeated runs on a model whose inputs change skip
+    rebuilding it. With engine='python' only the affected formulas are
+    evaluated, reading other formulas' saved values; otherwise the workbook is
+    recalculated with LibreOffice and the affected cells are checked. If no
+    graph can be built, e.g. because of defined names, the whole workbook is
+    recalculated and checked as recalc() would.
+    
+    Args:
+        filename: Path to Excel file
+        changed: Comma-separated changed cells, e.g. 'Inputs!B2,Inputs!B5:B9'
+        timeout: Maximum time to wait for LibreOffice recalculation (seconds)
+        engine: 'libreoffice' or 'python'
+        compact: List every error, merged into column ranges, as in recalc()
+        on_error: Called with each error location as it is found, as in recalc()
+    
+    Returns:
+        dict with the affected formulas, error locations and counts
+    """
+    if not Path(filename).exists():
+        return {'error': f'File {filename} does not exist'}
+    
+    try:
+        graph, cache_hit = load_dependency_graph(filename)
+        with zipfile.ZipFile(filename) as zf:
+            sheets = _sheet_paths(zf)
+        changed_cells = parse_changed_cells(changed, sheets[0][0] if sheets else None)
+    except UnsupportedFormulaError as e:
+        # e.g. defined names; without a graph, check the whole workbook
+        result = recalc(filename, timeout, engine, compact=compact, on_error=on_error)
+        if 'error' not in result:
+            result['graph_cache'] = 'unavailable'
+            result['graph_error'] = str(e)
+        return result
+    except Exception as e:
+        return {'error': str(e)}
+    affected = graph.downstream(changed_cells)
+    affected_by_name = {cell_name(key): key for key in affected}
+    
+    errors = None
+    fallback_reason = None
+    if engine == 'python':
+        try:
+            errors = evaluate_affected(filename, graph, affected)
+        except UnsupportedFormulaError as e:
+            fallback_reason = str(e)
+    
+    if errors is None:
+        # Keep the affected cells from recalc's own scan instead of scanning again
+        errors = []
+        def keep_affected(error):
+            key = affected_by_name.get(error['location'])
+            if key:
+                errors.append((key, error['error']))
+        result = recalc(filename, timeout, on_error=keep_affected)
+        if 'error' in result:
+            return result
+        errors.sort()
+    
+    collector = ErrorCollector(compact, on_error)
+    for (sheet, row, column), err in errors:
+        collector.add(sheet, get_column_letter(column), row, err)
+    collector.finish()
+    result = summarize_errors(collector.details, len(graph.references), collector.counts,
+                              None if compact else 20)
+    result['engine'] = 'python' if fallback_reason is None and engine == 'python' else 'libreoffice'
+    if fallback_reason:
+        result['fallback_reason'] = fallback_reason
+    result['graph_cache'] = 'hit' if cache_hit else 'rebuilt'
+    result['changed_cells'] = len(changed_cells)
+    result['affected_formulas'] = sorted(affected_by_name)
+    return result
+
+
+def evaluate_affected(filename, graph, affected):
+    """
+    Evaluate only the affected formulas in-process
+    
+    Unaffected formulas they read keep their saved values; any without one are
+    evaluated too, along with whatever they need in turn.
+    
+    Returns:
+        list of (cell key, error code) for the affected formulas, in
+        (sheet, row, column) order
+    """
+    engine = FormulaEngine(filename)
+    engine.load_cached_values(filename)
+    saved = set(engine.values)
+    
+    needed = set(affected)
+    pending = set(affected)
+    while pending:
+        inputs = {
+            dep for deps in graph.precedents(pending).values() for dep in deps
+            if dep not in needed and dep not in saved
+        }
+        needed |= inputs
+        pending = inputs
+    
+    for key in needed:
+        engine.values.pop(key, None)
+    engine.evaluate(graph.precedents(needed), needed)
+    
+    # Sorted so the (possibly truncated) location lists are stable across runs
+    return [
+        (key, engine.values[key].code) for key in sorted(affected)
+        if isinstance(engine.values[key], ExcelError)
+    ]
+
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python recalc.py <excel_file> [timeout_seconds]")
-        print("\nRecalculates all formulas in an Excel file using LibreOffice")
-        print("\nReturns JSON with error details:")
-        print("  - status: 'success' or 'errors_found'")
-        print("  - total_errors: Total number of Excel errors found")
-        print("  - total_formulas: Number of formulas in the file")
-        print("  - error_summary: Breakdown by error type with locations")
-        print("    - #VALUE!, #DIV/0!, #REF!, #NAME?, #NULL!, #NUM!, #N/A")
-        sys.exit(1)
-    
-    filename = sys.argv[1]
-    timeout = int(sys.argv[2]) if len(sys.argv) > 2 else 30
-    
-    result = recalc(filename, timeout)
-    print(json.dumps(result, indent=2))
+    parser = argparse.ArgumentParser(
+        description='Recalculates all formulas in an Excel file using LibreOffice',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Returns JSON with error details:
+  - status: 'success' or 'errors_found'
+  - total_errors: Total number of Excel errors found
+  - total_formulas: Number of formulas in the file
+  - error_summary: Breakdown by error type with locations
+    - #VALUE!, #DIV/0!, #REF!, #NAME?, #NULL!, #NUM!, #N/A
+"""
+    )
+    parser.add_argument('excel_file', help='Excel file to recalculate (a directory with --batch)')
+    parser.add_argument('timeout', nargs='?', type=int, default=30, help='Timeout in seconds (default: 30)')
+    parser.add_argument('--engine', choices=['libreoffice', 'python'], default='libreoffice',
+                        help='python evaluates in-process without saving values, '
+                             'falling back to LibreOffice for unsupported formulas')
+    parser.add_argument('--batch', action='store_true',
+                        help='Recalculate every workbook in the directory, each worker with its own profile')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent recalculations with --batch (default: 4)')
+    parser.add_argument('--compact', action='store_true',
+                        help='List all error locations, merged into ranges like Sheet1!C2:C900')
+    parser.add_argument('--ndjson', action='store_true',
+                        help='Stream one JSON object per error location (or range with --compact), '
+                             'then the summary')
+    parser.add_argument('--changed', metavar='CELLS',
+                        help='Only report formulas downstream of these cells, e.g. Inputs!B2,Inputs!B5:B9')
+    args = parser.parse_args()
+    if args.batch and (args.compact or args.ndjson):
+        parser.error('--compact and --ndjson apply to a single workbook, not --batch')
+    
+    write_error = None
+    if args.ndjson:
+        def write_error(error):
+            print(json.dumps(error), flush=True)
+    
+    if args.changed:
+        result = recalc_changed(args.excel_file, args.changed, args.timeout, args.engine,
+                                compact=args.compact, on_error=write_error)
+    elif args.batch:
+        result = recalc_batch(args.excel_file, args.workers, args.timeout, args.engine)
+    else:
+        result = recalc(args.excel_file, args.timeout, args.engine, compact=args.compact, on_error=write_error)
+    print(json.dumps(result) if args.ndjson else json.dumps(result, indent=2))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""Tests for formula_engine.py"""
+
+import datetime
+import sys
+from pathlib import Path
+
+import pytest
+from openpyxl import Workbook
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from formula_engine import ExcelError, FormulaEngine, UnsupportedFormulaError, topological_order
+
+
+def evaluate(tmp_path, cells, epoch_1904=False):
+    """Save cells ({'A1': value}) to a workbook and evaluate it."""
+    wb = Workbook()
+    if epoch_1904:
+        wb.epoch = datetime.datetime(1904, 1, 1)
+    ws = wb.active
+    ws.title = 'Sheet'
+    for ref, value in cells.items():
+        ws[ref] = value
+    path = tmp_path / 'book.xlsx'
+    wb.save(path)
+    engine = FormulaEngine(str(path))
+    engine.evaluate()
+    return engine
+
+
+def calc(tmp_path, formula, cells=None):
+    """Evaluate a single formula in Z1, alongside the given cells."""
+    engine = evaluate(tmp_path, dict(cells or {}, Z1=formula))
+    return engine.values[('Sheet', 1, 26)]
+
+
+DIV0 = ExcelError('#DIV/0!')
+VALUE = ExcelError('#VALUE!')
+REF = ExcelError('#REF!')
+NA = ExcelError('#N/A')
+NUM = ExcelError('#NUM!')
+
+# Inputs shared by the function tests
+DATA = {
+    'A1': 10, 'A2': 20, 'A3': 30, 'A4': 'text', 'A6': True,  # A5 is blank
+    'B1': 'apple', 'B2': 'banana', 'B3': 'cherry',
+    'C1': 1, 'C2': 2, 'C3': 3,
+    'D1': '  a   b ',
+    'E1': 1, 'F1': 2, 'G1': 3,
+    'E2': 'a', 'F2': 'b', 'G2': 'c',
+}
+
+
+class TestOperators:
+    """Test operator semantics and precedence."""
+
+    @pytest.mark.parametrize('formula, expected', [
+        ('=-2^2', 4),  # Negation binds tighter than ^
+        ('=2^3^2', 64),  # ^ is left-associative
+        ('=2+3*4', 14),
+        ('=(2+3)*4', 20),
+        ('=10-4-3', 3),
+        ('=50%', 0.5),
+        ('=10+50%', 10.5),
+        ('=-50%', -0.5),
+        ('="a"&1+1', 'a2'),  # & binds looser than +
+        ('=1+1=2', True),  # Comparison binds loosest
+        ('=1&2=12', False),  # Text never equals a number
+        ('="1"+1', 2),
+        ('=7/2', 3.5),
+    ])
+    def test_arithmetic(self, tmp_path, formula, expected):
+        """Test operator precedence and associativity."""
+        assert calc(tmp_path, formula) == expected
+
+    @pytest.mark.parametrize('formula, expected', [
+        ('="a"<"B"', True),  # Case-insensitive
+        ('="ABC"="abc"', True),
+        ('=1<"a"', True),  # Numbers < text < logicals
+        ('="z"<TRUE', True),
+        ('=A5=0', True),  # Blank compares as 0 or ""
+        ('=A5=""', True),
+        ('=2<>2', False),
+        ('=3>=3', True),
+    ])
+    def test_comparisons(self, tmp_path, formula, expected):
+        """Test comparisons follow Excel's type ordering."""
+        assert calc(tmp_path, formula, DATA) == expected
+
+    @pytest.mark.parametrize('formula, expected', [
+        ('="x"+1', VALUE),
+        ('=1/0', DIV0),
+        ('=0^-1', DIV0),
+        ('=(-8)^(1/3)', NUM),
+    ])
+    def test_operator_errors(self, tmp_path, formula, expected):
+        """Test invalid operands produce Excel errors."""
+        assert calc(tmp_path, formula) == expected
+
+
+class TestFunctions:
+    """Test every function in FUNCTIONS."""
+
+    @pytest.mark.parametrize('formula, expected', [
+        ('=SUM(A1:A6)', 60),  # Text and logicals in ranges are skipped
+        ('=SUM(1,"2",TRUE)', 4),  # ...but direct arguments are coerced
+        ('=AVERAGE(A1:A3)', 20),
+        ('=AVERAGE(A4:A5)', DIV0),
+        ('=MIN(A1:A3)', 10),
+        ('=MIN(A4:A5)', 0),
+        ('=MAX(A1:A3,5)', 30),
+        ('=MEDIAN(A1:A3,40)', 25),
+        ('=MEDIAN(A4:A5)', NUM),
+        ('=PRODUCT(A1:A3)', 6000),
+        ('=COUNT(A1:A6)', 3),
+        ('=COUNT(1,"2","x",TRUE)', 3),
+        ('=COUNTA(A1:A6)', 5),
+        ('=COUNTBLANK(A1:A6)', 1),
+        ('=SUMIF(A1:A3,">15")', 50),
+        ('=SUMIF(B1:B3,"b*",A1:A3)', 20),
+        ('=COUNTIF(B1:B3,"<>apple")', 2),
+        ('=COUNTIF(A1:A3,20)', 1),
+        ('=AVERAGEIF(A1:A3,">=20")', 25),
+        ('=AVERAGEIF(A1:A3,">99")', DIV0),
+        ('=SUMPRODUCT(A1:A3,C1:C3)', 140),
+        ('=SUMPRODUCT(A1:A2,C1:C3)', VALUE),
+    ])
+    def test_aggregates(self, tmp_path, formula, expected):
+        """Test aggregate and conditional functions."""
+        assert calc(tmp_path, formula, DATA) == expected
+
+    @pytest.mark.parametrize('formula, expected', [
+        ('=ROUND(2.345,2)', 2.35),  # Half away from zero, on the decimal value
+        ('=ROUND(-2.5,0)', -3),
+        ('=ROUND(1234,-2)', 1200),
+        ('=ROUNDUP(1.21,1)', 1.3),
+        ('=ROUNDDOWN(-1.29,1)', -1.2),
+        ('=INT(-1.5)', -2),
+        ('=ABS(-3)', 3),
+        ('=MOD(-3,2)', 1),  # Sign of the divisor
+        ('=MOD(1,0)', DIV0),
+        ('=POWER(2,10)', 1024),
+        ('=SQRT(16)', 4),
+        ('=SQRT(-1)', NUM),
+        ('=EXP(0)', 1),
+        ('=LN(1)', 0),
+        ('=LN(0)', NUM),
+        ('=ROUND("x",1)', VALUE),
+    ])
+    def test_math(self, tmp_path, formula, expected):
+        """Test rounding and math functions."""
+        assert calc(tmp_path, formula) == expected
+
+    @pytest.mark.parametrize('formula, expected', [
+        ('=IF(A1>5,"big","small")', 'big'),
+        ('=IF(FALSE,1)', False),
+        ('=IF(TRUE,1,1/0)', 1),
+        ('=IF("x",1,2)', VALUE),
+        ('=IFERROR(1/0,"err")', 'err'),
+        ('=IFERROR(A1,"err")', 10),
+        ('=IFNA(NA(),0)', 0),
+        ('=IFNA(1/0,0)', DIV0),
+        ('=AND(TRUE,A1>5)', True),
+        ('=AND(A1:A3)', True),
+        ('=AND(A4:A5)', VALUE),  # No logical values at all
+        ('=OR(FALSE,0)', False),
+        ('=OR(A6,FALSE)', True),
+        ('=NOT(0)', True),
+        ('=NOT("x")', VALUE),
+        ('=TRUE()', True),
+        ('=FALSE()', False),
+        ('=NA()', NA),
+        ('=ISBLANK(A5)', True),
+        ('=ISNUMBER(A4)', False),
+        ('=ISNUMBER(A1)', True),
+        ('=ISTEXT(A4)', True),
+        ('=ISERROR(1/0)', True),
+        ('=ISNA(NA())', True),
+        ('=ISNA(1/0)', False),
+    ])
+    def test_logical_and_information(self, tmp_path, formula, expected):
+        """Test logical and IS* functions."""
+        assert calc(tmp_path, formula, DATA) == expected
+
+    @pytest.mark.parametrize('formula, expected', [
+        ('=CONCATENATE("a",1,TRUE)', 'a1TRUE'),
+        ('=CONCAT(B1:B2)', 'applebanana'),
+        ('=CONCAT("a",NA())', NA),
+        ('=LEN(B2)', 6),
+        ('=LEFT(B1,3)', 'app'),
+        ('=LEFT(B1)', 'a'),
+        ('=RIGHT(B1,2)', 'le'),
+        ('=RIGHT(B1,0)', ''),
+        ('=MID(B2,2,3)', 'ana'),
+        ('=MID(B2,10,3)', ''),
+        ('=UPPER(B1)', 'APPLE'),
+        ('=LOWER("ABC")', 'abc'),
+        ('=TRIM(D1)', 'a b'),
+    ])
+    def test_text(self, tmp_path, formula, expected):
+        """Test text functions."""
+        assert calc(tmp_path, formula, DATA) == expected
+
+    @pytest.mark.parametrize('formula, expected', [
+        ('=VLOOKUP("banana",B1:C3,2,FALSE)', 2),
+        ('=VLOOKUP(25,A1:C3,2)', 'banana'),  # Approximate: largest <= 25
+        ('=VLOOKUP(5,A1:C3,2)', NA),
+        ('=VLOOKUP("kiwi",B1:C3,2,FALSE)', NA),
+        ('=VLOOKUP("apple",B1:C3,5,FALSE)', REF),
+        ('=HLOOKUP(2,E1:G2,2,FALSE)', 'b'),
+        ('=MATCH(30,A1:A3,0)', 3),
+        ('=MATCH(25,A1:A3)', 2),
+        ('=MATCH("ch*",B1:B3,0)', 3),
+        ('=MATCH(99,A1:A3,0)', NA),
+        ('=INDEX(A1:C3,2,3)', 2),
+        ('=INDEX(B1:B3,3)', 'cherry'),
+        ('=INDEX(E1:G1,2)', 2),
+        ('=INDEX(A1:A3,5)', REF),
+    ])
+    def test_lookup(self, tmp_path, formula, expected):
+        """Test lookup functions."""
+        assert calc(tmp_path, formula, DATA) == expected
+
+    def test_financial(self, tmp_path):
+        """Test NPV and PMT."""
+        assert calc(tmp_path, '=NPV(0.1,A1:A3)', DATA) == pytest.approx(10 / 1.1 + 20 / 1.1**2 + 30 / 1.1**3)
+        assert calc(tmp_path, '=PMT(0.01,12,1000)') == pytest.approx(-88.8487886783)
+        assert calc(tmp_path, '=PMT(0.01,12,1000,0,1)') == pytest.approx(-87.9691)
+        assert calc(tmp_path, '=PMT(0,10,1000)') == -100
+        assert calc(tmp_path, '=PMT(0.01,0,1000)') == NUM
+
+    def test_xlfn_prefix(self, tmp_path):
+        """Test functions saved with the _xlfn. prefix are recognised."""
+        assert calc(tmp_path, '=_xlfn.CONCAT("a","b")') == 'ab'
+
+    def test_every_function_is_covered(self):
+        """Test this class exercises every registered function."""
+        import inspect
+        import formula_engine
+        source = inspect.getsource(TestFunctions)
+        missing = [name for name in formula_engine.FUNCTIONS if f'={name}(' not in source
+                   and f',{name}(' not in source and f'({name}(' not in source]
+        assert missing == []
+
+
+class TestErrorPropagation:
+    """Test errors flow through formulas as Excel's do."""
+
+    def test_error_flows_through_cells(self, tmp_path):
+        """Test a dependent formula returns its input's error."""
+        engine = evaluate(tmp_path, {'A1': '=1/0', 'A2': '=A1+1', 'A3': '=SUM(A1:A2)', 'A4': '="x"&A2'})
+
+        assert [engine.values[('Sheet', r, 1)] for r in range(1, 5)] == [DIV0] * 4
+
+    def test_first_error_wins(self, tmp_path):
+        """Test the left operand's error is returned first."""
+        assert calc(tmp_path, '=NA()+1/0') == NA
+
+    def test_error_literals_and_cached_errors(self, tmp_path):
+        """Test #REF! literals and error constants in cells propagate."""
+        assert calc(tmp_path, '=#REF!+1') == REF
+        assert calc(tmp_path, '=COUNTIF(A1:A2,1)+A1', {'A1': '#N/A'}) == VALUE  # Text, not an error
+
+    def test_missing_sheet_is_ref_error(self, tmp_path):
+        """Test a reference to a sheet that does not exist."""
+        assert calc(tmp_path, '=Missing!A1+1') == REF
+
+
+class TestDependencyOrder:
+    """Test topological ordering and circular references."""
+
+    def test_inputs_come_first(self):
+        """Test each cell is ordered after the cells it reads."""
+        graph = {'a': {'b', 'c'}, 'b': {'c'}, 'c': set()}
+        assert topological_order(graph) == ['c', 'b', 'a']
+
+    def test_subset(self):
+        """Test ordering only the given cells ignores the others."""
+        graph = {'a': {'b'}, 'b': {'c'}, 'c': set()}
+        assert topological_order(graph, ['a', 'b']) == ['b', 'a']
+
+    def test_cycle_raises(self):
+        """Test a circular reference is reported as unsupported."""
+        with pytest.raises(UnsupportedFormulaError, match='Circular'):
+            topological_order({'a': {'b'}, 'b': {'a'}, 'c': set()})
+
+    def test_formulas_evaluate_in_dependency_order(self, tmp_path):
+        """Test formulas written before their inputs still see computed values."""
+        engine = evaluate(tmp_path, {'A1': '=A2*2', 'A2': '=A3+1', 'A3': '=B1', 'B1': 4})
+
+        assert engine.values[('Sheet', 1, 1)] == 10
+
+    def test_circular_workbook_raises(self, tmp_path):
+        """Test a workbook with a cycle cannot be evaluated in-process."""
+        with pytest.raises(UnsupportedFormulaError, match='Circular'):
+            evaluate(tmp_path, {'A1': '=B1+1', 'B1': '=A1'})
+
+
+class TestUnsupported:
+    """Test features outside the engine raise UnsupportedFormulaError."""
+
+    @pytest.mark.parametrize('formula', [
+        '=Rate*2',  # Defined name
+        '=XNPV(0.1,A1:A2,B1:B2)',  # Unknown function
+        '=A1:A2+1',  # Range where a single value is expected
+    ])
+    def test_unsupported(self, tmp_path, formula):
+        """Test the engine refuses instead of guessing."""
+        with pytest.raises(UnsupportedFormulaError):
+            calc(tmp_path, formula, {'A1': 1, 'A2': 2})
+
+
+class TestDates:
+    """Test dates are treated as Excel serial numbers."""
+
+    def test_date_arithmetic(self, tmp_path):
+        """Test adding days to a date."""
+        engine = evaluate(tmp_path, {'A1': datetime.date(2024, 1, 1), 'A2': '=A1+30'})
+
+        assert engine.values[('Sheet', 2, 1)] == 45292 + 30
+
+    def test_date_comparison(self, tmp_path):
+        """Test comparing a date with a number and with another date."""
+        engine = evaluate(tmp_path, {
+            'A1': datetime.datetime(2024, 1, 1, 12, 0),
+            'B1': datetime.date(2023, 6, 1),
+            'A2': '=A1>45000',
+            'A3': '=A1<B1',
+            'A4': '=A1-B1',
+        })
+
+        assert engine.values[('Sheet', 2, 1)] is True
+        assert engine.values[('Sheet', 3, 1)] is False
+        assert engine.values[('Sheet', 4, 1)] == pytest.approx(214.5)
+
+    def test_1904_date_system(self, tmp_path):
+        """Test serials follow the workbook's date system."""
+        engine = evaluate(tmp_path, {'A1': datetime.date(2024, 1, 1), 'A2': '=A1+0'}, epoch_1904=True)
+
+        assert engine.values[('Sheet', 2, 1)] == 45292 - 1462
+
+
+class TestText:
+    """Test text functions and number-to-text conversion match Excel."""
+
+    def test_negative_count_is_value_error(self, tmp_path):
+        """Test LEFT/RIGHT/MID reject negative counts and MID a start below 1."""
+        cells = {'A1': 'abc'}
+        assert calc(tmp_path, '=LEFT(A1,-1)', cells) == ExcelError('#VALUE!')
+        assert calc(tmp_path, '=RIGHT(A1,-1)', cells) == ExcelError('#VALUE!')
+        assert calc(tmp_path, '=MID(A1,0,2)', cells) == ExcelError('#VALUE!')
+        assert calc(tmp_path, '=MID(A1,2,-1)', cells) == ExcelError('#VALUE!')
+
+    def test_numbers_use_15_significant_digits(self, tmp_path):
+        """Test numbers are joined as Excel displays them."""
+        assert calc(tmp_path, '=(0.1+0.2)&""') == '0.3'
+        assert calc(tmp_path, '=(1/3)&""') == '0.333333333333333'
+        assert calc(tmp_path, '=2.5*2&"x"') == '5x'
+        assert calc(tmp_path, '=LEN(1E+20)') == 5  # "1E+20"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
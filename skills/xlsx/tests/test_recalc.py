@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Tests for recalc.py"""
+
+import sys
+import zipfile
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from defusedxml import EntitiesForbidden
+from openpyxl import Workbook
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import recalc
+
+
+def save_workbook(tmp_path, cells, name='book.xlsx'):
+    """Save cells ({'A1': value}) to a one-sheet workbook."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Sheet'
+    for ref, value in cells.items():
+        ws[ref] = value
+    path = tmp_path / name
+    wb.save(path)
+    return str(path)
+
+
+SHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+
+def save_raw_workbook(tmp_path, sheet_data, shared_strings=None, prolog=''):
+    """Save a workbook whose sheet XML is sheet_data (the <sheetData> content)."""
+    path = save_workbook(tmp_path, {}, 'raw.xlsx')
+    with zipfile.ZipFile(path) as zf:
+        members = {name: zf.read(name) for name in zf.namelist()}
+    members['xl/worksheets/sheet1.xml'] = (
+        f'{prolog}<worksheet xmlns="{SHEET_NS}"><sheetData>{sheet_data}</sheetData></worksheet>'
+    ).encode()
+    if shared_strings is not None:
+        members['xl/sharedStrings.xml'] = (
+            f'<sst xmlns="{SHEET_NS}">{"".join(shared_strings)}</sst>'
+        ).encode()
+    with zipfile.ZipFile(path, 'w') as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return path
+
+
+class TestScanWorkbook:
+    """Test the streaming error and formula scan."""
+
+    def test_cells_and_rows_without_r(self, tmp_path):
+        """Test positions are counted when the optional r attributes are missing."""
+        path = save_raw_workbook(tmp_path, (
+            '<row r="1"><c r="A1" t="e"><v>#DIV/0!</v></c><c t="e"><v>#N/A</v></c></row>'
+            '<row><c t="e"><f>1/0</f><v>#REF!</v></c></row>'
+            '<row r="5"><c r="C5"><f>1</f><v>1</v></c><c t="e"><v>#NUM!</v></c></row>'
+        ))
+
+        details, formula_count = recalc.scan_workbook(path)
+
+        assert details['#DIV/0!'] == ['Sheet!A1']
+        assert details['#N/A'] == ['Sheet!B1']
+        assert details['#REF!'] == ['Sheet!A2']
+        assert details['#NUM!'] == ['Sheet!D5']
+        assert formula_count == 2
+
+    def test_shared_and_inline_string_errors(self, tmp_path):
+        """Test error text in shared, rich-text and inline strings is reported."""
+        path = save_raw_workbook(tmp_path, (
+            '<row r="1">'
+            '<c r="A1" t="s"><v>0</v></c>'
+            '<c r="B1" t="s"><v>1</v></c>'
+            '<c r="C1" t="s"><v>2</v></c>'
+            '<c r="D1" t="inlineStr"><is><t>#NAME?</t></is></c>'
+            '<c r="E1" t="str"><f>"#NULL!"</f><v>#NULL!</v></c>'
+            '</row>'
+        ), shared_strings=[
+            '<si><t>hello</t></si>',
+            '<si><t>#VALUE!</t></si>',
+            '<si><r><t>#N/</t></r><r><t>A</t></r></si>',
+        ])
+
+        details, _ = recalc.scan_workbook(path)
+
+        assert {err: locations for err, locations in details.items() if locations} == {
+            '#VALUE!': ['Sheet!B1'],
+            '#N/A': ['Sheet!C1'],
+            '#NAME?': ['Sheet!D1'],
+            '#NULL!': ['Sheet!E1'],
+        }
+
+    def test_compact_ranges(self, tmp_path):
+        """Test vertically adjacent errors merge into ranges and counts stay per cell."""
+        rows = ''.join(
+            f'<row r="{row}"><c r="B{row}" t="e"><v>#DIV/0!</v></c></row>' for row in (1, 2, 3, 5)
+        )
+        path = save_raw_workbook(tmp_path, rows)
+        collector = recalc.ErrorCollector(compact=True)
+
+        details, _ = recalc.scan_workbook(path, collector)
+
+        assert details['#DIV/0!'] == ['Sheet!B1:B3', 'Sheet!B5']
+        assert collector.counts['#DIV/0!'] == 4
+
+    def test_streamed_errors(self, tmp_path):
+        """Test on_error receives each range instead of it being stored."""
+        rows = ''.join(
+            f'<row r="{row}"><c r="B{row}" t="e"><v>#REF!</v></c></row>' for row in (1, 2)
+        )
+        path = save_raw_workbook(tmp_path, rows)
+        streamed = []
+
+        details, _ = recalc.scan_workbook(path, recalc.ErrorCollector(True, streamed.append))
+
+        assert streamed == [{'error': '#REF!', 'location': 'Sheet!B1:B2', 'count': 2}]
+        assert details['#REF!'] == []
+
+    def test_rejects_entity_expansion(self, tmp_path):
+        """Test untrusted XML with entity declarations is refused."""
+        path = save_raw_workbook(
+            tmp_path, '<row r="1"><c r="A1" t="str"><v>&a;</v></c></row>',
+            prolog='<!DOCTYPE bomb [<!ENTITY a "aaaaaaaaaa">]>',
+        )
+
+        with pytest.raises(EntitiesForbidden):
+            recalc.scan_workbook(path)
+
+
+class TestEngineFallback:
+    """Test --engine python falls back to LibreOffice."""
+
+    @patch('recalc.recalc_with_macro', return_value=None)
+    @patch('recalc.get_service', return_value=None)
+    def test_supported_workbook_stays_in_process(self, mock_service, mock_macro, tmp_path):
+        """Test LibreOffice is not started when the engine handles every formula."""
+        path = save_workbook(tmp_path, {'A1': 1, 'A2': '=A1/0'})
+
+        result = recalc.recalc(path, engine='python')
+
+        assert result['engine'] == 'python'
+        assert result['error_summary']['#DIV/0!']['locations'] == ['Sheet!A2']
+        mock_macro.assert_not_called()
+
+    @patch('recalc.recalc_with_macro', return_value=None)
+    @patch('recalc.get_service', return_value=None)
+    def test_unsupported_formula_uses_libreoffice(self, mock_service, mock_macro, tmp_path):
+        """Test an unsupported function hands the workbook to LibreOffice."""
+        path = save_workbook(tmp_path, {'A1': 1, 'A2': '=XNPV(0.1,A1:A1,A1:A1)'})
+
+        result = recalc.recalc(path, engine='python')
+
+        mock_macro.assert_called_once()
+        assert result['engine'] == 'libreoffice'
+        assert 'XNPV' in result['fallback_reason']
+        assert result['status'] == 'success'
+
+
+class TestRecalcChanged:
+    """Test reports limited to formulas downstream of changed cells."""
+
+    def test_error_locations_in_sheet_order(self, tmp_path):
+        """Test the truncated location list is the same on every run."""
+        cells = {'A1': 0}
+        for row in range(1, 31):
+            cells[f'B{row}'] = '=1/A1'
+        path = save_workbook(tmp_path, cells)
+
+        result = recalc.recalc_changed(path, 'Sheet!A1', engine='python')
+
+        assert result['error_summary']['#DIV/0!']['count'] == 30
+        assert result['error_summary']['#DIV/0!']['locations'] == [f'Sheet!B{row}' for row in range(1, 21)]
+
+    def test_compact_and_streamed_errors(self, tmp_path):
+        """Test --compact merges affected errors into ranges and on_error streams them."""
+        cells = {'A1': 0, 'C1': '=1'}
+        for row in range(1, 31):
+            cells[f'B{row}'] = '=1/A1'
+        path = save_workbook(tmp_path, cells)
+        streamed = []
+
+        result = recalc.recalc_changed(path, 'Sheet!A1', engine='python', compact=True,
+                                       on_error=streamed.append)
+
+        assert streamed == [{'error': '#DIV/0!', 'location': 'Sheet!B1:B30', 'count': 30}]
+        assert result['error_summary']['#DIV/0!'] == {'count': 30}
+
+    @patch('recalc.recalc_with_macro', return_value=None)
+    @patch('recalc.get_service', return_value=None)
+    def test_unsupported_graph_checks_whole_workbook(self, mock_service, mock_macro, tmp_path):
+        """Test a workbook whose graph cannot be built gets a full recalculation."""
+        path = save_workbook(tmp_path, {'A1': 1, 'A2': '=Rate*2'})
+
+        result = recalc.recalc_changed(path, 'Sheet!A1')
+
+        mock_macro.assert_called_once()
+        assert result['status'] == 'success'
+        assert result['graph_cache'] == 'unavailable'
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])